@@ -1,3 +1,3 @@
 # type: ignore
-from agent.agent import get_initialized_agent
+from agent.agent import get_acting_policy, get_initialized_agent
 from agent.parameters import AgentParams
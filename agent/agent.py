@@ -5,8 +5,11 @@ from tensorflow.python.ops.variables import Variable  # type: ignore
 from tf_agents import agents  # type: ignore
 from tf_agents.agents.dqn import dqn_agent  # type: ignore
 from tf_agents.environments import tf_py_environment  # type: ignore
+from tf_agents.policies import epsilon_greedy_policy, greedy_policy, q_policy, tf_policy  # type: ignore
+from tf_agents.utils import common  # type: ignore
 
-from environment.environment import ACTION_SPEC, OBSERVATION_SPEC, CatanRemoteEnvironment
+from environment.environment import ACTION_SPEC, OBSERVATION_SPEC, CatanBatchedEnvironment, CatanRemoteEnvironment
+from environment.offline import CatanOfflineEnvironment
 
 from agent.network import build_network
 from agent.parameters import AgentParams
@@ -22,7 +25,9 @@ def _setup_epsilon_decay_callback(train_step: Variable, parameters: AgentParams)
     return lambda: epsilon_decay(train_step)  # type: ignore
 
 
-def get_initialized_agent(environment: CatanRemoteEnvironment, parameters: AgentParams) -> tuple[agents.TFAgent, tf_py_environment.TFPyEnvironment]:
+def get_initialized_agent(
+    environment: CatanRemoteEnvironment | CatanBatchedEnvironment | CatanOfflineEnvironment, parameters: AgentParams
+) -> tuple[agents.TFAgent, tf_py_environment.TFPyEnvironment]:
     tf_environment = tf_py_environment.TFPyEnvironment(environment)
 
     optimizer = tf.keras.optimizers.Adam(global_clipnorm=1)
@@ -46,3 +51,40 @@ def get_initialized_agent(environment: CatanRemoteEnvironment, parameters: Agent
     agent.initialize()
 
     return agent, tf_environment
+
+
+def get_acting_policy(agent: dqn_agent.DqnAgent, parameters: AgentParams, greedy: bool = False) -> tuple[tf_policy.TFPolicy, Callable[[], None]]:
+    """Creates a policy deciding like the policies of the given agent, but using its own copy of the q network.
+
+    Training the agent does not change the decisions of the created policy until the weights are pushed,
+    i.e. the policy can act while the agent trains concurrently, or be kept as a frozen snapshot.
+
+    :param agent: The agent whose policies to copy.
+    :param parameters: The agent parameters, the epsilon decay follows the train step of the agent.
+    :param greedy: Whether to copy the greedy policy instead of the collect policy, defaults to False.
+    :return: The policy and a callback pushing the current weights of the agent into the policy.
+    """
+    q_network = build_network(OBSERVATION_SPEC, ACTION_SPEC)
+    q_network.create_variables(CatanRemoteEnvironment.constraint_splitter(agent.time_step_spec.observation)[0])
+
+    policy = q_policy.QPolicy(
+        agent.time_step_spec,
+        agent.action_spec,
+        q_network=q_network,
+        observation_and_action_constraint_splitter=CatanRemoteEnvironment.constraint_splitter,  # type: ignore
+    )
+
+    if greedy:
+        acting_policy = greedy_policy.GreedyPolicy(policy)
+    else:
+        epsilon_decay_callback = _setup_epsilon_decay_callback(agent.train_step_counter, parameters)
+        acting_policy = epsilon_greedy_policy.EpsilonGreedyPolicy(policy, epsilon=epsilon_decay_callback)
+
+    @common.function
+    def push_weights() -> None:
+        # the greedy policy of the agent holds the weights of its q network only
+        common.soft_variables_update(agent.policy.variables(), q_network.variables, tau=1.0)
+
+    push_weights()
+
+    return acting_policy, push_weights
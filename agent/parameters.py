@@ -28,6 +28,16 @@ class AgentParams:
     network_update_frequency: int = 4  # [sampled actions]
     buffer_size: int = 100_000
 
+    # 'episode' samples windows that never cross episode boundaries, see `replay.EpisodeReplayBuffer`,
+    # 'prioritized' additionally samples proportional to the td errors, see `replay.PrioritizedReplayBuffer`,
+    # both keep their frames in memory-mapped files, i.e. checkpoints and restores do not copy the buffer.
+    # 'uniform' and 'compact' are tensorflow buffers, these are rewritten as a whole by every checkpoint,
+    # 'compact' stores observations and masks encoded, see `replay.CompactReplayBuffer`
+    replay_buffer: Literal["uniform", "compact", "episode", "prioritized"] = "episode"
+
+    # decoupled training: the acting policy receives the weights of the learner every n-th trainings step
+    weight_push_interval: int = 16  # [trainings steps]
+
     # dqn: after 10_000 trainings steps a hard updated (t = 1) is performed
     # t-soft: after each training step a soft update with (t = 0.001) is performed
 
@@ -0,0 +1,280 @@
+import argparse
+import asyncio
+import gc
+import random
+import multiprocessing
+import resource
+import tempfile
+import time
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Callable
+
+import absl.logging  # type: ignore
+import numpy as np
+import silence_tensorflow.auto  # type: ignore
+from tf_agents.policies.random_tf_policy import RandomTFPolicy  # type: ignore
+from tf_agents.replay_buffers.tf_uniform_replay_buffer import TFUniformReplayBuffer  # type: ignore
+from tf_agents.specs import tensor_spec  # type: ignore
+
+import environment
+from agent import AgentParams
+from agent.agent import get_initialized_agent
+from catan_engine.parameters import SyntheticEngineParameters
+from catan_engine.synthetic import launch
+from utils import player
+
+absl.logging.set_verbosity(absl.logging.ERROR)  # type: ignore
+
+ENDLESS = 1 << 30
+ENGINE_SHUTDOWN_TIMEOUT = 1.0
+
+
+@dataclass
+class BenchmarkCase:
+    name: str
+    create: Callable[[environment.EnvironmentParams], environment.environment.CatanRemoteEnvironment | environment.CatanBatchedEnvironment]
+    engine: SyntheticEngineParameters
+    engines: int = 1
+    # played by `player.play_episodes_async` on a pool of `engines` async environments, `create` is unused
+    asynchronous: bool = False
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    steps: int
+    duration: float
+    latencies: list[float]
+    agent_cpu: float
+    engine_cpu: float
+    collections: int
+
+    @staticmethod
+    def header() -> str:
+        return ",".join(["Case", "Steps", "Steps/s", "p50 Latency [us]", "p99 Latency [us]", "Agent CPU/Step [us]", "Engine CPU/Step [us]", "GC Collections"])
+
+    def __repr__(self) -> str:
+        p50, p99 = np.percentile(self.latencies, [50, 99]) * 1e6
+        return ",".join(
+            [
+                self.name,
+                str(self.steps),
+                f"{self.steps / self.duration:.0f}",
+                f"{p50:.1f}",
+                f"{p99:.1f}",
+                f"{self.agent_cpu / self.steps * 1e6:.1f}",
+                f"{self.engine_cpu / self.steps * 1e6:.1f}",
+                str(self.collections),
+            ]
+        )
+
+
+def _children_cpu() -> float:
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _collections() -> int:
+    return sum(generation["collections"] for generation in gc.get_stats())
+
+
+def _choose_actions(generator: np.random.Generator, mask: np.ndarray) -> np.ndarray:
+    """Chooses a random valid action for every (batched) mask."""
+    masks = np.atleast_2d(mask)
+    actions = np.array([generator.choice(np.flatnonzero(row)) for row in masks], dtype=np.int32)
+    return actions if mask.ndim > 1 else actions[0]
+
+
+def run_case(case: BenchmarkCase, parameters: environment.EnvironmentParams, episodes: int, seed: int) -> BenchmarkResult:
+    """Plays until the given number of episodes per engine completed and measures every step of the environment.
+
+    The latency of a step is the time from submitting the chosen action until the next state
+    is returned, i.e. it includes the think time of the engine. The agent cpu time includes
+    all server threads, the engine cpu time is taken from the terminated engine processes.
+    """
+    generator = np.random.default_rng(seed)
+
+    # engines are forked before any server thread exists, they retry until the environment is up and
+    # keep playing until the environment is closed, i.e. no slot of a batch ever runs out of episodes
+    engine_cpu = _children_cpu()
+    engines = _launch_engines(case, seed)
+    py_environment = case.create(parameters)
+
+    latencies: list[float] = []
+    completed, steps = 0, 0
+    start, agent_cpu, collections = time.perf_counter(), time.process_time(), _collections()
+
+    time_step = py_environment.reset()
+    while completed < episodes * case.engines:
+        actions = _choose_actions(generator, time_step.observation["mask"])
+
+        step_start = time.perf_counter()
+        time_step = py_environment.step(actions)
+        latencies.append(time.perf_counter() - step_start)
+
+        completed += int(np.sum(time_step.is_last()))
+        steps += case.engines
+
+    duration, agent_cpu, collections = time.perf_counter() - start, time.process_time() - agent_cpu, _collections() - collections
+
+    py_environment.close()
+    _stop_engines(engines)
+
+    return BenchmarkResult(case.name, steps, duration, latencies, agent_cpu, _children_cpu() - engine_cpu, collections)
+
+
+def run_async_case(case: BenchmarkCase, parameters: environment.EnvironmentParams, episodes: int, seed: int) -> BenchmarkResult:
+    """Plays the given number of episodes per engine with a random policy using `player.play_episodes_async`.
+
+    All games are driven concurrently by the event loop of a pool of `CatanAsyncEnvironment`, i.e. this
+    measures the async player including the policy. Steps are not timed individually, the latency of
+    a step is the average step time of its episode.
+    """
+    engine_cpu = _children_cpu()
+    engines = _launch_engines(case, seed)
+    pool = environment.CatanAsyncEnvironment.create_pool(parameters, case.engines)
+
+    policy = RandomTFPolicy(
+        tensor_spec.from_spec(pool[0].time_step_spec()),
+        tensor_spec.from_spec(pool[0].action_spec()),
+        observation_and_action_constraint_splitter=environment.CatanAsyncEnvironment.constraint_splitter,
+    )
+
+    start, agent_cpu, collections = time.perf_counter(), time.process_time(), _collections()
+
+    playing = player.play_episodes_async(policy, pool, episodes * case.engines)
+    _, steps, lengths = asyncio.run_coroutine_threadsafe(playing, pool[0].loop).result()
+
+    duration, agent_cpu, collections = time.perf_counter() - start, time.process_time() - agent_cpu, _collections() - collections
+
+    # the owner of the shared server and loop is closed last
+    for py_environment in reversed(pool):
+        py_environment.close()
+    _stop_engines(engines)
+
+    latencies = [length / max(count, 1) for count, length in zip(steps, lengths) for _ in range(count)]
+    return BenchmarkResult(case.name, sum(steps), duration, latencies, agent_cpu, _children_cpu() - engine_cpu, collections)
+
+
+def _launch_engines(case: BenchmarkCase, seed: int) -> list[multiprocessing.Process]:
+    return [launch(replace(case.engine, episodes=ENDLESS, seed=seed + i)) for i in range(case.engines)]
+
+
+def _stop_engines(engines: list[multiprocessing.Process]) -> None:
+    # engines blocked on a transport that does not notice the closed environment are terminated
+    for engine in engines:
+        engine.join(ENGINE_SHUTDOWN_TIMEOUT)
+        if engine.is_alive():
+            engine.terminate()
+            engine.join()
+
+
+def run_learner(path: Path, parameters: AgentParams, episodes: int, seed: int) -> str:
+    """Trains on the episodes recorded within the given directory, i.e. without any engine or transport in the loop.
+
+    :return: The throughput of the learner as a CSV row, see `LEARNER_HEADER`.
+    """
+    py_environment = environment.CatanOfflineEnvironment(path, shuffle=True, seed=seed)
+    agent, tf_environment = get_initialized_agent(py_environment, parameters)
+    buffer = TFUniformReplayBuffer(agent.collect_data_spec, tf_environment.batch_size, parameters.buffer_size)
+
+    start = time.perf_counter()
+    losses = player.train_episodes(agent, tf_environment, buffer, parameters, episodes)
+    duration = time.perf_counter() - start
+
+    return f"learner,{episodes},{py_environment.steps},{py_environment.steps / duration:.0f},{len(losses)},{len(losses) / duration:.1f}"
+
+
+LEARNER_HEADER = "Case,Episodes,Steps,Steps/s,Train Steps,Train Steps/s"
+
+
+def get_cases(engine: SyntheticEngineParameters, batch_size: int) -> list[BenchmarkCase]:
+    binary = replace(engine, binary=True)
+    socket_path = f"@catan-benchmark-{engine.port}"
+
+    return [
+        BenchmarkCase("http", lambda p: environment.CatanHttpEnvironment(p), replace(engine, transport="http")),
+        BenchmarkCase("socket-json", lambda p: environment.CatanSocketEnvironment(p), engine),
+        BenchmarkCase("socket-binary", lambda p: environment.CatanSocketEnvironment(p), binary),
+        BenchmarkCase(
+            "uds-binary",
+            lambda p: environment.CatanSocketEnvironment(replace(p, socket_path=socket_path)),
+            replace(binary, socket_path=socket_path),
+        ),
+        BenchmarkCase("async-binary", lambda p: environment.CatanAsyncEnvironment(p), binary),
+        BenchmarkCase("shared-memory", lambda p: environment.CatanSharedMemoryEnvironment(p), replace(engine, transport="shared_memory")),
+        BenchmarkCase(
+            f"batched-binary-{batch_size}",
+            lambda p: environment.CatanBatchedEnvironment.from_socket_pool(p, batch_size),
+            binary,
+            batch_size,
+        ),
+        BenchmarkCase(f"async-player-{batch_size}", lambda p: environment.CatanAsyncEnvironment(p), binary, batch_size, asynchronous=True),
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end throughput of all transports and environments using synthetic engines.")
+    parser.add_argument("--port", type=int, default=0, help="Port to use, defaults to a random port.")
+    parser.add_argument("--episodes", type=int, default=20, help="Episodes played per engine and case.")
+    parser.add_argument("--episode_length", type=int, default=200)
+    parser.add_argument("--episode_length_spread", type=int, default=50)
+    parser.add_argument("--think_time", type=float, default=0.0, help="Time [s] the engine spends computing each state.")
+    parser.add_argument("--batch_size", type=int, default=4, help="Number of concurrent games of the batched environment.")
+    parser.add_argument("--observation_pool_size", type=int, default=0, help="Size of the observation pool, 0 disables pooling.")
+    parser.add_argument("--cases", type=str, nargs="*", default=[], help="Names of the cases to run, defaults to all cases.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=str, default="", help="CSV file to append the results to.")
+    parser.add_argument("--learner", action=argparse.BooleanOptionalAction, help="Measure the learner on recorded episodes instead of the transports.")
+    parser.add_argument("--replay_path", type=str, default="", help="Recorded episodes to train on, defaults to recording synthetic episodes.")
+
+    args = parser.parse_args()
+
+    port = args.port or random.randint(20_000, 60_000)
+    engine_parameters = SyntheticEngineParameters(
+        args.episodes,
+        port,
+        args.seed,
+        episode_length=args.episode_length,
+        episode_length_spread=args.episode_length_spread,
+        think_time=args.think_time,
+    )
+
+    if args.learner:
+        agent_parameters = AgentParams(0.99, 1, 64, True, 10_000)
+
+        with tempfile.TemporaryDirectory() as directory:
+            # without recorded episodes the synthetic engine is recorded first, e.g. on machines without the engine
+            replay_path = Path(args.replay_path or directory)
+            if not args.replay_path:
+                case = next(case for case in get_cases(engine_parameters, args.batch_size) if case.name == "socket-binary")
+                run_case(case, environment.EnvironmentParams("naive", False, port, record_path=directory), args.episodes, args.seed)
+
+            print(LEARNER_HEADER)
+            print(run_learner(replay_path, agent_parameters, args.episodes, args.seed))
+
+        raise SystemExit()
+
+    print(BenchmarkResult.header())
+    results: list[BenchmarkResult] = []
+
+    for offset, case in enumerate(get_cases(engine_parameters, args.batch_size)):
+        if args.cases and case.name not in args.cases:
+            continue
+
+        # every case gets its own port, sockets of the previous case may still linger in TIME_WAIT
+        case.engine = replace(case.engine, port=port + offset)
+        environment_parameters = environment.EnvironmentParams("naive", False, port + offset, observation_pool_size=args.observation_pool_size)
+
+        run = run_async_case if case.asynchronous else run_case
+        results.append(run(case, environment_parameters, args.episodes, args.seed))
+        print(results[-1])
+
+    if args.output:
+        output = Path(args.output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+
+        with open(output, "a") as file:
+            file.write(f"{BenchmarkResult.header()}\n")
+            file.write("\n".join([str(result) for result in results]) + "\n")
@@ -1,3 +1,4 @@
+import dataclasses
 import subprocess
 import time
 from threading import Thread
@@ -19,16 +20,25 @@ def _run(parameters: EngineParameters, delay: int) -> subprocess.Popen[bytes]:
     )
 
 
-def get_launch_callback(parameters: EngineParameters, delay: int = 5) -> Callable[..., subprocess.Popen[bytes] | None]:
+def get_launch_callback(parameters: EngineParameters, delay: int = 5, engines: int = 1) -> Callable[..., subprocess.Popen[bytes] | None]:
+    """Creates a callback launching the engine once.
+
+    :param parameters: The engine parameters.
+    :param delay: The time [s] to wait before launching, i.e. for the environments to start serving.
+    :param engines: The number of engines serving the same endpoints, e.g. one per game of a batched environment,
+    these are seeded `seed`, `seed + 1`, ... and play `episodes` each.
+    """
     is_running = False
 
     def run() -> subprocess.Popen[bytes] | None:
         nonlocal is_running
 
         if not is_running:
-            start_thread = Thread(target=lambda: _run(parameters, delay))
-            start_thread.daemon = True
-            start_thread.start()
+            for offset in range(engines):
+                engine = dataclasses.replace(parameters, seed=parameters.seed + offset) if offset else parameters
+                start_thread = Thread(target=lambda engine=engine: _run(engine, delay))
+                start_thread.daemon = True
+                start_thread.start()
             is_running = True
 
     return run
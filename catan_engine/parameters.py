@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from typing import Literal
 
 
 @dataclass
@@ -13,10 +14,33 @@ class EngineParameters:
     rolls: int = 100
     stats: bool = False
     prefix: str = ""
+    socket_path: str = ""
 
     def as_args(self) -> str:
         return (
             f"{'--single' if self.single else ''} {'--verbose' if self.verbose else ''} {'--assisted' if self.assisted else ''} "
             + f"--episodes {self.episodes} --port {self.port} --seed {self.seed} {'--init' if self.init else ''} --rolls {self.rolls} "
-            + f"{'--stats' if self.stats else ''} {'--prefix' if self.stats else ''} {self.prefix if self.stats else ''}"
+            + f"{'--stats' if self.stats else ''} {'--prefix' if self.stats else ''} {self.prefix if self.stats else ''} "
+            + f"{'--socket_path' if self.socket_path else ''} {self.socket_path}"
         )
+
+
+@dataclass
+class SyntheticEngineParameters:
+    episodes: int
+    port: int
+    seed: int = 0
+
+    # one of 'socket', 'http' or 'shared_memory', the socket transport also serves the async environment
+    transport: Literal["socket", "http", "shared_memory"] = "socket"
+    binary: bool = False
+    host: str = "127.0.0.1"
+    socket_path: str = ""
+    name: str = ""
+
+    # episodes are uniformly sampled from [episode_length - spread, episode_length + spread] steps
+    episode_length: int = 200
+    episode_length_spread: int = 0
+
+    # time [s] spent computing each state before it is sent to the environment
+    think_time: float = 0.0
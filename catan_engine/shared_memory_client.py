@@ -0,0 +1,34 @@
+import numpy as np
+from numpy.typing import NDArray
+
+from environment.enums import WireFormat
+from environment.server import SharedMemorySegment, wire
+
+
+class SharedMemoryEngineClient:
+    """Reference implementation of the engine side of the shared memory transport.
+
+    Attaches to the segment created by a `CatanSharedMemoryEnvironment`, this allows testing
+    the transport without the actual engine and documents the protocol for its implementation.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.segment = SharedMemorySegment(name, create=False)
+
+    def send_state(
+        self, player_number: int, message_type: int, phase: int, step: int, observation: NDArray[np.float32], mask: NDArray[np.uint8]
+    ) -> int:
+        """Sends a state to the environment and waits for the chosen action.
+
+        :return: The index of the chosen action, -1 for the dummy action sent after an episode ended.
+        """
+        self.segment.states.write(wire.encode_binary_state(player_number, message_type, phase, step, observation, mask))
+
+        message = self.segment.actions.read()
+        action_model = wire.decode_action(message, WireFormat.BINARY)
+        self.segment.actions.release()
+
+        return action_model.index
+
+    def close(self) -> None:
+        self.segment.close()
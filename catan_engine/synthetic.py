@@ -0,0 +1,251 @@
+import argparse
+import http.client
+import multiprocessing
+import socket
+import time
+from typing import Callable, Iterator, TypeVar
+
+import numpy as np
+from numpy.typing import NDArray
+import orjson
+
+from catan_engine.parameters import SyntheticEngineParameters
+from catan_engine.shared_memory_client import SharedMemoryEngineClient
+from environment.enums import MessageType, Phase, PlayerNumber, WireFormat
+from environment.environment import ACTION_SPEC, OBSERVATION_SPEC
+from environment.server import wire
+from environment.server.framing import MessageFraming
+from environment.server.socket_server import resolve_endpoint
+
+# the mask is split into one band of actions per phase, e.g. placing the robber
+# only ever allows actions of the robber band, the bands cover the whole action space
+PHASE_BANDS = np.array_split(np.arange(ACTION_SPEC), len(Phase))
+
+# the founding phases take the first few decisions of every game, afterwards each turn
+# is either a robber turn (a seven was rolled) or a trading and building turn
+FOUNDING_STEPS = 4
+ROBBER_PROBABILITY = 1 / 6
+MAX_VALID_ACTIONS = 24
+
+T = TypeVar("T")
+
+
+class SyntheticGame:
+    """Generates the states of a single game that resemble the states of the actual engine.
+
+    Most features stay constant between consecutive decisions, therefore every state only
+    changes a few features of the previous one. The victory points (first feature) grow
+    towards the final score of the game, which is reached with the last state.
+    """
+
+    def __init__(self, generator: np.random.Generator, length: int) -> None:
+        self.generator = generator
+        self.length = max(length, 2)
+
+        self.observation = generator.random(OBSERVATION_SPEC, dtype=np.float32)
+        self.observation[0] = 0
+        self.mask = np.zeros(ACTION_SPEC, dtype=np.uint8)
+
+        # roughly every second game is won, the others end with a lower score
+        self.final_score = 1.0 if generator.random() < 0.5 else float(generator.uniform(0.3, 0.9))
+
+    def _phases(self) -> Iterator[Phase]:
+        for step in range(self.length):
+            if step < FOUNDING_STEPS // 2:
+                yield Phase.FoundingFirstPass
+            elif step < FOUNDING_STEPS:
+                yield Phase.FoundingSecondPass
+            elif self.generator.random() < ROBBER_PROBABILITY:
+                yield from (Phase.RobberDiscard, Phase.RobberPlace, Phase.RobberSteal)
+            else:
+                yield from (Phase.Trading, Phase.Building)
+
+    def states(self) -> Iterator[tuple[MessageType, Phase, int, NDArray[np.float32], NDArray[np.uint8]]]:
+        """Yields the states of this game, the observation and mask are reused between states.
+
+        :return: The message type, phase, step, observation and mask of each state.
+        """
+        for step, phase in zip(range(self.length), self._phases()):
+            message_type = (
+                MessageType.EPISODE_STARTS if step == 0 else MessageType.EPISODE_ENDS if step == self.length - 1 else MessageType.EPISODE_CONTINUES
+            )
+
+            changed = self.generator.integers(1, OBSERVATION_SPEC, size=16)
+            self.observation[changed] = self.generator.random(changed.size, dtype=np.float32)
+            self.observation[0] = self.final_score * (step + 1) / self.length
+
+            band = PHASE_BANDS[phase]
+            self.mask[:] = 0
+            self.mask[self.generator.choice(band, size=min(int(self.generator.integers(1, MAX_VALID_ACTIONS)), band.size), replace=False)] = 1
+
+            yield message_type, phase, step, self.observation, self.mask
+
+
+class SyntheticEngine:
+    """Python stand-in for the actual engine, speaks every transport of the environment.
+
+    Useful to run and benchmark the environment on machines that can not run the engine.
+    """
+
+    def __init__(self, parameters: SyntheticEngineParameters) -> None:
+        self.parameters = parameters
+        self.generator = np.random.default_rng(parameters.seed)
+        self.invalid_actions = 0
+
+        self.connect()
+
+    def connect(self) -> None:
+        """Connects to the environment, waits for socket based environments to start listening."""
+        match self.parameters.transport:
+            case "socket":
+                family, address = resolve_endpoint(self.parameters.host, self.parameters.port, self.parameters.socket_path)
+                connection = SyntheticEngine._retry(lambda: SyntheticEngine._connect_socket(family, address))
+                self.framing = MessageFraming(connection)
+                self.wire_format = WireFormat.BINARY if self.parameters.binary else WireFormat.JSON
+                self.exchange = self._exchange_socket
+
+            case "http":
+                self.connection = http.client.HTTPConnection(self.parameters.host, self.parameters.port)
+                SyntheticEngine._retry(self.connection.connect)
+                self.exchange = self._exchange_http
+
+            case "shared_memory":
+                self.client = SyntheticEngine._retry(lambda: SharedMemoryEngineClient(self.parameters.name or f"catan-environment-{self.parameters.port}"))
+                self.exchange = self._exchange_shared_memory
+
+            case _:
+                raise Exception(f"Unknown transport '{self.parameters.transport}'.")
+
+    @staticmethod
+    def _connect_socket(family: socket.AddressFamily, address: str | tuple[str, int]) -> socket.socket:
+        connection = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            connection.connect(address)
+        except OSError:
+            connection.close()
+            raise
+
+        return connection
+
+    @staticmethod
+    def _retry(connect: Callable[[], T], timeout: float = 30.0) -> T:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return connect()
+            # the environment may not be listening yet or may not have created the segment yet
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+
+    @staticmethod
+    def _json_state(message_type: MessageType, phase: Phase, step: int, observation: NDArray[np.float32], mask: NDArray[np.uint8]) -> bytes:
+        return orjson.dumps(
+            {
+                "player_number": PlayerNumber.ONE,
+                "type": message_type,
+                "phase": phase,
+                "step": step,
+                "state": observation.tolist(),
+                "mask": mask.tolist(),
+            }
+        )
+
+    def _exchange_socket(self, message_type: MessageType, phase: Phase, step: int, observation: NDArray[np.float32], mask: NDArray[np.uint8]) -> int:
+        if self.wire_format == WireFormat.BINARY:
+            payload = wire.encode_binary_state(PlayerNumber.ONE, message_type, phase, step, observation, mask)
+        else:
+            payload = SyntheticEngine._json_state(message_type, phase, step, observation, mask)
+
+        self.framing.send(payload)
+        return wire.decode_action(self.framing.receive(), self.wire_format).index
+
+    def _exchange_http(self, message_type: MessageType, phase: Phase, step: int, observation: NDArray[np.float32], mask: NDArray[np.uint8]) -> int:
+        payload = SyntheticEngine._json_state(message_type, phase, step, observation, mask)
+        self.connection.request("POST", "/", payload, {"Content-Type": "application/json"})
+        return orjson.loads(self.connection.getresponse().read())["index"]
+
+    def _exchange_shared_memory(
+        self, message_type: MessageType, phase: Phase, step: int, observation: NDArray[np.float32], mask: NDArray[np.uint8]
+    ) -> int:
+        return self.client.send_state(PlayerNumber.ONE, message_type, phase, step, observation, mask)
+
+    def play(self) -> None:
+        """Plays all episodes, every state is answered by the environment before the next one is sent."""
+        length, spread = self.parameters.episode_length, self.parameters.episode_length_spread
+
+        for _ in range(self.parameters.episodes):
+            game = SyntheticGame(self.generator, int(self.generator.integers(length - spread, length + spread + 1)))
+
+            for message_type, phase, step, observation, mask in game.states():
+                if self.parameters.think_time > 0:
+                    time.sleep(self.parameters.think_time)
+
+                index = self.exchange(message_type, phase, step, observation, mask)
+
+                if message_type != MessageType.EPISODE_ENDS and not mask[index]:
+                    self.invalid_actions += 1
+
+    def close(self) -> None:
+        match self.parameters.transport:
+            case "socket":
+                self.framing.connection.close()
+            case "http":
+                self.connection.close()
+            case "shared_memory":
+                self.client.close()
+
+
+def run(parameters: SyntheticEngineParameters) -> None:
+    engine = SyntheticEngine(parameters)
+    try:
+        engine.play()
+    # the environment may close the connection before all episodes are played
+    except (ConnectionError, http.client.HTTPException):
+        pass
+    finally:
+        engine.close()
+
+
+def launch(parameters: SyntheticEngineParameters) -> multiprocessing.Process:
+    """Runs a synthetic engine in its own process.
+
+    :param parameters: The parameters of the engine.
+    :return: The (started) process running the engine.
+    """
+    process = multiprocessing.Process(target=run, args=(parameters,), daemon=True)
+    process.start()
+    return process
+
+
+def get_synthetic_launch_callback(parameters: SyntheticEngineParameters) -> Callable[..., multiprocessing.Process | None]:
+    """Drop-in replacement of `get_launch_callback` that launches a synthetic engine instead."""
+    is_running = False
+
+    def run() -> multiprocessing.Process | None:
+        nonlocal is_running
+
+        if not is_running:
+            is_running = True
+            return launch(parameters)
+
+    return run
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--episodes", type=int)
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--transport", type=str, default="socket", choices=["socket", "http", "shared_memory"])
+    parser.add_argument("--binary", action=argparse.BooleanOptionalAction, default=False, help="Whether to use the binary wire format for sockets.")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--socket_path", type=str, default="")
+    parser.add_argument("--name", type=str, default="", help="Name of the shared memory segment.")
+    parser.add_argument("--episode_length", type=int, default=200)
+    parser.add_argument("--episode_length_spread", type=int, default=0)
+    parser.add_argument("--think_time", type=float, default=0.0, help="Time [s] spent computing each state.")
+
+    args = parser.parse_args()
+    run(SyntheticEngineParameters(**vars(args)))
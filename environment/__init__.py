@@ -1,3 +1,4 @@
 # type: ignore
-from environment.environment import CatanHttpEnvironment, CatanSocketEnvironment
+from environment.environment import CatanAsyncEnvironment, CatanBatchedEnvironment, CatanHttpEnvironment, CatanSharedMemoryEnvironment, CatanSocketEnvironment
+from environment.offline import CatanOfflineEnvironment
 from environment.parameters import EnvironmentParams
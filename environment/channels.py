@@ -0,0 +1,94 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Generic, TypeVar
+
+from environment.models import ReceivedStateModel, SubmittedActionModel
+
+T = TypeVar("T")
+
+
+class Handoff(Generic[T]):
+    """Single-slot rendezvous between exactly one producing and one consuming thread.
+
+    A plain lock is used as a binary semaphore, which is considerably cheaper than the
+    lock and condition pair of a `queue.Queue`. The producer must not put a second item
+    before the first one was taken, which the strictly alternating state/action protocol
+    guarantees, violations raise a `RuntimeError`.
+
+    The time the consumer spends waiting for an item is accumulated in `wait_time`.
+    """
+
+    def __init__(self) -> None:
+        self.item: T | None = None
+        self.ready = Lock()
+        self.ready.acquire()
+
+        self.transfers = 0
+        self.wait_time = 0.0
+
+    def put(self, item: T) -> None:
+        """Hands the given item over to the consumer.
+
+        :param item: The item to hand over.
+        """
+        self.item = item
+        self.ready.release()
+
+    def get(self) -> T:
+        """Blocks until an item is handed over and takes it.
+
+        :return: The handed over item.
+        """
+        start = time.perf_counter()
+        self.ready.acquire()
+        self.wait_time += time.perf_counter() - start
+        self.transfers += 1
+
+        item, self.item = self.item, None
+        return item  # type: ignore
+
+    def reset_statistics(self) -> None:
+        self.transfers = 0
+        self.wait_time = 0.0
+
+
+@dataclass
+class EnvironmentChannel:
+    """Connects exactly one environment with exactly one engine connection.
+
+    States received by the server are handed over through `state` and consumed by the environment,
+    the chosen actions are handed over through `action` and consumed by the server. Therefore the
+    wait time of `state` is spent by the environment waiting on the engine and the wait time of
+    `action` is spent by the server waiting on the agent.
+    """
+
+    state: Handoff[ReceivedStateModel] = field(default_factory=Handoff)
+    action: Handoff[SubmittedActionModel] = field(default_factory=Handoff)
+
+    def statistics(self) -> dict[str, float]:
+        """Summarizes the time spent waiting on either side of this channel.
+
+        :return: The number of steps and the total and average wait times [s] of both sides.
+        """
+        steps = max(self.state.transfers, 1)
+        return {
+            "steps": self.state.transfers,
+            "environment_wait": self.state.wait_time,
+            "server_wait": self.action.wait_time,
+            "avg_environment_wait": self.state.wait_time / steps,
+            "avg_server_wait": self.action.wait_time / steps,
+        }
+
+    def reset_statistics(self) -> None:
+        self.state.reset_statistics()
+        self.action.reset_statistics()
+
+
+@dataclass
+class AsyncEnvironmentChannel:
+    """Single-slot `asyncio` counterpart of `EnvironmentChannel`, must only be used from its event loop."""
+
+    state: asyncio.Queue[ReceivedStateModel] = field(default_factory=lambda: asyncio.Queue(1))
+    action: asyncio.Queue[SubmittedActionModel] = field(default_factory=lambda: asyncio.Queue(1))
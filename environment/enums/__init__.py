@@ -3,3 +3,4 @@
 from .message_type import MessageType
 from .phase_enum import Phase
 from .player_number import PlayerNumber
+from .wire_format import WireFormat
@@ -0,0 +1,6 @@
+from enum import IntEnum, auto
+
+
+class WireFormat(IntEnum):
+    JSON = 0
+    BINARY = auto()
@@ -1,6 +1,9 @@
+import asyncio
 import logging
+import time
+from pathlib import Path
 from threading import Thread
-from typing import Literal, TypeVar, cast
+from typing import Any, Coroutine, Literal, TypeVar, cast
 
 import numpy as np
 from numpy.typing import NDArray
@@ -8,32 +11,61 @@ from tf_agents import trajectories  # type: ignore
 from tf_agents.environments.py_environment import PyEnvironment  # type: ignore
 from tf_agents.specs.array_spec import BoundedArraySpec  # type: ignore
 from tf_agents.trajectories.time_step import TimeStep  # type: ignore
+from tf_agents.utils import nest_utils  # type: ignore
 
-from environment.enums import MessageType, PlayerNumber
-from environment.models import SubmittedActionModel
+from environment import latency
+from environment.enums import MessageType, Phase, PlayerNumber, WireFormat
+from environment.models import ACTION_SPACE_SIZE, OBSERVATION_SIZE, ReceivedStateModel, SubmittedActionModel
 from environment.parameters import EnvironmentParams
-from environment.queues import ENVIRONMENT_ACTION, ENVIRONMENT_STATE
+from environment.channels import AsyncEnvironmentChannel, EnvironmentChannel
+from environment.observation_pool import ObservationPool
+from environment.recorder import TrajectoryRecorder
+from environment.telemetry import Telemetry
 from environment import server
+from environment.server import wire
 
 LOGGER = logging.getLogger("catan-environment")
 
-ACTION_SPEC = 218
-OBSERVATION_SPEC = 841
+ACTION_SPEC = ACTION_SPACE_SIZE
+OBSERVATION_SPEC = OBSERVATION_SIZE
 
 
 T = TypeVar("T")
 
 
 class CatanRemoteEnvironment(PyEnvironment):
-    def __init__(self, parameters: EnvironmentParams):
+    def __init__(self, parameters: EnvironmentParams, channel: EnvironmentChannel | AsyncEnvironmentChannel | None = None):
         super().__init__(False)
 
+        self.channel = channel or EnvironmentChannel()
+
         self.reward_mode: float | Literal["naive"] = parameters.reward_mode
         self.use_episode_end_signal = parameters.episode_end_signal
 
         self.player_number = PlayerNumber.ONE
 
-        self._action_spec = BoundedArraySpec(
+        self.telemetry = Telemetry(f"environment {parameters.port}")
+        if isinstance(self.channel, EnvironmentChannel):
+            self.telemetry.attach("channel", self.channel.statistics, self.channel.reset_statistics)
+        self.latencies = latency.recorder("environment")
+
+        # phase of the latest received state
+        self.phase: Phase | None = None
+
+        # streams all received states, rewards and chosen actions into chunk files
+        self.recorder = TrajectoryRecorder(Path(parameters.record_path), parameters.record_chunk_size) if parameters.record_path else None
+
+        # see `ObservationPool` for the ownership rules of pooled observations
+        self.observations = (
+            ObservationPool(parameters.observation_pool_size, OBSERVATION_SPEC, ACTION_SPEC) if parameters.observation_pool_size else None
+        )
+
+        self._action_spec, self._observation_spec = CatanRemoteEnvironment.create_specs()
+
+    @staticmethod
+    def create_specs() -> tuple[BoundedArraySpec, dict[str, BoundedArraySpec]]:
+        """Creates the action and observation spec shared by all environments playing the engine."""
+        action_spec = BoundedArraySpec(
             shape=(),
             dtype=np.int32,
             minimum=0,
@@ -41,7 +73,7 @@ class CatanRemoteEnvironment(PyEnvironment):
             name="action",
         )
 
-        self._observation_spec = {
+        observation_spec = {
             "observation": BoundedArraySpec(
                 shape=(OBSERVATION_SPEC,),
                 dtype=np.float32,
@@ -58,10 +90,57 @@ class CatanRemoteEnvironment(PyEnvironment):
             ),
         }
 
+        return action_spec, observation_spec
+
     @staticmethod
     def constraint_splitter(state: dict[str, T]) -> tuple[T, T]:
         return state["observation"], state["mask"]
 
+    def _observe(self, model: ReceivedStateModel) -> dict[str, NDArray[np.float32] | NDArray[np.int32]]:
+        """Converts the given state into an observation, decoded into the observation pool if enabled.
+
+        :param model: The received state.
+        :return: A dictionary containing both the 'observation' and 'mask'.
+        """
+        start = time.perf_counter_ns()
+        self.phase = model.phase
+        self.telemetry.count("type", model.type)
+        self.telemetry.count("phase", model.phase)
+
+        observation = model.to_observation() if self.observations is None else self.observations.acquire(model)
+        if self.recorder is not None:
+            self.recorder.record_state(model, observation)
+
+        self.latencies.record("observe", model.phase, start)
+
+        return observation
+
+    def _action_model(self, action: NDArray[np.int32]) -> SubmittedActionModel:
+        """Converts the chosen action into the model submitted to the engine.
+
+        :param action: The action the agent chose.
+        :return: The model of the chosen action.
+        """
+        index = int(action)
+        if self.recorder is not None:
+            self.recorder.record_action(index)
+
+        return SubmittedActionModel.of(self.player_number, index)
+
+    def _receive_state(self) -> ReceivedStateModel:
+        """Blocks until the next state of the engine is received.
+
+        :return: The received state.
+        """
+        return self.channel.state.get()
+
+    def _submit_action(self, action_model: SubmittedActionModel) -> None:
+        """Hands the chosen action over to the server that answers the engine.
+
+        :param action_model: The chosen action.
+        """
+        self.channel.action.put(action_model)
+
     def _reset(self) -> TimeStep:
         """Resets the current environment and starts a new episode.
 
@@ -74,31 +153,41 @@ class CatanRemoteEnvironment(PyEnvironment):
 
         :return: The start transition of the new episode.
         """
-        model = ENVIRONMENT_STATE.get()
+        return self._restart(self._receive_state())
 
+    def _restart(self, model: ReceivedStateModel) -> TimeStep:
+        """Starts a new episode using the given state.
+
+        :param model: The state received at the start of the episode.
+        :return: The start transition of the new episode.
+        """
         if model.type != MessageType.EPISODE_STARTS:
             raise Exception("This episode has not yet ended, something must have gone wrong!")
 
         self.player_number = model.player_number
         self._episode_ended = False
-        self._state = model.to_observation()
+        self._state = self._observe(model)
 
         return trajectories.restart(self._state)  # type: ignore
 
     def _perform_action(self, action: NDArray[np.int32]) -> tuple[dict[str, NDArray[np.float32] | NDArray[np.int32]], MessageType]:
         """Submits the chosen action to the environment and returns the new state.
 
-        The chosen action is pushed into the response queue of the underlying server,
-        and then we wait until a new state is received and pushed into the request queue.
+        The chosen action is handed over to the server through this environments channel,
+        and then we wait until a new state is received and handed over by the server.
 
         :param action: The chosen action passed to the `_step` method.
         :return: The new observation of the environment.
         """
-        action_model = SubmittedActionModel(self.player_number, int(action))
-        ENVIRONMENT_ACTION.put(action_model)
-        state_model = ENVIRONMENT_STATE.get()
+        start = time.perf_counter_ns()
+        action_model = self._action_model(action)
+        self._submit_action(action_model)
+        state_model = self._receive_state()
+
+        # the round trip through the server and the engine
+        self.latencies.record("handoff", state_model.phase, start)
 
-        return state_model.to_observation(), state_model.type
+        return self._observe(state_model), state_model.type
 
     def _perform_dummy_action(self) -> None:
         """Send a dummy action back the environment.
@@ -112,8 +201,8 @@ class CatanRemoteEnvironment(PyEnvironment):
         If the episode ends with the current state the agent is no longer required
         to select and send an action, therefore a dummy action is send.
         """
-        action_model = SubmittedActionModel(self.player_number, -1)
-        ENVIRONMENT_ACTION.put(action_model)
+        action_model = SubmittedActionModel.of(self.player_number, -1)
+        self._submit_action(action_model)
 
     @staticmethod
     def episode_end_signal(old_observation: NDArray[np.float32], current_observation: NDArray[np.float32]) -> float | None:
@@ -121,17 +210,14 @@ class CatanRemoteEnvironment(PyEnvironment):
             reward = -1.0
 
             # reward = max(old_observation[0], current_observation[0]) * (-1)
-            LOGGER.info(f"Reward := {reward}, Episode lost!")
             return reward
 
-        LOGGER.info(f"Agent did not lose, using default reward.")
         return None
 
     @staticmethod
     def naive_additive_reward(old_observation: NDArray[np.float32], new_observation: NDArray[np.float32]) -> float:
         """Naive reward function that simply assigns rewards based on the victory points gained."""
         delta_vp = new_observation[0] - old_observation[0]
-        LOGGER.info(f"Reward := {delta_vp}")
         return delta_vp
 
     @staticmethod
@@ -139,12 +225,14 @@ class CatanRemoteEnvironment(PyEnvironment):
         """Reward function based on a negative target distance with polynomial weighting."""
         corrected_target_offset = min(current_observation[0], 1)
         reward = (corrected_target_offset**degree) - 1
-        LOGGER.info(f"Reward := {reward}")
         return reward
 
     def _calculate_rewards(self, message_type: MessageType, old_observation: NDArray[np.float32], new_observation: NDArray[np.float32]) -> float:
         """Calculate rewards based on the old and new state after any taken action.
 
+        Rewards and episode outcomes are aggregated by the telemetry of this environment
+        instead of being logged every step.
+
         :param old_observation: The old observation before the latest action was taken.
         :param new_observation: The new observation after the latest action was taken.
         :return: A value representing the reward for this action.
@@ -152,14 +240,23 @@ class CatanRemoteEnvironment(PyEnvironment):
 
         if message_type == MessageType.EPISODE_ENDS and self.use_episode_end_signal:
             if reward := self.episode_end_signal(old_observation, new_observation):
+                self.telemetry.count("episode", "lost")
+                self.telemetry.info("Reward := %s, Episode lost!", reward)
+                self.telemetry.observe("reward", reward)
                 return reward
 
-        return (
+            self.telemetry.count("episode", "not lost")
+
+        reward = (
             CatanRemoteEnvironment.naive_additive_reward(old_observation, new_observation)
             if self.reward_mode == "naive"
             else CatanRemoteEnvironment.polynomial_distance_reward(new_observation, self.reward_mode)
         )
 
+        self.telemetry.info("Reward := %s", reward)
+        self.telemetry.observe("reward", reward)
+        return reward
+
     def _step(self, action: NDArray[np.int32]) -> TimeStep:  # type: ignore
         """Updates the environment and returns the next transition.
 
@@ -169,14 +266,36 @@ class CatanRemoteEnvironment(PyEnvironment):
         if self._episode_ended:
             return self.reset()
 
+        start = time.perf_counter_ns()
         observation, message_type = self._perform_action(action)
+        time_step = self._transition(observation, message_type)
+
+        if self._episode_ended:
+            self._perform_dummy_action()
+
+        self.latencies.record("step", self.phase, start)
+        return time_step
+
+    def _transition(self, observation: dict[str, NDArray[np.float32] | NDArray[np.int32]], message_type: MessageType) -> TimeStep:
+        """Moves the environment to the given observation and returns the matching transition.
+
+        :param observation: The new observation received after the latest action.
+        :param message_type: The message type of the received state.
+        :return: A new transition that either continues or ends the current episode.
+        """
+        start = time.perf_counter_ns()
         reward = self._calculate_rewards(
             message_type,
             cast(NDArray[np.float32], CatanRemoteEnvironment.constraint_splitter(self._state)[0]),
             cast(NDArray[np.float32], CatanRemoteEnvironment.constraint_splitter(observation)[0]),
         )
+        self.latencies.record("reward", self.phase, start)
+
+        if self.recorder is not None:
+            self.recorder.record_reward(reward)
 
         self._state = observation
+        self.telemetry.tick()
 
         match message_type:
             case MessageType.EPISODE_CONTINUES:
@@ -184,7 +303,6 @@ class CatanRemoteEnvironment(PyEnvironment):
 
             case MessageType.EPISODE_ENDS:
                 self._episode_ended = True
-                self._perform_dummy_action()
                 return trajectories.termination(self._state, reward)  # type: ignore
 
             case _:
@@ -196,14 +314,25 @@ class CatanRemoteEnvironment(PyEnvironment):
     def observation_spec(self) -> dict[str, BoundedArraySpec]:
         return self._observation_spec
 
+    def close(self) -> None:
+        """Flushes the aggregated telemetry of the last interval and all recorded trajectories."""
+        self.telemetry.flush()
+
+        if self.recorder is not None:
+            self.recorder.close()
+
+        return super().close()
+
 
 # this could be moved into the base class using generics but for now this is much simpler
 
 
 class CatanHttpEnvironment(CatanRemoteEnvironment):
-    def __init__(self, parameters: EnvironmentParams):
+    def __init__(self, parameters: EnvironmentParams, threaded: bool = True):
         super().__init__(parameters)
-        self.server, self.start_callback, self.stop_callback = server.EnvironmentHttpServer.server_factory(parameters.host, parameters.port)
+        self.server, self.start_callback, self.stop_callback = server.EnvironmentHttpServer.server_factory(
+            parameters.host, parameters.port, self.channel, threaded
+        )
         self.server_thread = Thread(target=self.start_callback)
         self.server_thread.daemon = True
         self.server_thread.start()
@@ -215,14 +344,287 @@ class CatanHttpEnvironment(CatanRemoteEnvironment):
 
 
 class CatanSocketEnvironment(CatanRemoteEnvironment):
-    def __init__(self, parameters: EnvironmentParams):
+    def __init__(self, parameters: EnvironmentParams, shared_server: server.EnvironmentSocketServer | None = None):
+        """Creates a new environment served by a socket server.
+
+        Without a `shared_server` a new server is started and owned by this environment,
+        otherwise this environment is bound to the next engine connecting to the given server.
+
+        :param parameters: The environment parameters.
+        :param shared_server: An already running server to share, defaults to None.
+        """
         super().__init__(parameters)
-        self.server, self.start_callback, self.stop_callback = server.EnvironmentSocketServer.server_factory(parameters.host, parameters.port)
-        self.server_thread = Thread(target=self.start_callback)
-        self.server_thread.daemon = True
-        self.server_thread.start()
+
+        self.owns_server = shared_server is None
+        if shared_server is None:
+            self.server, self.start_callback, self.stop_callback = server.EnvironmentSocketServer.server_factory(
+                parameters.host, parameters.port, parameters.socket_path
+            )
+            self.server_thread = Thread(target=self.start_callback)
+            self.server_thread.daemon = True
+            self.server_thread.start()
+        else:
+            self.server = shared_server
+
+        self.server.add_channel(self.channel)
+
+    @classmethod
+    def create_pool(cls, parameters: EnvironmentParams, size: int) -> list["CatanSocketEnvironment"]:
+        """Creates multiple environments that share a single server and therefore a single endpoint.
+
+        Each engine connecting to the endpoint is bound to its own environment, i.e. a single
+        process can serve `size` concurrent games. Closing the first environment stops the
+        shared server and therefore all games.
+
+        :param parameters: The environment parameters shared by all environments.
+        :param size: The number of environments i.e. concurrent engine connections.
+        :return: The created environments.
+        """
+        owner = cls(parameters)
+        return [owner, *[cls(parameters, owner.server) for _ in range(size - 1)]]
 
     def close(self) -> None:
-        """Closes the environment by stopping the underlying socket server."""
-        self.stop_callback()
+        """Closes the environment by stopping the underlying socket server (if owned)."""
+        if self.owns_server:
+            self.stop_callback()
+        return super().close()
+
+
+class CatanAsyncEnvironment(CatanRemoteEnvironment):
+    channel: AsyncEnvironmentChannel
+
+    def __init__(
+        self,
+        parameters: EnvironmentParams,
+        shared_server: server.EnvironmentAsyncServer | None = None,
+        loop: asyncio.AbstractEventLoop | None = None,
+    ):
+        """Creates a new environment served by an `asyncio` server.
+
+        Besides the blocking `PyEnvironment` interface this environment provides the awaitable
+        `reset_async` and `step_async` methods, these must be awaited on the event loop of the
+        environment, which allows a single loop to drive many concurrent games.
+
+        Without a `loop` a new event loop is run on a background thread and owned by this
+        environment. Without a `shared_server` a new server is started on the event loop,
+        otherwise this environment is bound to the next engine connecting to the given server.
+
+        :param parameters: The environment parameters.
+        :param shared_server: An already running server to share, defaults to None.
+        :param loop: The event loop to serve the engine on, defaults to None.
+        """
+        super().__init__(parameters, AsyncEnvironmentChannel())
+
+        self.owns_loop = loop is None and shared_server is None
+        self.owns_server = shared_server is None
+
+        if shared_server is not None:
+            self.loop = shared_server.loop
+        elif loop is not None:
+            self.loop = loop
+        else:
+            self.loop = asyncio.new_event_loop()
+            self.loop_thread = Thread(target=self.loop.run_forever)
+            self.loop_thread.daemon = True
+            self.loop_thread.start()
+
+        if shared_server is None:
+            self.server = server.EnvironmentAsyncServer(parameters.host, parameters.port, self.loop, parameters.socket_path)
+            started = asyncio.run_coroutine_threadsafe(self.server.start(), self.loop)
+
+            # a foreign loop may not be running yet or may be running on this very thread
+            if self.owns_loop:
+                started.result()
+        else:
+            self.server = shared_server
+
+        self.server.add_channel(self.channel)
+
+    @classmethod
+    def create_pool(cls, parameters: EnvironmentParams, size: int, loop: asyncio.AbstractEventLoop | None = None) -> list["CatanAsyncEnvironment"]:
+        """Creates multiple environments that share a single server and a single event loop.
+
+        :param parameters: The environment parameters shared by all environments.
+        :param size: The number of environments i.e. concurrent engine connections.
+        :param loop: The event loop to serve the engines on, defaults to None.
+        :return: The created environments.
+        """
+        owner = cls(parameters, loop=loop)
+        return [owner, *[cls(parameters, owner.server) for _ in range(size - 1)]]
+
+    def _run_on_loop(self, coroutine: Coroutine[Any, Any, T]) -> T:
+        """Runs the given coroutine on the event loop of this environment and waits for its result.
+
+        :param coroutine: The coroutine to run.
+        :return: The result of the coroutine.
+        """
+        try:
+            on_loop = asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            on_loop = False
+
+        if on_loop:
+            raise Exception("The blocking interface can not be used from within its own event loop, use the async methods instead.")
+
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def _receive_state(self) -> ReceivedStateModel:
+        return self._run_on_loop(self.channel.state.get())
+
+    def _submit_action(self, action_model: SubmittedActionModel) -> None:
+        self._run_on_loop(self.channel.action.put(action_model))
+
+    async def reset_async(self) -> TimeStep:
+        """Awaitable version of `reset`, must be awaited on the event loop of this environment.
+
+        :return: The start transition of the new episode.
+        """
+        self._current_time_step = self._restart(await self.channel.state.get())
+        return self._current_time_step
+
+    async def step_async(self, action: NDArray[np.int32]) -> TimeStep:
+        """Awaitable version of `step`, must be awaited on the event loop of this environment.
+
+        :param action: The action the agent chose.
+        :return: A new transition that either continues or ends the current episode.
+        """
+        if self._current_time_step is None or self._episode_ended:
+            return await self.reset_async()
+
+        await self.channel.action.put(self._action_model(action))
+        state_model = await self.channel.state.get()
+        self._current_time_step = self._transition(self._observe(state_model), state_model.type)
+
+        if self._episode_ended:
+            await self.channel.action.put(SubmittedActionModel.of(self.player_number, -1))
+
+        return self._current_time_step
+
+    def close(self) -> None:
+        """Closes the environment by stopping the underlying server and event loop (if owned)."""
+        if self.owns_server:
+            stopped = asyncio.run_coroutine_threadsafe(self.server.stop(), self.loop)
+
+            if self.owns_loop:
+                stopped.result()
+                self.loop.call_soon_threadsafe(self.loop.stop)
+
+        return super().close()
+
+
+class CatanSharedMemoryEnvironment(CatanRemoteEnvironment):
+    def __init__(self, parameters: EnvironmentParams, name: str | None = None):
+        """Creates a new environment that exchanges states and actions with a same-host engine through shared memory.
+
+        No server thread is involved, states are read and actions are written directly by the
+        environment, the engine attaches to the segment using its name.
+
+        :param parameters: The environment parameters.
+        :param name: The name of the shared memory segment, defaults to `catan-environment-<port>`.
+        """
+        super().__init__(parameters)
+        self.segment = server.SharedMemorySegment(name or f"catan-environment-{parameters.port}", create=True)
+        self.holds_state = False
+
+    def _receive_state(self) -> ReceivedStateModel:
+        message = self.segment.states.read()
+        self.holds_state = True
+
+        # the decoded model points into the slot, which is released once the state was answered
+        return wire.decode_state(message, WireFormat.BINARY)
+
+    def _submit_action(self, action_model: SubmittedActionModel) -> None:
+        if self.holds_state:
+            self.segment.states.release()
+            self.holds_state = False
+
+        self.segment.actions.write(wire.encode_action(action_model, WireFormat.BINARY))
+
+    def close(self) -> None:
+        """Closes the environment by removing the shared memory segment."""
+        self.segment.close()
+        return super().close()
+
+
+class CatanBatchedEnvironment(PyEnvironment):
+    def __init__(self, environments: list[CatanRemoteEnvironment]):
+        """Combines multiple remote environments into a single batched environment.
+
+        Observations, masks, rewards etc. are stacked along a leading batch dimension of size
+        `len(environments)`, i.e. a policy decides for all games at once. Each slot resets on its
+        own, the step after an episode ended returns the first transition of the next episode
+        of that slot while the given action is ignored.
+
+        :param environments: The environments to combine, usually created by `create_pool`.
+        """
+        super().__init__(False)
+        self.environments = environments
+
+    @classmethod
+    def from_socket_pool(cls, parameters: EnvironmentParams, size: int) -> "CatanBatchedEnvironment":
+        """Creates a batched environment serving `size` engines on a single socket endpoint.
+
+        :param parameters: The environment parameters shared by all games.
+        :param size: The batch size i.e. number of concurrent games.
+        :return: The batched environment.
+        """
+        return cls([*CatanSocketEnvironment.create_pool(parameters, size)])
+
+    @property
+    def batched(self) -> bool:
+        return True
+
+    @property
+    def batch_size(self) -> int:
+        return len(self.environments)
+
+    @staticmethod
+    def _stack(time_steps: list[TimeStep]) -> TimeStep:
+        stacked = nest_utils.stack_nested_arrays(time_steps)
+        return stacked._replace(reward=stacked.reward.astype(np.float32), discount=stacked.discount.astype(np.float32))
+
+    def _reset(self) -> TimeStep:
+        """Starts a new episode in every slot, blocks until all engines started their episode.
+
+        :return: The stacked start transitions.
+        """
+        return CatanBatchedEnvironment._stack([environment._reset() for environment in self.environments])
+
+    def _step(self, action: NDArray[np.int32]) -> TimeStep:  # type: ignore
+        """Submits the chosen actions of all slots and returns the stacked transitions.
+
+        All actions are submitted before any state is awaited, therefore all engines compute
+        their next state concurrently.
+
+        :param action: The chosen actions, one per slot.
+        :return: The stacked transitions.
+        """
+        for environment, slot_action in zip(self.environments, action):
+            if not environment._episode_ended:
+                environment._submit_action(environment._action_model(slot_action))
+
+        time_steps: list[TimeStep] = []
+        for environment in self.environments:
+            if environment._episode_ended:
+                time_steps.append(environment._reset())
+                continue
+
+            state_model = environment._receive_state()
+            time_steps.append(environment._transition(environment._observe(state_model), state_model.type))
+
+            if environment._episode_ended:
+                environment._perform_dummy_action()
+
+        return CatanBatchedEnvironment._stack(time_steps)
+
+    def action_spec(self) -> BoundedArraySpec:
+        return self.environments[0].action_spec()
+
+    def observation_spec(self) -> dict[str, BoundedArraySpec]:
+        return self.environments[0].observation_spec()
+
+    def close(self) -> None:
+        """Closes all slots, the owner of a shared server is closed last."""
+        for environment in reversed(self.environments):
+            environment.close()
         return super().close()
@@ -0,0 +1,200 @@
+import time
+from threading import Lock
+from typing import Any
+
+from environment.enums import Phase
+
+# values are recorded in nanoseconds, each power of two range is split into 2^(SUB_BUCKET_BITS - 1)
+# linear sub-buckets, i.e. every recorded value is accurate to within 1 / 2^(SUB_BUCKET_BITS - 1) ~ 3%
+SUB_BUCKET_BITS = 6
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+HALF_SUB_BUCKETS = SUB_BUCKETS >> 1
+
+# 2^40 ns ~ 18 minutes, longer values are clamped into the last bucket
+MAX_VALUE_BITS = 40
+BUCKETS = SUB_BUCKETS + (MAX_VALUE_BITS - SUB_BUCKET_BITS) * HALF_SUB_BUCKETS
+
+PERCENTILES = [50.0, 90.0, 99.0, 99.9]
+
+# histograms of stages that are not associated with a received state
+NO_PHASE = None
+
+enabled = True
+
+
+def _bucket_index(value: int) -> int:
+    if value < SUB_BUCKETS:
+        return max(value, 0)
+
+    shift = value.bit_length() - SUB_BUCKET_BITS
+    return min(SUB_BUCKETS + (shift - 1) * HALF_SUB_BUCKETS + (value >> shift) - HALF_SUB_BUCKETS, BUCKETS - 1)
+
+
+def _bucket_value(index: int) -> int:
+    """Returns the midpoint of the given bucket, i.e. the value reported for all values within the bucket."""
+    if index < SUB_BUCKETS:
+        return index
+
+    shift = (index - SUB_BUCKETS) // HALF_SUB_BUCKETS + 1
+    lowest = ((index - SUB_BUCKETS) % HALF_SUB_BUCKETS + HALF_SUB_BUCKETS) << shift
+    return lowest + (1 << (shift - 1))
+
+
+class LatencyHistogram:
+    """HDR-style histogram with log-linear buckets and a fixed memory footprint.
+
+    Recording a value is a couple of integer operations and a single list increment.
+    """
+
+    def __init__(self) -> None:
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.total = 0
+        self.minimum = 0
+        self.maximum = 0
+
+    def record(self, value: int) -> None:
+        """Records a single value.
+
+        :param value: The value [ns].
+        """
+        self.counts[_bucket_index(value)] += 1
+
+        if not self.count or value < self.minimum:
+            self.minimum = value
+        if value > self.maximum:
+            self.maximum = value
+
+        self.count += 1
+        self.total += value
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        """Adds all values of the given histogram to this histogram."""
+        if not other.count:
+            return
+
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.minimum = min(self.minimum, other.minimum) if self.count else other.minimum
+        self.maximum = max(self.maximum, other.maximum)
+        self.count += other.count
+        self.total += other.total
+
+    def percentile(self, percentile: float) -> int:
+        """Returns the (bucket accurate) value below which the given percentage of values fall.
+
+        :param percentile: The percentile within [0, 100].
+        :return: The value [ns].
+        """
+        threshold = max(percentile / 100 * self.count, 1)
+
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= threshold:
+                return min(_bucket_value(index), self.maximum)
+
+        return self.maximum
+
+    def summary(self) -> dict[str, Any]:
+        """Summarizes this histogram, all values are given in microseconds."""
+        return {
+            "count": self.count,
+            "min": round(self.minimum / 1e3, 3),
+            "mean": round(self.total / max(self.count, 1) / 1e3, 3),
+            **{f"p{percentile:g}": round(self.percentile(percentile) / 1e3, 3) for percentile in PERCENTILES},
+            "max": round(self.maximum / 1e3, 3),
+        }
+
+
+class LatencyRecorder:
+    """Latency histograms of multiple stages, each broken down by the game phase.
+
+    A recorder must only be used by a single thread, every thread (server connections,
+    environments, players) therefore creates its own recorder using `recorder`, all
+    recorders are combined into a single summary by `snapshot`.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.histograms: dict[tuple[str, Phase | None], LatencyHistogram] = {}
+
+    def record(self, stage: str, phase: Phase | None, start: int, end: int | None = None) -> None:
+        """Records the latency of a single pass through the given stage.
+
+        :param stage: The name of the stage, e.g. 'decode'.
+        :param phase: The phase of the state the stage processed.
+        :param start: The start of the stage, see `time.perf_counter_ns`.
+        :param end: The end of the stage, defaults to now.
+        """
+        if not enabled:
+            return
+
+        key = (stage, phase)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = LatencyHistogram()
+
+        histogram.record((end if end is not None else time.perf_counter_ns()) - start)
+
+
+RECORDERS: list[LatencyRecorder] = []
+RECORDERS_LOCK = Lock()
+
+
+def recorder(name: str) -> LatencyRecorder:
+    """Creates and registers a new recorder that is included in all future snapshots.
+
+    :param name: The name of the component owning the recorder, e.g. 'socket server'.
+    :return: The new recorder.
+    """
+    with RECORDERS_LOCK:
+        RECORDERS.append(LatencyRecorder(name))
+        return RECORDERS[-1]
+
+
+class RecorderPool:
+    """Recorders of a single component whose stages run on a changing set of threads, e.g. one per connection.
+
+    Every thread acquires a recorder for as long as it runs and releases it afterwards, released recorders
+    are handed to the next thread. I.e. each recorder is only used by a single thread at a time and the
+    number of registered recorders is bounded by the number of concurrent threads, not by all threads ever run.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.free: list[LatencyRecorder] = []
+        self.lock = Lock()
+
+    def acquire(self) -> LatencyRecorder:
+        with self.lock:
+            if self.free:
+                return self.free.pop()
+
+        return recorder(self.name)
+
+    def release(self, latency_recorder: LatencyRecorder) -> None:
+        with self.lock:
+            self.free.append(latency_recorder)
+
+
+def snapshot(reset: bool = True) -> list[dict[str, Any]]:
+    """Combines the histograms of all recorders by component, stage and phase.
+
+    :param reset: Whether to start new histograms afterwards, i.e. each snapshot covers one interval.
+    :return: One summary per component, stage and phase, sorted by those.
+    """
+    combined: dict[tuple[str, str, Phase | None], LatencyHistogram] = {}
+
+    with RECORDERS_LOCK:
+        for latency_recorder in RECORDERS:
+            histograms = latency_recorder.histograms
+            if reset:
+                latency_recorder.histograms = {}
+
+            for (stage, phase), histogram in [*histograms.items()]:
+                combined.setdefault((latency_recorder.name, stage, phase), LatencyHistogram()).merge(histogram)
+
+    return [
+        {"component": name, "stage": stage, "phase": phase.name if phase is not None else "", **histogram.summary()}
+        for (name, stage, phase), histogram in sorted(combined.items(), key=lambda item: (item[0][0], item[0][1], -1 if item[0][2] is None else item[0][2]))
+    ]
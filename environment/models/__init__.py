@@ -1,4 +1,4 @@
 # type: ignore
 
-from .received_state_model import ReceivedStateModel
-from .submitted_action_model import SubmittedActionModel
+from .received_state_model import OBSERVATION_SIZE, ReceivedStateModel
+from .submitted_action_model import ACTION_SPACE_SIZE, SubmittedActionModel
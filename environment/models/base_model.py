@@ -1,10 +1,11 @@
-import json
 from dataclasses import asdict, dataclass
 from io import BytesIO
 from typing import Any
 
+import orjson
 
-@dataclass
+
+@dataclass(slots=True)
 class BaseModel:
     def to_dictionary(self) -> dict[str, Any]:
         """Converts this model into a plain dictionary.
@@ -18,8 +19,7 @@ class BaseModel:
 
         :return: The 'utf-8' encoded json representation of this model.
         """
-        json_str = json.dumps(self.to_dictionary())
-        return json_str.encode("utf-8")
+        return orjson.dumps(self, option=orjson.OPT_SERIALIZE_NUMPY)
 
     @classmethod
     def from_stream(cls, json_stream: BytesIO) -> "BaseModel":
@@ -28,7 +28,7 @@ class BaseModel:
         :param json_stream: A readable json byte stream.
         :return: A instance of this model.
         """
-        decoded = json.load(json_stream)
+        decoded = orjson.loads(json_stream.read())
         return cls(**decoded)
 
     @classmethod
@@ -38,5 +38,5 @@ class BaseModel:
         :param json_stream: A readable json byte stream.
         :return: A instance of this model.
         """
-        decoded = json.loads(json_bytes)
-        return cls(**decoded)
\ No newline at end of file
+        decoded = orjson.loads(json_bytes)
+        return cls(**decoded)
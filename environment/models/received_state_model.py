@@ -1,6 +1,6 @@
-import builtins
 from dataclasses import dataclass
-from typing import cast
+from enum import IntEnum
+from typing import TypeVar
 
 import numpy as np
 from numpy.typing import NDArray
@@ -9,15 +9,33 @@ from environment.enums import MessageType, PlayerNumber, Phase
 
 from .base_model import BaseModel
 
+# number of features of every observation
+OBSERVATION_SIZE = 841
 
-@dataclass
+E = TypeVar("E", bound=IntEnum)
+
+
+def lookup_table(enum: type[E]) -> dict[int | str, E]:
+    """Maps the values and names of all members of the given enum to the members themselves.
+
+    Members of an `IntEnum` hash and compare like their values, i.e. they map to themselves.
+    """
+    return {**{member.value: member for member in enum}, **{member.name: member for member in enum}}
+
+
+PLAYER_NUMBERS = lookup_table(PlayerNumber)
+MESSAGE_TYPES = lookup_table(MessageType)
+PHASES = lookup_table(Phase)
+
+
+@dataclass(slots=True)
 class ReceivedStateModel(BaseModel):
     player_number: PlayerNumber
     type: MessageType
     phase: Phase
     step: int
-    state: list[float]
-    mask: list[float]
+    state: list[float] | NDArray[np.float32]
+    mask: list[float] | NDArray[np.uint8]
 
     def __post_init__(self):
         """Handle datatype conversions for enum types.
@@ -26,36 +44,18 @@ class ReceivedStateModel(BaseModel):
         the passed values could be of type `int` i.e. the enums value
         or of type `str` i.e. the name of the value.
 
-        Conversion is not handled automatically.
+        Conversion is handled by a single lookup per enum, enum members map to themselves.
         """
-
-        match type(self.player_number):
-            case builtins.str:
-                self.player_number = PlayerNumber[cast(str, self.type)]
-            case builtins.int:
-                self.player_number = PlayerNumber(self.type)
-            case _:
-                pass
-
-        match type(self.type):
-            case builtins.str:
-                self.type = MessageType[cast(str, self.type)]
-            case builtins.int:
-                self.type = MessageType(self.type)
-            case _:
-                pass
-
-        match type(self.phase):
-            case builtins.str:
-                self.phase = Phase[cast(str, self.phase)]
-            case builtins.int:
-                self.phase = Phase(self.phase)
-            case _:
-                pass
+        self.player_number = PLAYER_NUMBERS[self.player_number]
+        self.type = MESSAGE_TYPES[self.type]
+        self.phase = PHASES[self.phase]
 
     def to_observation(self) -> dict[str, NDArray[np.float32] | NDArray[np.int32]]:
         """Converts this model to an observation spec.
 
+        The observation and mask are always copied, i.e. the result stays valid even
+        if this model was decoded from a (reused) binary receive buffer.
+
         :return: A dictionary containing both the 'observation' and 'mask'
             as numpy arrays to be used within the environment.
         """
@@ -1,11 +1,34 @@
 from dataclasses import dataclass
+from typing import ClassVar
 
 from environment.enums import PlayerNumber
 
 from .base_model import BaseModel
 
+# number of actions every player can choose from
+ACTION_SPACE_SIZE = 218
 
-@dataclass
+
+@dataclass(slots=True)
 class SubmittedActionModel(BaseModel):
     player_number: PlayerNumber
     index: int
+
+    # one instance per player and action (including the dummy action -1), see `of`
+    INSTANCES: ClassVar[list[list["SubmittedActionModel"]]]
+
+    @staticmethod
+    def of(player_number: PlayerNumber, index: int) -> "SubmittedActionModel":
+        """Returns the shared instance of the given action, i.e. choosing an action allocates nothing.
+
+        :param player_number: The player choosing the action.
+        :param index: The index of the chosen action, -1 for the dummy action.
+        :return: The model of the chosen action, shared instances must not be modified.
+        """
+        if -1 <= index < ACTION_SPACE_SIZE:
+            return SubmittedActionModel.INSTANCES[player_number][index + 1]
+
+        return SubmittedActionModel(player_number, index)
+
+
+SubmittedActionModel.INSTANCES = [[SubmittedActionModel(player, index) for index in range(-1, ACTION_SPACE_SIZE)] for player in PlayerNumber]
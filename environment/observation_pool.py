@@ -0,0 +1,51 @@
+import numpy as np
+from numpy.typing import NDArray
+
+from environment.models import ReceivedStateModel
+
+
+class ObservationPool:
+    """Ring of preallocated observation and mask arrays that received states are decoded into.
+
+    Every call to `acquire` overwrites the oldest slot and returns the very same dictionary (and
+    arrays) that slot returned `size` calls ago, i.e. no memory is allocated per step.
+
+    Ownership: an observation returned by `acquire` stays valid for the next `size - 1` calls, the
+    environment keeps the latest one to calculate the reward of the next state. `TFPyEnvironment` does
+    not copy observations: a single environment is batched using `np.expand_dims`, i.e. a view, and
+    `numpy_function` may hand aligned numpy buffers to tf as they are, i.e. the tensors of a time step
+    may alias its slot. Consumers must copy anything they keep (e.g. add it to a replay buffer).
+
+    The drivers of `utils.driver` hold the current and the next time step of a transition until it was
+    added, which completes before the next state is decoded (the step counter depends on it). I.e. two
+    slots are in use while a third one is decoded into, hence the minimum size.
+    """
+
+    MINIMUM_SIZE = 3
+
+    def __init__(self, size: int, observation_size: int, action_size: int) -> None:
+        if size < ObservationPool.MINIMUM_SIZE:
+            raise Exception(f"An observation pool requires at least {ObservationPool.MINIMUM_SIZE} slots, got {size}.")
+
+        self.size = size
+        self.position = 0
+
+        self.observations = np.zeros((size, observation_size), dtype=np.float32)
+        self.masks = np.zeros((size, action_size), dtype=np.int32)
+        self.slots: list[dict[str, NDArray[np.float32] | NDArray[np.int32]]] = [
+            {"observation": self.observations[i], "mask": self.masks[i]} for i in range(size)
+        ]
+
+    def acquire(self, model: ReceivedStateModel) -> dict[str, NDArray[np.float32] | NDArray[np.int32]]:
+        """Decodes the given state into the next slot of the ring.
+
+        :param model: The received state.
+        :return: A dictionary containing both the 'observation' and 'mask', see ownership rules.
+        """
+        slot = self.slots[self.position]
+        self.position = (self.position + 1) % self.size
+
+        np.copyto(slot["observation"], model.state)
+        np.copyto(slot["mask"], model.mask)
+
+        return slot
@@ -0,0 +1,163 @@
+from pathlib import Path
+
+import numpy as np
+from numpy.typing import NDArray
+from tf_agents import trajectories  # type: ignore
+from tf_agents.environments.py_environment import PyEnvironment  # type: ignore
+from tf_agents.specs.array_spec import BoundedArraySpec  # type: ignore
+from tf_agents.trajectories.time_step import TimeStep  # type: ignore
+
+from environment.enums import MessageType, Phase
+from environment.environment import CatanRemoteEnvironment
+from environment.models.received_state_model import PHASES
+from environment.recorder import CHUNK_PATTERN
+
+
+class CatanOfflineEnvironment(PyEnvironment):
+    """Replays the episodes recorded by `TrajectoryRecorder` without an engine in the loop.
+
+    All chunk files within `path` (and its recorder directories) are memory-mapped, observations
+    are handed out as views of the mapped rows. Only complete episodes are replayed, i.e. episodes
+    whose chunks were partially dropped or that were still running when recording stopped are
+    skipped. Chosen actions do not influence the replay, actions that differ from the recorded
+    action are counted in `mismatched_actions`, all replayed steps in `steps`.
+
+    The specs match `CatanRemoteEnvironment`, i.e. every player and agent can be driven by a
+    `TFPyEnvironment` wrapping this environment. Episodes are replayed in recording order (or
+    shuffled) and start over once all episodes were replayed.
+    """
+
+    def __init__(self, path: Path, shuffle: bool = False, seed: int | None = None):
+        super().__init__(False)
+
+        self.chunks: list[NDArray[np.void]] = []
+        self.shuffle = shuffle
+        self.generator = np.random.default_rng(seed)
+
+        # location (chunk and row) of every recorded row, and first and last row of every complete episode
+        chunk_of: list[NDArray[np.int32]] = []
+        row_of: list[NDArray[np.int32]] = []
+        starts: list[NDArray[np.int64]] = []
+        ends: list[NDArray[np.int64]] = []
+        offset = 0
+
+        directories = [path, *sorted(directory for directory in path.iterdir() if directory.is_dir())]
+        for directory in directories:
+            files = sorted(directory.glob(CHUNK_PATTERN))
+            if not files:
+                continue
+
+            stream = [np.load(file, mmap_mode="r") for file in files]
+
+            # chunks missing between two files (dropped by the recorder) split the stream into segments
+            indices = [int(file.stem.split("-")[-1]) for file in files]
+            segments = np.repeat(np.cumsum([0] + [int(b - a != 1) for a, b in zip(indices, indices[1:])]), [len(chunk) for chunk in stream])
+
+            types = np.concatenate([chunk["type"] for chunk in stream])
+            episodes = np.concatenate([chunk["episode"] for chunk in stream])
+
+            stream_starts = np.flatnonzero(types == MessageType.EPISODE_STARTS)
+            stream_ends = np.flatnonzero(types == MessageType.EPISODE_ENDS)
+
+            following = np.searchsorted(stream_ends, stream_starts)
+            stream_starts, following = stream_starts[following < len(stream_ends)], following[following < len(stream_ends)]
+            stream_ends = stream_ends[following]
+
+            complete = (episodes[stream_starts] == episodes[stream_ends]) & (segments[stream_starts] == segments[stream_ends])
+
+            starts.append(stream_starts[complete] + offset)
+            ends.append(stream_ends[complete] + offset)
+            chunk_of.extend(np.full(len(chunk), len(self.chunks) + i, dtype=np.int32) for i, chunk in enumerate(stream))
+            row_of.extend(np.arange(len(chunk), dtype=np.int32) for chunk in stream)
+            self.chunks.extend(stream)
+            offset += len(types)
+
+        self.starts = np.concatenate(starts) if starts else np.zeros(0, dtype=np.int64)
+        self.ends = np.concatenate(ends) if ends else np.zeros(0, dtype=np.int64)
+
+        if not len(self.starts):
+            raise Exception(f"No complete episode was recorded within '{path}'.")
+
+        self.chunk_of = np.concatenate(chunk_of)
+        self.row_of = np.concatenate(row_of)
+
+        self.order = np.arange(len(self.starts))
+        self.next_episode = len(self.order)
+
+        self.position = 0
+        self.end = 0
+        self.phase: Phase | None = None
+        self.steps = 0
+        self.mismatched_actions = 0
+
+        self._action_spec, self._observation_spec = CatanRemoteEnvironment.create_specs()
+
+    @property
+    def episodes(self) -> int:
+        """The number of complete episodes that are replayed."""
+        return len(self.starts)
+
+    @property
+    def transitions(self) -> int:
+        """The number of transitions (steps) of all complete episodes."""
+        return int(np.sum(self.ends - self.starts))
+
+    def _row(self, position: int) -> np.void:
+        return self.chunks[self.chunk_of[position]][self.row_of[position]]
+
+    def _observe(self, row: np.void) -> dict[str, NDArray[np.float32] | NDArray[np.int32]]:
+        """Converts the given row into an observation, the observation is a view of the mapped row.
+
+        :param row: The recorded row.
+        :return: A dictionary containing both the 'observation' and 'mask'.
+        """
+        self.phase = PHASES[row["phase"]]
+        return {"observation": row["observation"], "mask": row["mask"].astype(np.int32)}
+
+    def _reset(self) -> TimeStep:
+        """Starts the next recorded episode, starting over (reshuffled) once all episodes were replayed.
+
+        :return: The start transition of the next episode.
+        """
+        if self.next_episode == len(self.order):
+            self.next_episode = 0
+            if self.shuffle:
+                self.generator.shuffle(self.order)
+
+        episode = self.order[self.next_episode]
+        self.next_episode += 1
+
+        self.position, self.end = int(self.starts[episode]), int(self.ends[episode])
+        self._episode_ended = False
+        self._state = self._observe(self._row(self.position))
+
+        return trajectories.restart(self._state)  # type: ignore
+
+    def _step(self, action: NDArray[np.int32]) -> TimeStep:  # type: ignore
+        """Moves to the next recorded row and returns the recorded transition.
+
+        :param action: The action the agent chose, it does not influence the replay.
+        :return: A new transition that either continues or ends the current episode.
+        """
+        if self._episode_ended:
+            return self.reset()
+
+        if int(action) != self._row(self.position)["action"]:
+            self.mismatched_actions += 1
+
+        self.steps += 1
+        self.position += 1
+        row = self._row(self.position)
+        self._state = self._observe(row)
+
+        if self.position == self.end:
+            self._episode_ended = True
+            return trajectories.termination(self._state, float(row["reward"]))  # type: ignore
+
+        return trajectories.transition(self._state, float(row["reward"]))  # type: ignore
+
+    def action_spec(self) -> BoundedArraySpec:
+        return self._action_spec
+
+    def observation_spec(self) -> dict[str, BoundedArraySpec]:
+        return self._observation_spec
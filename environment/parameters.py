@@ -9,6 +9,19 @@ class EnvironmentParams:
     port: int
     host: str = ""
 
+    # unix domain socket used by the socket environments instead of tcp, '@' prefixes an abstract name
+    socket_path: str = ""
+
+    # number of concurrent games served on the same endpoint and stepped as a single batch
+    batch_size: int = 1
+
+    # number of preallocated observations received states are decoded into, 0 allocates new arrays every step
+    observation_pool_size: int = 0
+
+    # directory to record all played trajectories to, empty disables recording
+    record_path: str = ""
+    record_chunk_size: int = 4096
+
     def __post_init__(self) -> None:
         """Convert `reward_type` from given `argparse` string."""
         if self.reward_mode == "naive":
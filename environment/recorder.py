@@ -0,0 +1,138 @@
+import itertools
+import logging
+import os
+from pathlib import Path
+from queue import Empty, Full, Queue
+from threading import Thread
+
+import numpy as np
+from numpy.typing import NDArray
+
+from environment.enums import MessageType
+from environment.models import ACTION_SPACE_SIZE, OBSERVATION_SIZE, ReceivedStateModel
+
+LOGGER = logging.getLogger("catan-environment")
+
+# every row holds a single received state, the reward received when reaching that state and
+# the action chosen within that state (-1 for the last state of an episode)
+TRANSITION_DTYPE = np.dtype(
+    [
+        ("observation", "<f4", (OBSERVATION_SIZE,)),
+        ("mask", "u1", (ACTION_SPACE_SIZE,)),
+        ("action", "<i4"),
+        ("reward", "<f4"),
+        ("episode", "<u4"),
+        ("step", "<u4"),
+        ("phase", "u1"),
+        ("player", "u1"),
+        ("type", "u1"),
+    ],
+    align=True,
+)
+
+CHUNK_PATTERN = "chunk-*.npy"
+
+_serial = itertools.count()
+
+
+class TrajectoryRecorder:
+    """Streams every received state of an environment into append-only chunk files.
+
+    Rows are written into an in-memory chunk of `chunk_size` rows, full chunks are handed over to a
+    background thread that saves them as `.npy` files (readable with `np.load(..., mmap_mode="r")`).
+    Chunks are written to a temporary file and renamed once complete, i.e. readers never see partial
+    chunks. Written chunk buffers are recycled, if the writer falls more than `max_pending` chunks
+    behind, chunks are dropped (and counted) instead of blocking the step loop.
+
+    Every recorder writes to its own directory within `path`, its chunks form a single stream of
+    consecutive episodes, the last chunk written on `close` may be shorter.
+    """
+
+    def __init__(self, path: Path, chunk_size: int = 4096, max_pending: int = 8) -> None:
+        self.directory = Path(path) / f"{os.getpid()}-{next(_serial)}"
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        self.chunk_size = chunk_size
+        self.pending: Queue[tuple[int, NDArray[np.void], int] | None] = Queue(max_pending)
+        self.free: Queue[NDArray[np.void]] = Queue()
+
+        self.chunk = np.zeros(chunk_size, dtype=TRANSITION_DTYPE)
+        self.chunk_index = 0
+        self.position = -1
+        self.episode = -1
+        self.dropped = 0
+
+        self.writer = Thread(target=self._write, daemon=True)
+        self.writer.start()
+
+    def record_state(self, model: ReceivedStateModel, observation: dict[str, NDArray[np.float32] | NDArray[np.int32]]) -> None:
+        """Starts a new row holding the given state, the reward and action are set by the following calls.
+
+        :param model: The received state.
+        :param observation: The observation the state was converted into.
+        """
+        self.position += 1
+        if self.position == self.chunk_size:
+            self._submit_chunk()
+
+        if model.type == MessageType.EPISODE_STARTS:
+            self.episode += 1
+
+        row = self.chunk[self.position]
+        row["observation"] = observation["observation"]
+        row["mask"] = observation["mask"]
+        row["action"] = -1
+        row["reward"] = 0
+        row["episode"] = self.episode
+        row["step"] = model.step
+        row["phase"] = model.phase
+        row["player"] = model.player_number
+        row["type"] = model.type
+
+    def record_reward(self, reward: float) -> None:
+        """Sets the reward received when reaching the state of the current row."""
+        self.chunk[self.position]["reward"] = reward
+
+    def record_action(self, index: int) -> None:
+        """Sets the action chosen within the state of the current row."""
+        self.chunk[self.position]["action"] = index
+
+    def _submit_chunk(self) -> None:
+        try:
+            self.pending.put_nowait((self.chunk_index, self.chunk, self.chunk_size))
+        except Full:
+            self.dropped += 1
+            LOGGER.warning(f"Trajectory writer fell behind, dropped chunk {self.chunk_index} of '{self.directory}'.")
+            self.chunk_index += 1
+            self.position = 0
+            return
+
+        self.chunk_index += 1
+        self.position = 0
+
+        try:
+            self.chunk = self.free.get_nowait()
+        except Empty:
+            self.chunk = np.zeros(self.chunk_size, dtype=TRANSITION_DTYPE)
+
+    def _write(self) -> None:
+        while (item := self.pending.get()) is not None:
+            index, chunk, rows = item
+            path = self.directory / f"chunk-{index:06d}.npy"
+            temporary = path.with_suffix(".tmp")
+
+            with open(temporary, "wb") as file:
+                np.save(file, chunk[:rows])
+            os.replace(temporary, path)
+
+            self.free.put(chunk)
+
+    def close(self) -> None:
+        """Writes the last (partial) chunk and waits for all chunks to be written."""
+        if self.position >= 0:
+            self.pending.put((self.chunk_index, self.chunk, self.position + 1))
+            self.chunk_index += 1
+            self.position = -1
+
+        self.pending.put(None)
+        self.writer.join()
@@ -2,3 +2,5 @@
 
 from environment.server.http_server import EnvironmentHttpServer
 from environment.server.socket_server import EnvironmentSocketServer
+from environment.server.async_server import EnvironmentAsyncServer
+from environment.server.shared_memory import SharedMemorySegment
@@ -0,0 +1,113 @@
+import asyncio
+import logging
+import time
+
+from environment import latency
+from environment.channels import AsyncEnvironmentChannel
+from environment.server import wire
+from environment.server.framing import HEADER
+from environment.server.socket_server import describe_endpoint, remove_socket_file, resolve_endpoint
+from environment.telemetry import Telemetry
+
+LOGGER = logging.getLogger("catan-environment")
+
+
+class EnvironmentAsyncServer:
+    def __init__(self, host: str, port: int, loop: asyncio.AbstractEventLoop, path: str = "") -> None:
+        self.family, self.address = resolve_endpoint(host, port, path)
+        self.loop = loop
+        self.server: asyncio.Server | None = None
+        self.writers: set[asyncio.StreamWriter] = set()
+        self.free_channels: asyncio.Queue[AsyncEnvironmentChannel] = asyncio.Queue()
+        self.telemetry = Telemetry(f"async server {describe_endpoint(self.address)}")
+        self.latencies = latency.recorder("async server")
+
+    def add_channel(self, channel: AsyncEnvironmentChannel) -> None:
+        """Registers a channel, the next accepted engine connection will be bound to it.
+
+        This method is thread safe, i.e. environments may be created outside of the event loop.
+
+        :param channel: The channel of the environment that should be served.
+        """
+        self.loop.call_soon_threadsafe(self.free_channels.put_nowait, channel)
+
+    async def start(self) -> None:
+        """Starts accepting engine connections on the event loop of this server."""
+        if isinstance(self.address, tuple):
+            self.server = await asyncio.start_server(self.serve_connection, *self.address)
+        else:
+            # stale socket files are replaced by asyncio itself
+            self.server = await asyncio.start_unix_server(self.serve_connection, self.address)
+
+        LOGGER.debug(f"Environment listening on {describe_endpoint(self.address)}.")
+
+    async def stop(self) -> None:
+        """Stops accepting new engines and closes all open connections."""
+        if self.server is None:
+            return
+
+        self.server.close()
+        for writer in [*self.writers]:
+            writer.close()
+
+        await self.server.wait_closed()
+        remove_socket_file(self.address)
+        LOGGER.debug(f"Environment stopped listening.")
+
+    @staticmethod
+    async def read_message(reader: asyncio.StreamReader) -> bytes:
+        """Reads the next length-prefixed message.
+
+        :param reader: The stream to read from.
+        :return: The payload of the message.
+        """
+        (length,) = HEADER.unpack(await reader.readexactly(HEADER.size))
+        return await reader.readexactly(length)
+
+    async def serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serves a single engine connection until it is closed.
+
+        :param reader: The reading end of the engine connection.
+        :param writer: The writing end of the engine connection.
+        """
+        channel = await self.free_channels.get()
+        self.writers.add(writer)
+        LOGGER.debug(f"Accepted engine connection from {writer.get_extra_info('peername')}.")
+
+        try:
+            start = time.perf_counter_ns()
+            message = memoryview(await EnvironmentAsyncServer.read_message(reader))
+            wire_format = wire.detect_format(message)
+            LOGGER.debug(f"Using '{wire_format.name}' wire format for this connection.")
+
+            while True:
+                received = time.perf_counter_ns()
+                state_model = wire.decode_state(message, wire_format)
+                decoded = time.perf_counter_ns()
+
+                await channel.state.put(state_model)
+                self.telemetry.debug("Received and decoded 'StateModel' with message type '%s'.", state_model.type)
+
+                action_model = await channel.action.get()
+                answered = time.perf_counter_ns()
+
+                action_model_encoded = wire.encode_action(action_model, wire_format)
+                writer.write(HEADER.pack(len(action_model_encoded)) + action_model_encoded)
+                await writer.drain()
+                self.telemetry.debug("Encoded and set 'ActionModel', selected action index was '%s'.", action_model.index)
+
+                # all connections are served on the same loop (thread) and therefore share a recorder
+                self.latencies.record("engine", state_model.phase, start, received)
+                self.latencies.record("decode", state_model.phase, received, decoded)
+                self.latencies.record("agent", state_model.phase, decoded, answered)
+                self.latencies.record("send", state_model.phase, answered)
+
+                start = time.perf_counter_ns()
+                message = memoryview(await EnvironmentAsyncServer.read_message(reader))
+        # the connection may be closed by the stop method, the engine or due to the environment closing
+        except (asyncio.IncompleteReadError, OSError):
+            pass
+        finally:
+            writer.close()
+            self.writers.discard(writer)
+            self.free_channels.put_nowait(channel)
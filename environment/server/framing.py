@@ -0,0 +1,88 @@
+import socket
+import struct
+
+HEADER = struct.Struct(">I")
+
+
+class MessageFraming:
+    """Length-prefixed message framing on top of a connected stream socket.
+
+    Every message is prefixed with its payload length as a 4 byte big endian integer.
+    Incoming payloads are read with exact-length `recv_into` calls into a preallocated
+    buffer and outgoing messages are assembled in a second preallocated buffer, therefore
+    no memory is allocated per message unless a payload exceeds the current capacity.
+    """
+
+    def __init__(self, connection: socket.socket, capacity: int = 1 << 16) -> None:
+        self.connection = connection
+
+        if connection.family in (socket.AF_INET, socket.AF_INET6):
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        self.header = bytearray(HEADER.size)
+        self.header_view = memoryview(self.header)
+
+        self._allocate_receive_buffer(capacity)
+        self._allocate_send_buffer(capacity)
+
+    def _allocate_receive_buffer(self, capacity: int) -> None:
+        self.receive_buffer = bytearray(capacity)
+        self.receive_view = memoryview(self.receive_buffer)
+        self.payload_length = 0
+        self.payload_view = self.receive_view[:0]
+
+    def _allocate_send_buffer(self, capacity: int) -> None:
+        self.send_buffer = bytearray(HEADER.size + capacity)
+        self.send_view = memoryview(self.send_buffer)
+
+    def _receive_exactly(self, view: memoryview) -> None:
+        """Fills the given view completely with bytes read from the connection.
+
+        :param view: The view to fill.
+        """
+        total = len(view)
+        received = 0
+
+        while received < total:
+            # only partial reads need a (sliced) view of the remaining bytes
+            count = self.connection.recv_into(view[received:] if received else view, total - received)
+            if not count:
+                raise ConnectionAbortedError("The engine closed the connection.")
+            received += count
+
+    def receive(self) -> memoryview:
+        """Reads the next message from the connection.
+
+        The returned view points into the receive buffer of this instance and is
+        only valid until the next call to `receive`, copy it to keep it around.
+
+        :return: A view of the payload of the received message.
+        """
+        self._receive_exactly(self.header_view)
+        (length,) = HEADER.unpack_from(self.header)
+
+        if length > len(self.receive_buffer):
+            self._allocate_receive_buffer(length)
+
+        # views are cached, fixed-size payloads therefore do not create any new objects
+        if length != self.payload_length:
+            self.payload_length = length
+            self.payload_view = self.receive_view[:length]
+
+        self._receive_exactly(self.payload_view)
+        return self.payload_view
+
+    def send(self, payload: bytes) -> None:
+        """Sends the given payload prefixed by its length as a single write.
+
+        :param payload: The payload to send.
+        """
+        length = len(payload)
+        total = HEADER.size + length
+
+        if total > len(self.send_buffer):
+            self._allocate_send_buffer(length)
+
+        HEADER.pack_into(self.send_buffer, 0, length)
+        self.send_buffer[HEADER.size : total] = payload
+        self.connection.sendall(self.send_view[:total])
@@ -1,15 +1,52 @@
 import logging
+import time
 from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
 from typing import Any, Callable
 
+from environment import latency
+from environment.channels import EnvironmentChannel
 from environment.models import ReceivedStateModel
-from environment.queues import ENVIRONMENT_ACTION, ENVIRONMENT_STATE
-from environment.server import reader
+from environment.enums import WireFormat
+from environment.server import reader, wire
+from environment.telemetry import Telemetry
 
 LOGGER = logging.getLogger("catan-environment")
 
 
+class ChannelHttpServer(HTTPServer):
+    def __init__(self, server_address: tuple[str, int], channel: EnvironmentChannel) -> None:
+        super().__init__(server_address, EnvironmentHttpServer)
+        self.channel = channel
+        # the threaded server handles every connection on its own thread, each uses its own recorder
+        self.latencies = latency.RecorderPool("http server")
+        self.telemetry = Telemetry(f"http server {server_address[0] or '127.0.0.1'}:{server_address[1]}")
+
+
+class ThreadingChannelHttpServer(ThreadingMixIn, ChannelHttpServer):
+    """Handles each (persistent) connection on its own thread, i.e. reconnecting engines never block."""
+
+    daemon_threads = True
+
+
 class EnvironmentHttpServer(BaseHTTPRequestHandler):
+    server: ChannelHttpServer
+
+    # persistent connections, responses are buffered and sent with a single write
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    wbufsize = -1
+
+    def setup(self) -> None:
+        super().setup()
+        self.latencies = self.server.latencies.acquire()
+
+    def finish(self) -> None:
+        try:
+            super().finish()
+        finally:
+            self.server.latencies.release(self.latencies)
+
     def do_POST(self):
         """POST-Request handler for the environment server.
 
@@ -17,43 +54,56 @@ class EnvironmentHttpServer(BaseHTTPRequestHandler):
         actual `catan-engine` that runs in a different process and simulates
         the actual game.
 
-        Received observations are pushed into the `ENVIRONMENT_STATE` queue
-        where they are then consumed by the actual environment. The environment
-        then pushes the chosen action of the agent back into the `ENVIRONMENT_ACTION`
-        queue which intern is consumed by this server as an response to incoming
-        requests.
+        Received observations are handed over through the `state` side of the servers
+        channel where they are then consumed by the actual environment. The environment
+        then hands the chosen action of the agent back through the `action` side which
+        intern is consumed by this server as an response to incoming requests.
         """
-        # receive new states and push them into the state queue
-        data = reader.read_stream_as_json(self.rfile)
+        # receive new states and hand them over to the environment
+        received = time.perf_counter_ns()
+        content_length = self.headers.get("Content-Length")
+        data = reader.read_stream_as_json(self.rfile, int(content_length) if content_length is not None else None)
         state_model = ReceivedStateModel(**data)
-        ENVIRONMENT_STATE.put(state_model)
+        decoded = time.perf_counter_ns()
+        self.server.channel.state.put(state_model)
 
-        LOGGER.debug(f"Received and decoded 'StateModel' with message type '{state_model.type}'.")
+        self.server.telemetry.debug("Received and decoded 'StateModel' with message type '%s'.", state_model.type)
 
         # wait until the state is processed and respond
-        action_model = ENVIRONMENT_ACTION.get()
-        action_model_encoded = action_model.to_json()
+        action_model = self.server.channel.action.get()
+        answered = time.perf_counter_ns()
+        action_model_encoded = wire.encode_action(action_model, WireFormat.JSON)
 
         self.send_response(200)
         self.send_header("Content-type", "application/json")
+        self.send_header("Content-Length", str(len(action_model_encoded)))
         self.end_headers()
         self.wfile.write(action_model_encoded)
 
-        LOGGER.debug(f"Encoded and set 'ActionModel', selected action index was '{action_model.index}'.")
+        self.server.telemetry.debug("Encoded and set 'ActionModel', selected action index was '%s'.", action_model.index)
+
+        # the time spent waiting on the engine is not visible to a request handler
+        self.latencies.record("decode", state_model.phase, received, decoded)
+        self.latencies.record("agent", state_model.phase, decoded, answered)
+        self.latencies.record("send", state_model.phase, answered)
 
     def log_message(self, format: str, *args: Any) -> None:
         return
 
     @staticmethod
-    def server_factory(host: str, port: int) -> tuple[HTTPServer, Callable[[], None], Callable[[], None]]:
+    def server_factory(
+        host: str, port: int, channel: EnvironmentChannel, threaded: bool = True
+    ) -> tuple[HTTPServer, Callable[[], None], Callable[[], None]]:
         """Creates a new `HTTPServer` running on the given ip and port.
 
         :param host: Host address of the `HTTPServer`.
         :param port: Port of the `HTTPServer`.
+        :param channel: The channel of the environment served by the `HTTPServer`.
+        :param threaded: Whether to handle each connection on its own thread, defaults to True.
         :return: The `HTTPServer` itself as well as a callback to start and terminate the server.
         """
         server_address = (host, port)
-        server = HTTPServer(server_address, EnvironmentHttpServer)
+        server = (ThreadingChannelHttpServer if threaded else ChannelHttpServer)(server_address, channel)
 
         def start_server():
             LOGGER.debug(f"Environment listening on {host or '127.0.0.1'}:{port}.")
@@ -1,33 +1,42 @@
-from io import BytesIO
 from typing import Any, BinaryIO
-import json
 
+import orjson
 
-def read_chunked_content(input_stream: BinaryIO, output_stream: BytesIO) -> None:
-    """Reads and moves the given chunked binary stream into the given byte stream.
+
+def read_chunked_content(input_stream: BinaryIO, output_stream: bytearray) -> None:
+    """Reads and moves the given chunked binary stream into the given buffer.
 
     Source: https://stackoverflow.com/a/63037533
 
     :param input_stream: Open binary stream to read from.
-    :param output_stream: Open byte stream to write to (file position is reset once done).
+    :param output_stream: Buffer to append the content to.
     """
 
     while True:
         line = input_stream.readline().strip()
-        chunk_size = int(line, 16)
+        chunk_size = int(line.split(b";", 1)[0], 16)
 
         if chunk_size != 0:
-            chunk = input_stream.read(chunk_size).strip()
-            output_stream.write(chunk)
+            output_stream += input_stream.read(chunk_size)
 
         input_stream.readline()
         if chunk_size == 0:
             break
 
-    output_stream.seek(0)
 
+def read_stream_as_json(input_stream: BinaryIO, content_length: int | None = None) -> dict[str, Any]:
+    """Reads and decodes a json request body.
+
+    Bodies with a known `Content-Length` are read with a single bulk read, otherwise
+    the body is expected to use chunked transfer encoding.
+
+    :param input_stream: Open binary stream to read from.
+    :param content_length: The value of the `Content-Length` header if present, defaults to None.
+    :return: The decoded json body.
+    """
+    if content_length is not None:
+        return orjson.loads(input_stream.read(content_length))
 
-def read_stream_as_json(input_stream: BinaryIO) -> dict[str, Any]:
-    with BytesIO() as content:
-        read_chunked_content(input_stream, content)
-        return json.load(content)
+    content = bytearray()
+    read_chunked_content(input_stream, content)
+    return orjson.loads(content)
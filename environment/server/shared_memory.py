@@ -0,0 +1,190 @@
+import logging
+import os
+import struct
+import time
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable
+
+LOGGER = logging.getLogger("catan-environment")
+
+SEGMENT_MAGIC = 0x4E544143
+SEGMENT_VERSION = 1
+CACHE_LINE = 64
+
+# control block (little endian) at the start of the segment:
+#   magic (u32), version (u32), capacity (u32), state slot size (u32), action slot size (u32)
+CONTROL_BLOCK = struct.Struct("<IIIII")
+
+# each ring owns two cache lines holding its write and read sequence (u64) respectively,
+# each slot starts with the payload length (u32) followed by a binary wire format message
+SLOT_LENGTH = struct.Struct("<I")
+
+STATE_RING_OFFSET = CACHE_LINE
+ACTION_RING_OFFSET = 3 * CACHE_LINE
+SLOTS_OFFSET = 5 * CACHE_LINE
+
+
+class Doorbell:
+    """Spin-then-block strategy to wait on counters in shared memory.
+
+    Waiting starts with busy polling, which keeps the round trip latency of fast engines in the
+    order of microseconds, then yields the time slice and finally backs off to short sleeps so
+    an idle peer does not burn a core. Spinning is skipped on single core machines, where the
+    peer can not make progress while we spin.
+    """
+
+    def __init__(self, spins: int = 2_000, yields: int = 200, max_sleep: float = 0.001) -> None:
+        self.spins = spins if (os.cpu_count() or 1) > 1 else 0
+        self.yields = yields
+        self.max_sleep = max_sleep
+
+    def wait(self, ready: Callable[[], bool]) -> None:
+        """Blocks until the given condition is met.
+
+        :param ready: The condition to wait for.
+        """
+        for _ in range(self.spins):
+            if ready():
+                return
+
+        for _ in range(self.yields):
+            if ready():
+                return
+            time.sleep(0)
+
+        sleep = 0.00005
+        while not ready():
+            time.sleep(sleep)
+            sleep = min(sleep * 2, self.max_sleep)
+
+
+class SharedMemoryRing:
+    """Single-producer single-consumer ring of fixed-size slots within a shared memory segment.
+
+    The producer fills the next free slot and publishes it by incrementing the write sequence,
+    the consumer reads the oldest slot and frees it by incrementing the read sequence. Both
+    sequences are plain aligned 64 bit stores, which is sufficient on x86 (total store order).
+    """
+
+    def __init__(self, buffer: memoryview, counters_offset: int, slots_offset: int, capacity: int, slot_size: int, doorbell: Doorbell) -> None:
+        self.capacity = capacity
+        self.slot_size = slot_size
+        self.doorbell = doorbell
+
+        self.write_sequence = buffer[counters_offset : counters_offset + 8].cast("Q")
+        self.read_sequence = buffer[counters_offset + CACHE_LINE : counters_offset + CACHE_LINE + 8].cast("Q")
+        self.slots = [buffer[slots_offset + i * slot_size : slots_offset + (i + 1) * slot_size] for i in range(capacity)]
+
+    def _writable(self) -> bool:
+        return self.write_sequence[0] - self.read_sequence[0] < self.capacity
+
+    def _readable(self) -> bool:
+        return self.read_sequence[0] < self.write_sequence[0]
+
+    def write(self, payload: bytes) -> None:
+        """Waits for a free slot, copies the payload into it and publishes it.
+
+        :param payload: The message to write.
+        """
+        if SLOT_LENGTH.size + len(payload) > self.slot_size:
+            raise Exception(f"Message of {len(payload)} bytes exceeds the slot size of {self.slot_size} bytes.")
+
+        self.doorbell.wait(self._writable)
+
+        sequence = self.write_sequence[0]
+        slot = self.slots[sequence % self.capacity]
+        SLOT_LENGTH.pack_into(slot, 0, len(payload))
+        slot[SLOT_LENGTH.size : SLOT_LENGTH.size + len(payload)] = payload
+
+        self.write_sequence[0] = sequence + 1
+
+    def read(self) -> memoryview:
+        """Waits for the next published slot.
+
+        The returned view points directly into shared memory and is only valid until `release`
+        is called, after which the producer may overwrite the slot.
+
+        :return: A view of the message within the slot.
+        """
+        self.doorbell.wait(self._readable)
+
+        slot = self.slots[self.read_sequence[0] % self.capacity]
+        (length,) = SLOT_LENGTH.unpack_from(slot)
+        return slot[SLOT_LENGTH.size : SLOT_LENGTH.size + length]
+
+    def release(self) -> None:
+        """Frees the slot returned by the last call to `read`."""
+        self.read_sequence[0] += 1
+
+    def release_views(self) -> None:
+        """Releases all views into the shared memory segment, required before it can be closed."""
+        for view in [self.write_sequence, self.read_sequence, *self.slots]:
+            view.release()
+
+
+class SharedMemorySegment:
+    """Shared memory segment holding a state ring (engine to agent) and an action ring (agent to engine).
+
+    The environment creates the segment, the engine attaches to it by name and reads the
+    ring geometry from the control block at the start of the segment.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        create: bool,
+        capacity: int = 2,
+        state_slot_size: int = 8 * 1024,
+        action_slot_size: int = CACHE_LINE,
+        doorbell: Doorbell | None = None,
+    ) -> None:
+        self.name = name
+        self.owner = create
+
+        if create:
+            size = SLOTS_OFFSET + capacity * (state_slot_size + action_slot_size)
+            self.memory = SharedMemorySegment._create(name, size)
+            self.memory.buf[:SLOTS_OFFSET] = bytes(SLOTS_OFFSET)
+            CONTROL_BLOCK.pack_into(self.memory.buf, 0, SEGMENT_MAGIC, SEGMENT_VERSION, capacity, state_slot_size, action_slot_size)
+        else:
+            self.memory = SharedMemory(name)
+            magic, version, capacity, state_slot_size, action_slot_size = CONTROL_BLOCK.unpack_from(self.memory.buf)
+            if magic != SEGMENT_MAGIC or version != SEGMENT_VERSION:
+                raise Exception(f"Unsupported shared memory segment '{name}' (magic {magic:#x}, version {version}).")
+
+        doorbell = doorbell or Doorbell()
+        buffer = self.memory.buf
+        action_slots_offset = SLOTS_OFFSET + capacity * state_slot_size
+
+        self.states = SharedMemoryRing(buffer, STATE_RING_OFFSET, SLOTS_OFFSET, capacity, state_slot_size, doorbell)
+        self.actions = SharedMemoryRing(buffer, ACTION_RING_OFFSET, action_slots_offset, capacity, action_slot_size, doorbell)
+
+    @staticmethod
+    def _create(name: str, size: int) -> SharedMemory:
+        try:
+            return SharedMemory(name, create=True, size=size)
+        # a segment left behind by a crashed environment is replaced
+        except FileExistsError:
+            LOGGER.debug(f"Replacing stale shared memory segment '{name}'.")
+            stale = SharedMemory(name)
+            stale.close()
+            stale.unlink()
+            return SharedMemory(name, create=True, size=size)
+
+    def close(self) -> None:
+        """Detaches from the segment, the creating side also removes it."""
+        self.states.release_views()
+        self.actions.release_views()
+
+        try:
+            self.memory.close()
+        # decoded states may still reference the segment, it is unmapped once the process exits
+        except BufferError:
+            LOGGER.debug(f"Shared memory segment '{self.name}' is still referenced and stays mapped.")
+
+        # on posix the resource tracker of an attached python process may already have removed it
+        if self.owner:
+            try:
+                self.memory.unlink()
+            except FileNotFoundError:
+                pass
@@ -1,65 +1,195 @@
 import logging
+import os
 import socket
-import struct
+import time
+from queue import Queue
+from threading import Thread
 from typing import Callable
 
-import orjson
-
-from environment.models import ReceivedStateModel
-from environment.queues import ENVIRONMENT_ACTION, ENVIRONMENT_STATE
+from environment.enums import WireFormat
+from environment import latency
+from environment.channels import EnvironmentChannel
+from environment.server import wire
+from environment.server.framing import HEADER, MessageFraming
+from environment.telemetry import Telemetry
 
 LOGGER = logging.getLogger("catan-environment")
 
+Address = str | tuple[str, int]
+
+
+def resolve_endpoint(host: str, port: int, path: str = "") -> tuple[socket.AddressFamily, Address]:
+    """Resolves the endpoint a server binds to.
+
+    Without a `path` a tcp endpoint on the given host (defaults to loopback) and port is used.
+    Otherwise a unix domain socket is used, paths starting with '@' denote a name within the
+    abstract namespace (linux only), which leaves no file behind.
+
+    :param host: The host to bind to.
+    :param port: The port to bind to.
+    :param path: The path of a unix domain socket, defaults to "".
+    :return: The address family and the address to bind to.
+    """
+    if not path:
+        return socket.AF_INET, (host or "127.0.0.1", port)
+
+    if not hasattr(socket, "AF_UNIX"):
+        raise Exception("Unix domain sockets are not supported on this platform.")
+
+    return socket.AF_UNIX, ("\0" + path[1:] if path.startswith("@") else path)
+
+
+def describe_endpoint(address: Address) -> str:
+    if isinstance(address, tuple):
+        return f"{address[0]}:{address[1]}"
+
+    return f"@{address[1:]}" if address.startswith("\0") else address
+
+
+def remove_socket_file(address: Address) -> None:
+    """Removes the file of a (non abstract) unix domain socket endpoint."""
+    if isinstance(address, str) and not address.startswith("\0") and os.path.exists(address):
+        os.unlink(address)
+
 
 class EnvironmentSocketServer:
-    def __init__(self, port: int) -> None:
-        self.port = port
+    def __init__(self, host: str, port: int, path: str = "") -> None:
+        self.family, self.address = resolve_endpoint(host, port, path)
         self.serve = True
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket = socket.socket(self.family, socket.SOCK_STREAM)
+        self.connections: list[socket.socket] = []
+        self.free_channels: Queue[EnvironmentChannel] = Queue()
+        self.telemetry = Telemetry(f"socket server {describe_endpoint(self.address)}")
+
+        # connections are served concurrently (e.g. by a batched environment), each uses its own recorder
+        self.latencies = latency.RecorderPool("socket server")
 
     @staticmethod
     def encode_message(message: bytes) -> bytes:
-        return struct.pack(">I", len(message)) + message
+        return HEADER.pack(len(message)) + message
 
-    @staticmethod
-    def decode_message(message: bytes) -> bytes:
-        length = struct.unpack(">I", message[:4])[0]
-        return message[4 : (4 + length)]
+    def add_channel(self, channel: EnvironmentChannel) -> None:
+        """Registers a channel, the next accepted engine connection will be bound to it.
+
+        :param channel: The channel of the environment that should be served.
+        """
+        self.free_channels.put(channel)
 
     def start(self) -> None:
-        self.socket.bind(("127.0.0.1", self.port))
+        """Accepts engine connections for as long as the server is running.
+
+        Each accepted connection is bound to the next free channel and served on its own
+        thread, once a connection is closed its channel is released for the next engine.
+        """
+        # a socket file left behind by a crashed environment is replaced
+        remove_socket_file(self.address)
+        self.socket.bind(self.address)
         self.socket.listen()
-        self.connection, _ = self.socket.accept()
 
-        while True:
+        while self.serve:
+            channel = self.free_channels.get()
+
             try:
-                self.run()
-            # the socket may be closed by the stop callback or due to the environment closing
-            except (ConnectionResetError, ConnectionAbortedError):
+                connection, address = self.socket.accept()
+            # the listening socket is closed by the stop callback
+            except OSError:
                 return
 
-    def run(self) -> None:
-        message = self.connection.recv(4096)
-        decoded = EnvironmentSocketServer.decode_message(message)
-        state_model = ReceivedStateModel(**orjson.loads(decoded))
-        ENVIRONMENT_STATE.put(state_model)
-        LOGGER.debug(f"Received and decoded 'StateModel' with message type '{state_model.type}'.")
+            LOGGER.debug(f"Accepted engine connection from {address}.")
+            self.connections.append(connection)
+            connection_thread = Thread(target=self.serve_connection, args=(connection, channel))
+            connection_thread.daemon = True
+            connection_thread.start()
+
+    def serve_connection(self, connection: socket.socket, channel: EnvironmentChannel) -> None:
+        """Serves a single engine connection until it is closed.
+
+        The wire format of the connection is negotiated using its first message, i.e. engines
+        may send binary states and receive binary actions while json is used as a fallback.
+
+        :param connection: The accepted engine connection.
+        :param channel: The channel of the environment bound to this connection.
+        """
+        framing = MessageFraming(connection)
+        latencies = self.latencies.acquire()
+
+        try:
+            start = time.perf_counter_ns()
+            message = framing.receive()
+            wire_format = wire.detect_format(message)
+            LOGGER.debug(f"Using '{wire_format.name}' wire format for this connection.")
+
+            while True:
+                self.run(framing, message, wire_format, channel, latencies, start)
+                start = time.perf_counter_ns()
+                message = framing.receive()
+        # the socket may be closed by the stop callback, the engine or due to the environment closing
+        except OSError:
+            pass
+        finally:
+            connection.close()
+            self.connections.remove(connection)
+            self.latencies.release(latencies)
+            self.free_channels.put(channel)
+
+    def run(
+        self,
+        framing: MessageFraming,
+        message: memoryview,
+        wire_format: WireFormat,
+        channel: EnvironmentChannel,
+        latencies: latency.LatencyRecorder,
+        start: int,
+    ) -> None:
+        """Answers a single received state with the action chosen by the environment.
+
+        :param start: The time the server started waiting for the message, see `time.perf_counter_ns`.
+        """
+        received = time.perf_counter_ns()
+        state_model = wire.decode_state(message, wire_format)
+        decoded = time.perf_counter_ns()
+
+        channel.state.put(state_model)
+        self.telemetry.debug("Received and decoded 'StateModel' with message type '%s'.", state_model.type)
+
+        action_model = channel.action.get()
+        answered = time.perf_counter_ns()
+
+        action_model_encoded = wire.encode_action(action_model, wire_format)
+        framing.send(action_model_encoded)
+        self.telemetry.debug("Encoded and set 'ActionModel', selected action index was '%s'.", action_model.index)
+
+        # waiting on the engine (including the transfer of the state), decoding, waiting on the agent and answering
+        latencies.record("engine", state_model.phase, start, received)
+        latencies.record("decode", state_model.phase, received, decoded)
+        latencies.record("agent", state_model.phase, decoded, answered)
+        latencies.record("send", state_model.phase, answered)
+
+    def stop(self) -> None:
+        """Stops accepting new engines and closes all open connections."""
+        self.serve = False
+
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.socket.close()
+
+        for connection in [*self.connections]:
+            connection.close()
 
-        action_model = ENVIRONMENT_ACTION.get()
-        action_model_encoded = orjson.dumps(action_model)
-        self.connection.sendall(EnvironmentSocketServer.encode_message(action_model_encoded))
-        LOGGER.debug(f"Encoded and set 'ActionModel', selected action index was '{action_model.index}'.")
+        remove_socket_file(self.address)
 
     @staticmethod
-    def server_factory(host: str, port: int) -> tuple["EnvironmentSocketServer", Callable[[], None], Callable[[], None]]:
-        server = EnvironmentSocketServer(port)
+    def server_factory(host: str, port: int, path: str = "") -> tuple["EnvironmentSocketServer", Callable[[], None], Callable[[], None]]:
+        server = EnvironmentSocketServer(host, port, path)
 
         def start_server():
-            LOGGER.debug(f"Environment listening on {host or '127.0.0.1'}:{port}.")
+            LOGGER.debug(f"Environment listening on {describe_endpoint(server.address)}.")
             server.start()
 
         def stop_server():
             LOGGER.debug(f"Environment stopped listening.")
-            server.connection.close()
+            server.stop()
 
         return server, start_server, stop_server
@@ -0,0 +1,109 @@
+import struct
+
+import numpy as np
+from numpy.typing import NDArray
+import orjson
+
+from environment.enums import WireFormat
+from environment.models import ACTION_SPACE_SIZE, ReceivedStateModel, SubmittedActionModel
+from environment.models.received_state_model import PLAYER_NUMBERS
+
+BINARY_MAGIC = 0xCA
+BINARY_VERSION = 1
+
+# binary state message (little endian), 16 byte header followed by the payload:
+#   magic (u8), version (u8), player number (u8), message type (u8), phase (u8), padding (1 byte),
+#   observation length (u16), step (u32), mask length (u16), padding (2 bytes),
+#   observation (observation length * f32), mask (mask length * u8)
+STATE_HEADER = struct.Struct("<BBBBBxHIHxx")
+
+# binary action message (little endian):
+#   magic (u8), version (u8), player number (u8), padding (1 byte), action index (i32)
+ACTION_MESSAGE = struct.Struct("<BBBxi")
+
+
+def detect_format(payload: memoryview) -> WireFormat:
+    """Detects the wire format of a connection based on its first message.
+
+    Json messages always start with an opening brace, binary messages with `BINARY_MAGIC`.
+
+    :param payload: The payload of the first message received on a connection.
+    :return: The wire format used for the rest of the connection.
+    """
+    return WireFormat.BINARY if len(payload) and payload[0] == BINARY_MAGIC else WireFormat.JSON
+
+
+def decode_state(payload: memoryview, wire_format: WireFormat) -> ReceivedStateModel:
+    """Decodes a received state message using the given wire format.
+
+    Binary messages are not copied, the observation and mask of the returned model are
+    views into the given payload and are only valid until the next message is received.
+
+    :param payload: The payload of the received message.
+    :param wire_format: The wire format negotiated for the connection.
+    :return: The decoded state.
+    """
+    if wire_format == WireFormat.JSON:
+        return ReceivedStateModel(**orjson.loads(payload))
+
+    magic, version, player_number, message_type, phase, observation_length, step, mask_length = STATE_HEADER.unpack_from(payload)
+    if magic != BINARY_MAGIC or version != BINARY_VERSION:
+        raise Exception(f"Unsupported binary state message (magic {magic:#x}, version {version}).")
+
+    mask_offset = STATE_HEADER.size + observation_length * 4
+    observation = np.frombuffer(payload, dtype="<f4", count=observation_length, offset=STATE_HEADER.size)
+    mask = np.frombuffer(payload, dtype=np.uint8, count=mask_length, offset=mask_offset)
+
+    return ReceivedStateModel(player_number, message_type, phase, step, observation, mask)
+
+
+def _encode_action(action_model: SubmittedActionModel, wire_format: WireFormat) -> bytes:
+    if wire_format == WireFormat.JSON:
+        return orjson.dumps(action_model)
+
+    return ACTION_MESSAGE.pack(BINARY_MAGIC, BINARY_VERSION, action_model.player_number, action_model.index)
+
+
+# every response is encoded once, indexed by wire format, player number and action index + 1 (the dummy action is -1)
+ENCODED_ACTIONS = [[[_encode_action(action_model, wire_format) for action_model in actions] for actions in SubmittedActionModel.INSTANCES] for wire_format in WireFormat]
+
+
+def encode_action(action_model: SubmittedActionModel, wire_format: WireFormat) -> bytes:
+    """Encodes the chosen action using the given wire format.
+
+    Actions within the action space are looked up from the preencoded responses.
+
+    :param action_model: The action to encode.
+    :param wire_format: The wire format negotiated for the connection.
+    :return: The encoded action message.
+    """
+    if -1 <= action_model.index < ACTION_SPACE_SIZE:
+        return ENCODED_ACTIONS[wire_format][action_model.player_number][action_model.index + 1]
+
+    return _encode_action(action_model, wire_format)
+
+
+def encode_binary_state(
+    player_number: int, message_type: int, phase: int, step: int, observation: NDArray[np.float32], mask: NDArray[np.uint8]
+) -> bytes:
+    """Encodes a state as binary message, i.e. the engine side of `decode_state`.
+
+    :return: The encoded state message.
+    """
+    header = STATE_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, player_number, message_type, phase, len(observation), step, len(mask))
+    return header + observation.astype("<f4", copy=False).tobytes() + mask.astype(np.uint8, copy=False).tobytes()
+
+
+def decode_action(payload: memoryview | bytes, wire_format: WireFormat) -> SubmittedActionModel:
+    """Decodes an action message, i.e. the engine side of `encode_action`.
+
+    :param payload: The payload of the received message.
+    :param wire_format: The wire format negotiated for the connection.
+    :return: The decoded action.
+    """
+    if wire_format == WireFormat.JSON:
+        decoded = orjson.loads(payload)
+        return SubmittedActionModel.of(PLAYER_NUMBERS[decoded["player_number"]], decoded["index"])
+
+    _, _, player_number, index = ACTION_MESSAGE.unpack_from(payload)
+    return SubmittedActionModel.of(PLAYER_NUMBERS[player_number], index)
@@ -0,0 +1,113 @@
+import logging
+import time
+from collections import defaultdict
+from typing import Any, Callable, Hashable
+
+LOGGER = logging.getLogger("catan-environment")
+
+
+class Telemetry:
+    """Hot path logging with lazily formatted, sampled messages and aggregated counters.
+
+    Messages use `logging` style %-formatting, i.e. arguments are only formatted if the message
+    is emitted, and only every `sample_every`-th occurrence of a message is emitted at all.
+
+    Instead of logging a line per step, counters (e.g. message types or phases) and sums of values
+    (e.g. rewards) are aggregated and flushed as a single line once `flush_interval` seconds passed,
+    which is checked by `tick` once per step. Aggregates of an instance must only be updated from
+    a single thread, sampled messages may be logged from any thread.
+    """
+
+    def __init__(self, name: str, sample_every: int = 1_000, flush_interval: float = 30.0, logger: logging.Logger = LOGGER) -> None:
+        self.name = name
+        self.sample_every = sample_every
+        self.flush_interval = flush_interval
+        self.logger = logger
+
+        self.occurrences: dict[str, int] = defaultdict(int)
+        self.counters: dict[str, dict[Hashable, int]] = defaultdict(lambda: defaultdict(int))
+        self.sums: dict[str, list[float]] = defaultdict(lambda: [0.0, 0])
+
+        # statistics gathered elsewhere (e.g. by a channel) and logged within every flush
+        self.attached: dict[str, tuple[Callable[[], dict[str, float]], Callable[[], None] | None]] = {}
+
+        self.steps = 0
+        self.last_flush = time.monotonic()
+
+    def _log(self, level: int, message: str, args: tuple[Any, ...]) -> None:
+        if not self.logger.isEnabledFor(level):
+            return
+
+        occurrence = self.occurrences[message]
+        self.occurrences[message] = occurrence + 1
+
+        if occurrence % self.sample_every == 0:
+            self.logger.log(level, message, *args)
+
+    def debug(self, message: str, *args: Any) -> None:
+        """Logs a sampled debug message, see `logging.Logger.debug`."""
+        self._log(logging.DEBUG, message, args)
+
+    def info(self, message: str, *args: Any) -> None:
+        """Logs a sampled info message, see `logging.Logger.info`."""
+        self._log(logging.INFO, message, args)
+
+    def count(self, category: str, key: Hashable) -> None:
+        """Increments the counter of the given key within the given category.
+
+        :param category: The category, e.g. 'phase'.
+        :param key: The counted key, e.g. a `Phase`.
+        """
+        self.counters[category][key] += 1
+
+    def observe(self, name: str, value: float) -> None:
+        """Adds the given value to the sum of the given name.
+
+        :param name: The name of the observed value, e.g. 'reward'.
+        :param value: The observed value.
+        """
+        total = self.sums[name]
+        total[0] += value
+        total[1] += 1
+
+    def attach(self, name: str, statistics: Callable[[], dict[str, float]], reset: Callable[[], None] | None = None) -> None:
+        """Logs the given statistics within every flush.
+
+        :param name: The name the statistics are logged under, e.g. 'channel'.
+        :param statistics: Returns the current statistics, e.g. `EnvironmentChannel.statistics`.
+        :param reset: Resets the statistics after every flush, defaults to None, i.e. the statistics accumulate.
+        """
+        self.attached[name] = (statistics, reset)
+
+    def tick(self) -> None:
+        """Marks the end of a step and flushes the aggregates once the flush interval passed."""
+        self.steps += 1
+
+        # the clock is only read every few steps
+        if self.steps % 64 == 0 and time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        """Logs all aggregates of the current interval as a single line and resets them."""
+        now = time.monotonic()
+
+        if self.steps and self.logger.isEnabledFor(logging.INFO):
+            sums = [f"{name} sum={total:.4f} avg={total / max(count, 1):.4f}" for name, (total, count) in self.sums.items()]
+            counters = [
+                f"{category} " + " ".join(f"{getattr(key, 'name', key)}={count}" for key, count in counts.items())
+                for category, counts in self.counters.items()
+            ]
+            attached = [
+                f"{name} " + " ".join(f"{key}={value:.4f}" if isinstance(value, float) else f"{key}={value}" for key, value in statistics().items())
+                for name, (statistics, _) in self.attached.items()
+            ]
+            self.logger.info(f"Telemetry ({self.name}), {self.steps} steps in {now - self.last_flush:.1f}s: {', '.join(sums + counters + attached)}")
+
+        for _, reset in self.attached.values():
+            if reset is not None:
+                reset()
+
+        self.counters.clear()
+        self.sums.clear()
+        self.steps = 0
+        self.last_flush = now
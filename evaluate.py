@@ -0,0 +1,50 @@
+import argparse
+import os
+import subprocess
+from multiprocessing.connection import Client
+from pathlib import Path
+
+import absl.logging  # type: ignore
+import silence_tensorflow.auto  # type: ignore
+
+import catan_engine
+from utils import loader, player
+from utils.evaluator import AUTHKEY_VARIABLE, SLAVES
+
+absl.logging.set_verbosity(absl.logging.ERROR)  # type: ignore
+
+parser = argparse.ArgumentParser()
+
+parser.add_argument("--port", type=int, help="Port of the evaluator to receive the evaluations from.")
+parser.add_argument("--worker", type=int, help="Index of this worker.")
+
+args = parser.parse_args()
+
+connection = Client(("127.0.0.1", args.port), authkey=bytes.fromhex(os.environ[AUTHKEY_VARIABLE]))
+connection.send(args.worker)
+engine_parameters, environment_parameters, slave_parameters = connection.recv()
+
+start_catan_engine = catan_engine.get_launch_callback(engine_parameters)
+_, tf_environment = loader.get_initial_random_policy(environment_parameters)
+
+if slave_parameters:
+    slaves = [
+        subprocess.Popen(["start", "cmd", "/c", rf"title Evaluation Slave ({args.worker}, {offset}) && python slave.py {slave_parameters.as_args(offset)}"], shell=True)
+        for offset in range(1, SLAVES + 1)
+    ]
+
+start_catan_engine()
+
+# plays its share of every evaluation until the evaluator stops
+while (evaluation := connection.recv()) is not None:
+    snapshot, episodes = evaluation
+
+    if not episodes:
+        connection.send(([], [], []))
+        continue
+
+    policy = loader.load_policy(Path(snapshot))
+    connection.send(player.play_episodes(policy, tf_environment, episodes, clean_up=True))
+
+tf_environment.close()
+connection.close()
@@ -1,3 +1,4 @@
 # type: ignore
 from metrics.evaluation import EvaluationMetrics
-from metrics.writer import LossWriter, EvaluationWriter
+from metrics.learner import LearnerMetrics
+from metrics.writer import LossWriter, EvaluationWriter, LatencyWriter, LearnerWriter
@@ -0,0 +1,26 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class LearnerMetrics:
+    batches: int
+    samples: int  # [sampled windows]
+    elapsed: float  # [s]
+    waiting: float  # [s] spent waiting on the input pipeline
+
+    samples_per_second: float = 0.0
+    utilization: float = 0.0
+
+    def __post_init__(self):
+        self.samples_per_second = self.samples / self.elapsed if self.elapsed else 0.0
+        self.utilization = 1 - self.waiting / self.elapsed if self.elapsed else 0.0
+
+    def merge(self, other: "LearnerMetrics") -> "LearnerMetrics":
+        return LearnerMetrics(self.batches + other.batches, self.samples + other.samples, self.elapsed + other.elapsed, self.waiting + other.waiting)
+
+    @staticmethod
+    def header() -> str:
+        return ",".join(["Batches", "Samples", "Time Spent", "Time Waiting on Samples", "Samples/s", "Learner Utilization"])
+
+    def __repr__(self) -> str:
+        return ",".join([str(x) for x in [self.batches, self.samples, self.elapsed, self.waiting, self.samples_per_second, self.utilization]])
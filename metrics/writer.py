@@ -1,7 +1,9 @@
 from dataclasses import dataclass
 from pathlib import Path
+from typing import Any, ClassVar
 
 from metrics.evaluation import EvaluationMetrics
+from metrics.learner import LearnerMetrics
 
 
 @dataclass
@@ -19,6 +21,21 @@ class EvaluationWriter:
             file.write(f"{metrics}\n")
 
 
+@dataclass
+class LearnerWriter:
+    file_path: Path
+
+    def __post_init__(self) -> None:
+        self.file_path.parent.mkdir(parents=True, exist_ok=True)
+
+        with open(self.file_path, "a") as file:
+            file.write(f"{LearnerMetrics.header()}\n")
+
+    def add(self, metrics: LearnerMetrics) -> None:
+        with open(self.file_path, "a") as file:
+            file.write(f"{metrics}\n")
+
+
 @dataclass
 class LossWriter:
     file_path: Path
@@ -32,3 +49,25 @@ class LossWriter:
     def add(self, loss: list[float]) -> None:
         with open(self.file_path, "a") as file:
             file.write("\n".join([str(x) for x in loss]) + "\n")
+
+
+@dataclass
+class LatencyWriter:
+    file_path: Path
+    interval: int = 0
+
+    COLUMNS: ClassVar[list[str]] = ["component", "stage", "phase", "count", "min", "mean", "p50", "p90", "p99", "p99.9", "max"]
+
+    def __post_init__(self) -> None:
+        self.file_path.parent.mkdir(parents=True, exist_ok=True)
+
+        with open(self.file_path, "a") as file:
+            file.write("Interval,Component,Stage,Phase,Count,Min [us],Mean [us],p50 [us],p90 [us],p99 [us],p99.9 [us],Max [us]\n")
+
+    def add(self, summaries: list[dict[str, Any]]) -> None:
+        """Appends the latency summaries of one interval, see `environment.latency.snapshot`."""
+        with open(self.file_path, "a") as file:
+            for summary in summaries:
+                file.write(",".join([str(self.interval), *[str(summary[column]) for column in LatencyWriter.COLUMNS]]) + "\n")
+
+        self.interval += 1
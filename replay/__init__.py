@@ -0,0 +1,5 @@
+# type: ignore
+from replay.codec import BitCodec, Codec, Uint8Codec
+from replay.compact import CompactReplayBuffer
+from replay.episode import EpisodeReplayBuffer
+from replay.prioritized import PrioritizedBufferInfo, PrioritizedReplayBuffer, SumTree
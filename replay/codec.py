@@ -0,0 +1,72 @@
+from typing import Literal
+
+import tensorflow as tf  # type: ignore
+from tf_agents.specs.tensor_spec import TensorSpec  # type: ignore
+
+
+class Codec:
+    """Lossless (for the supported values) encoding of a single feature vector of a replay buffer.
+
+    Encoding and decoding are batched tensor operations, i.e. all items of a batch are converted at once.
+    """
+
+    def __init__(self, spec: TensorSpec) -> None:
+        self.spec = spec
+        self.size = int(spec.shape[-1])
+
+    @property
+    def encoded_spec(self) -> TensorSpec:
+        raise NotImplementedError()
+
+    def encode(self, values: tf.Tensor) -> tf.Tensor:
+        raise NotImplementedError()
+
+    def decode(self, encoded: tf.Tensor) -> tf.Tensor:
+        raise NotImplementedError()
+
+
+class Uint8Codec(Codec):
+    """Quantizes features within [0, 1] into 256 levels, exact for binary features and multiples of 1/255."""
+
+    LEVELS = 255
+
+    @property
+    def encoded_spec(self) -> TensorSpec:
+        return TensorSpec(self.spec.shape, tf.uint8, self.spec.name)
+
+    def encode(self, values: tf.Tensor) -> tf.Tensor:
+        return tf.cast(tf.round(tf.clip_by_value(tf.cast(values, tf.float32), 0, 1) * Uint8Codec.LEVELS), tf.uint8)
+
+    def decode(self, encoded: tf.Tensor) -> tf.Tensor:
+        return tf.cast(tf.cast(encoded, tf.float32) / Uint8Codec.LEVELS, self.spec.dtype)
+
+
+class BitCodec(Codec):
+    """Packs binary features into a single bit each, i.e. eight features per byte."""
+
+    WEIGHTS = tf.constant([128, 64, 32, 16, 8, 4, 2, 1], dtype=tf.uint8)
+    SHIFTS = tf.constant([7, 6, 5, 4, 3, 2, 1, 0], dtype=tf.uint8)
+
+    def __init__(self, spec: TensorSpec) -> None:
+        super().__init__(spec)
+        self.packed_size = (self.size + 7) // 8
+
+    @property
+    def encoded_spec(self) -> TensorSpec:
+        return TensorSpec([*self.spec.shape[:-1], self.packed_size], tf.uint8, self.spec.name)
+
+    def encode(self, values: tf.Tensor) -> tf.Tensor:
+        outer_shape = tf.shape(values)[:-1]
+        bits = tf.reshape(tf.cast(tf.round(tf.cast(values, tf.float32)), tf.uint8), [-1, self.size])
+        bits = tf.pad(bits, [[0, 0], [0, self.packed_size * 8 - self.size]])
+        packed = tf.reduce_sum(tf.reshape(bits, [-1, self.packed_size, 8]) * BitCodec.WEIGHTS, axis=-1)
+        return tf.reshape(packed, tf.concat([outer_shape, [self.packed_size]], axis=0))
+
+    def decode(self, encoded: tf.Tensor) -> tf.Tensor:
+        outer_shape = tf.shape(encoded)[:-1]
+        bits = tf.bitwise.bitwise_and(tf.bitwise.right_shift(encoded[..., None], BitCodec.SHIFTS), 1)
+        bits = tf.reshape(bits, [-1, self.packed_size * 8])[:, : self.size]
+        return tf.cast(tf.reshape(bits, tf.concat([outer_shape, [self.size]], axis=0)), self.spec.dtype)
+
+
+CODECS: dict[Literal["uint8", "bits"], type[Codec]] = {"uint8": Uint8Codec, "bits": BitCodec}
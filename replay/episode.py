@@ -0,0 +1,346 @@
+import io
+import json
+from pathlib import Path
+from threading import RLock
+from typing import Any
+
+import numpy as np
+import tensorflow as tf  # type: ignore
+from numpy.typing import NDArray
+from tf_agents.replay_buffers.tf_uniform_replay_buffer import BufferInfo  # type: ignore
+from tf_agents.trajectories.time_step import StepType  # type: ignore
+from tf_agents.trajectories.trajectory import Trajectory  # type: ignore
+
+from replay.mapped import MappedStore
+
+# end of all frames of running episodes, i.e. windows are never clipped
+NO_END = np.iinfo(np.int64).max
+
+
+class EpisodeReplayBuffer(tf.train.experimental.PythonState):
+    """Replay buffer storing every frame once, windows of consecutive frames are built from indices at sample time.
+
+    Like `TFUniformReplayBuffer` the buffer is split into `batch_size` blocks (one per environment) of
+    `max_length` frames each, every `add_batch` adds a frame to every block. Frames are kept in numpy
+    arrays, a sampled window is a single fancy index per field.
+
+    Every frame knows the last frame of its episode, windows starting close to the end of an episode are
+    clipped to that frame instead of running into the next episode, i.e. the final transitions of an
+    episode are sampled as often as all others and their n-step returns only contain rewards of their own
+    episode (the repeated last frame is discounted away by its zero discount). The last frames of running
+    episodes are only sampled once a full window is available.
+
+    The buffer is a `PythonState`, i.e. `common.Checkpointer(replay_buffer=...)` saves and restores it.
+    Given a `directory`, the arrays are memory-mapped files instead (see `MappedStore`), i.e. frames are
+    persisted as they are added and a checkpoint only writes a small manifest. Opening an existing directory
+    maps its files, frames are only read once sampled. The ends of all frames, priorities and other derived
+    state are rebuilt from the (small) step types and ids of the held frames. Every `flush_interval` frames
+    the store writes the frames back in the background, outside of the lock.
+    """
+
+    # info returned alongside every sampled batch
+    INFO: type[tuple[Any, ...]] = BufferInfo
+
+    def __init__(
+        self,
+        data_spec: Trajectory,
+        batch_size: int,
+        max_length: int = 1000,
+        seed: int | None = None,
+        directory: Path | None = None,
+        flush_interval: int = 4096,
+    ):
+        self.data_spec = data_spec
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.capacity = batch_size * max_length
+
+        self.generator = np.random.default_rng(seed)
+        self.lock = RLock()
+
+        self.specs = tf.nest.flatten(data_spec)
+        self.storage: list[NDArray[Any]] = [np.zeros(shape, dtype=dtype) for dtype, shape in self._fields()]
+
+        # id of the frames held at every position of the ring, -1 if none
+        self.frame_ids = np.full(max_length, -1, dtype=np.int64)
+
+        # id of the last frame of the episode of every frame, ids increase by one with every `add_batch`
+        self.ends = np.full(self.capacity, NO_END, dtype=np.int64)
+        self.last_id = -1
+
+        # frames before this id were lost (e.g. partially written by a crashed process), see `_restore`
+        self.first_id = 0
+
+        # id of the first frame of the running episode of every block, beyond `last_id` if none is running
+        self.episode_starts = np.zeros(batch_size, dtype=np.int64)
+
+        self.offsets = np.arange(batch_size, dtype=np.int64) * max_length
+
+        # index of every field within the flat storage
+        self.fields: Trajectory = tf.nest.pack_sequence_as(data_spec, [*range(len(self.specs))])
+
+        self.flush_interval = flush_interval
+        self.store: MappedStore | None = None
+        if directory is not None:
+            self.attach(directory)
+
+    def _fields(self) -> list[tuple[np.dtype, tuple[int, ...]]]:
+        """The dtype and shape of the array of every field, a row per frame of every block."""
+        return [(np.dtype(spec.dtype.as_numpy_dtype), (self.capacity, *spec.shape)) for spec in self.specs]
+
+    def _rows(self, ids: NDArray[np.int64], blocks: NDArray[np.int64]) -> NDArray[np.int64]:
+        return blocks * self.max_length + ids % self.max_length
+
+    def _end_episodes(self, blocks: NDArray[np.int64], last_id: int) -> None:
+        """Marks `last_id` as the last frame of the running episodes of the given blocks."""
+        for block in blocks:
+            ids = np.arange(max(self.episode_starts[block], last_id - self.max_length + 1), last_id + 1)
+            self.ends[self._rows(ids, block)] = last_id
+            self.episode_starts[block] = last_id + 1
+
+    def add_batch(self, items: Trajectory) -> Any:
+        """Adds a frame to every block.
+
+        Within a `tf.function` (e.g. the drivers of `utils.driver`) the frames are added by a
+        `tf.numpy_function` once the graph runs, it returns the id of the added frames. Callers
+        should depend on this output (e.g. using `tf.control_dependencies`), so the op is never pruned.
+
+        :param items: The trajectory of every environment, with an outer dimension of `batch_size`.
+        """
+        if not tf.executing_eagerly():
+
+            def add(*frames: NDArray[Any]) -> np.int64:
+                self._add_batch(tf.nest.pack_sequence_as(items, frames))
+                return np.int64(self.last_id)
+
+            return tf.numpy_function(add, tf.nest.flatten(items), tf.int64, stateful=True)
+
+        return self._add_batch(items)
+
+    def _add_batch(self, items: Trajectory) -> None:
+        frames = [np.asarray(leaf) for leaf in tf.nest.flatten(items)]
+        step_types, next_step_types = np.asarray(items.step_type), np.asarray(items.next_step_type)
+
+        with self.lock:
+            id_ = self.last_id + 1
+
+            # episodes that were not played until the end are cut off before their successor starts
+            first = np.flatnonzero((step_types == StepType.FIRST) & (self.episode_starts < id_))
+            self._end_episodes(first, id_ - 1)
+            self.episode_starts[first] = id_
+
+            # the id is written last, i.e. partially written frames (e.g. of a crashed process) are never restored
+            position = id_ % self.max_length
+            self.frame_ids[position] = -1
+
+            rows = self.offsets + position
+            for storage, frame in zip(self.storage, frames):
+                storage[rows] = frame
+            self.ends[rows] = NO_END
+            self.frame_ids[position] = id_
+            self.last_id = id_
+
+            self._end_episodes(np.flatnonzero(next_step_types == StepType.LAST), id_)
+
+            if self.store is not None and (id_ + 1) % self.flush_interval == 0:
+                self.store.request_flush()
+
+    def _oldest_id(self) -> int:
+        """The id of the oldest frame held by every block."""
+        return max(self.last_id - self.max_length + 1, self.first_id)
+
+    def num_frames(self) -> int:
+        return max(self.last_id + 1 - self._oldest_id(), 0) * self.batch_size
+
+    def _sample_starts(self, size: int, steps: int) -> tuple[NDArray[np.int64], NDArray[np.int64], NDArray[np.float32]]:
+        """Chooses the first frame of every window uniformly among all valid frames, called while holding the lock.
+
+        :param size: The number of windows.
+        :param steps: The number of frames per window.
+        :return: The block and id of every first frame and its sampling probability.
+        """
+        oldest = self._oldest_id()
+        newest = np.maximum(self.episode_starts - 1, self.last_id - steps + 1)
+
+        valid = np.flatnonzero(newest >= oldest)
+        if not len(valid):
+            raise Exception(f"{type(self).__name__} is empty. Make sure to add items before sampling the buffer.")
+
+        blocks = valid[self.generator.integers(0, len(valid), size)]
+        counts = newest[blocks] - oldest + 1
+        ids = oldest + (self.generator.random(size) * counts).astype(np.int64)
+
+        return blocks, ids, (1 / (counts * len(valid))).astype(np.float32)
+
+    def _info(self, blocks: NDArray[np.int64], windows: NDArray[np.int64], probabilities: NDArray[np.float32]) -> tuple[NDArray[Any], ...]:
+        """Returns the fields of the info of the sampled windows, see `INFO`."""
+        return windows, probabilities
+
+    def _info_specs(self, sample_batch_size: int | None, num_steps: int | None) -> list[tf.TensorSpec]:
+        return [tf.TensorSpec([sample_batch_size, num_steps], tf.int64), tf.TensorSpec([sample_batch_size], tf.float32)]
+
+    def _sample(self, sample_batch_size: int | None, num_steps: int | None) -> tuple[list[NDArray[Any]], tuple[NDArray[Any], ...]]:
+        """Samples a batch of windows.
+
+        :return: The flat fields of the sampled windows and the fields of their info.
+        """
+        with self.lock:
+            blocks, ids, probabilities = self._sample_starts(sample_batch_size or 1, num_steps or 1)
+
+            windows = np.minimum(ids[:, None] + np.arange(num_steps or 1), self.ends[self._rows(ids, blocks)][:, None])
+            fields = [storage[self._rows(windows, blocks[:, None])] for storage in self.storage]
+
+        if num_steps is None:
+            fields, windows = [field[:, 0] for field in fields], windows[:, 0]
+
+        info = self._info(blocks, windows, probabilities)
+
+        if sample_batch_size is None:
+            fields, info = [field[0] for field in fields], tuple(field[0] for field in info)
+
+        return fields, info
+
+    def get_next(self, sample_batch_size: int | None = None, num_steps: int | None = None, time_stacked: bool = True) -> tuple[Trajectory, tuple[Any, ...]]:
+        """Samples a batch of windows, see `ReplayBuffer.get_next`, only time stacked windows are supported."""
+        fields, info = self._sample(sample_batch_size, num_steps)
+        data = tf.nest.pack_sequence_as(self.data_spec, [tf.convert_to_tensor(field) for field in fields])
+        return data, self.INFO(*[tf.convert_to_tensor(field) for field in info])
+
+    def as_dataset(
+        self, sample_batch_size: int | None = None, num_steps: int | None = None, num_parallel_calls: int | None = None, single_deterministic_pass: bool = False
+    ) -> tf.data.Dataset:
+        """Creates an endless dataset of sampled windows, see `ReplayBuffer.as_dataset`."""
+        if single_deterministic_pass:
+            raise NotImplementedError(f"{type(self).__name__} only supports sampling.")
+
+        outer_shape = [dimension for dimension in [sample_batch_size, num_steps] if dimension is not None]
+        info_specs = self._info_specs(sample_batch_size, num_steps)
+        dtypes = [spec.dtype for spec in self.specs] + [spec.dtype for spec in info_specs]
+
+        def sample(_: Any) -> tuple[NDArray[Any], ...]:
+            fields, info = self._sample(sample_batch_size, num_steps)
+            return (*fields, *info)
+
+        def get_next(counter: tf.Tensor) -> tuple[Trajectory, tuple[Any, ...]]:
+            tensors = tf.numpy_function(sample, [counter], dtypes)
+            fields, info = tensors[: len(self.specs)], tensors[len(self.specs) :]
+
+            for field, spec in zip(fields, self.specs):
+                field.set_shape([*outer_shape, *spec.shape])
+            for field, spec in zip(info, info_specs):
+                field.set_shape([dimension for dimension in spec.shape if dimension is not None])
+
+            return tf.nest.pack_sequence_as(self.data_spec, fields), self.INFO(*info)
+
+        return tf.data.Dataset.counter().map(get_next, num_parallel_calls=num_parallel_calls)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.ends[:] = NO_END
+            self.frame_ids[:] = -1
+            self.last_id = -1
+            self.first_id = 0
+            self.episode_starts[:] = 0
+
+    def _state(self) -> dict[str, NDArray[Any]]:
+        """Returns all arrays making up the state of this buffer, which are (de)serialized in place."""
+        return {
+            **{f"field_{i}": storage for i, storage in enumerate(self.storage)},
+            "frame_ids": self.frame_ids,
+            "ends": self.ends,
+            "episode_starts": self.episode_starts,
+        }
+
+    def _persisted_state(self) -> dict[str, Any]:
+        """Returns the state stored within the manifest besides the frames, see `_restore_state`."""
+        return {"last_id": self.last_id}
+
+    def _restore_state(self, manifest: dict[str, Any], rows: NDArray[np.int64]) -> None:
+        """Rebuilds all state derived from the restored rows, the manifest holds the state persisted by `_persisted_state`."""
+        # the end of every frame is the next frame that ended its episode or preceded the start of another one
+        step_types, next_step_types = self.storage[self.fields.step_type][rows], self.storage[self.fields.next_step_type][rows]
+        boundaries = next_step_types == StepType.LAST
+        boundaries[:-1] |= step_types[1:] == StepType.FIRST
+
+        ids = np.arange(self.last_id - len(rows) + 1, self.last_id + 1)[:, None]
+        ends = np.minimum.accumulate(np.where(boundaries, ids, NO_END)[::-1], axis=0)[::-1]
+        self.ends[rows] = np.where(ids >= self.episode_starts, NO_END, ends)
+
+    def _restore(self) -> None:
+        """Rebuilds the state of the buffer from the ids and step types of the mapped frames, called while holding the lock."""
+        assert self.store is not None
+
+        last_id = int(self.frame_ids.max())
+        if last_id < 0:
+            return self.clear()
+
+        self.ends[:] = NO_END
+        self.last_id, self.first_id = last_id, 0
+
+        # frames missing within the ring (e.g. partially written) cut off all older frames
+        expected = np.arange(self._oldest_id(), self.last_id + 1)
+        missing = expected[self.frame_ids[expected % self.max_length] != expected]
+        if len(missing):
+            self.first_id = int(missing[-1]) + 1
+            expected = expected[expected >= self.first_id]
+
+        # positions outside of the held frames are marked empty
+        self.frame_ids[np.setdiff1d(np.arange(self.max_length), expected % self.max_length)] = -1
+
+        # the running episode of every block started with its latest first frame, unless its latest frame ended it
+        rows = self._rows(expected[:, None], np.arange(self.batch_size))
+        step_types, next_step_types = self.storage[self.fields.step_type][rows], self.storage[self.fields.next_step_type][rows]
+        starts = np.where(step_types == StepType.FIRST, expected[:, None], expected[0]).max(axis=0)
+        self.episode_starts[:] = np.where(next_step_types[-1] == StepType.LAST, self.last_id + 1, starts)
+
+        self._restore_state(self.store.manifest() or {}, rows)
+
+    def attach(self, directory: Path) -> None:
+        """Maps the arrays of this buffer to the files of the given directory from now on, restoring its frames if it holds any.
+
+        Otherwise the files are created and all frames currently held are copied into them once, i.e. the new
+        store is complete on its own (and the previous one is left untouched from now on).
+
+        :param directory: The directory of the store.
+        """
+        with self.lock:
+            store = MappedStore(directory, self._fields(), self.max_length)
+
+            if not store.existed:
+                for mapped, storage in zip([*store.fields, store.ids], [*self.storage, self.frame_ids]):
+                    mapped[...] = storage
+
+            if self.store is not None:
+                self.store.close()
+
+            self.store, self.storage, self.frame_ids = store, store.fields, store.ids
+
+            if store.existed:
+                self._restore()
+
+    def serialize(self) -> bytes:
+        if self.store is not None:
+            with self.lock:
+                state = self._persisted_state()
+
+            # frames added meanwhile are written back as well, these are restored from their ids
+            self.store.flush()
+            self.store.write_manifest(state)
+            return json.dumps(state).encode()
+
+        with self.lock:
+            buffer = io.BytesIO()
+            np.savez(buffer, last_id=self.last_id, first_id=self.first_id, **self._state())
+            return buffer.getvalue()
+
+    def deserialize(self, string_value: bytes) -> None:
+        # the mapped frames may be more recent than the checkpoint
+        if self.store is not None:
+            with self.lock:
+                return self._restore()
+
+        with self.lock, np.load(io.BytesIO(string_value)) as state:
+            for name, array in self._state().items():
+                array[...] = state[name]
+
+            self.last_id, self.first_id = int(state["last_id"]), int(state["first_id"])
@@ -0,0 +1,101 @@
+import json
+import os
+from pathlib import Path
+from queue import Full, Queue
+from threading import Thread
+from typing import Any
+
+import numpy as np
+from numpy.typing import NDArray
+
+MANIFEST = "manifest.json"
+IDS = "ids.npy"
+
+
+class MappedStore:
+    """Memory-mapped `.npy` files backing the storage of a replay buffer, laid out exactly like its in-memory ring.
+
+    Every field is a file of `capacity` rows (the row of a frame is `block * max_length + id % max_length`),
+    `ids.npy` holds the frame id stored at every position of the ring (-1 while empty or partially written).
+    Frames are written into the maps directly and written back by the operating system, i.e. opening an
+    existing store only maps its files, regardless of their size. The remaining (small) state of the buffer
+    is kept in a manifest, which is replaced atomically.
+
+    Dirty frames are written back by a background thread on `request_flush`, i.e. writers never wait for
+    the disk and a checkpoint only writes the frames added since the last request.
+    """
+
+    def __init__(self, directory: Path, fields: list[tuple[np.dtype, tuple[int, ...]]], max_length: int) -> None:
+        self.directory = directory
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        # a store is only complete once its ids were created, these are created last
+        self.existed = (directory / IDS).exists()
+
+        self.fields = [self._map(f"field_{i}.npy", dtype, shape) for i, (dtype, shape) in enumerate(fields)]
+        self.ids = self._map(IDS, np.dtype(np.int64), (max_length,))
+
+        if not self.existed:
+            self.ids[:] = -1
+
+        # a single pending request covers all frames written before it is handled
+        self.requests: Queue[bool | None] = Queue(1)
+        self.writer = Thread(target=self._write_back, daemon=True)
+        self.writer.start()
+
+    def _map(self, name: str, dtype: np.dtype, shape: tuple[int, ...]) -> NDArray[Any]:
+        path = self.directory / name
+
+        if not self.existed:
+            return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+
+        array = np.lib.format.open_memmap(path, mode="r+")
+        if array.dtype != dtype or array.shape != shape:
+            raise Exception(f"'{path}' holds {array.dtype} {array.shape} instead of {dtype} {shape}, was the buffer created with other parameters?")
+
+        return array
+
+    def manifest(self) -> dict[str, Any] | None:
+        path = self.directory / MANIFEST
+        if not path.exists():
+            return None
+
+        with open(path, "r") as file:
+            return json.load(file)
+
+    def flush(self) -> None:
+        """Writes all frames back to their files.
+
+        Syncs the files instead of the maps, `np.memmap.flush` holds the GIL (i.e. stalls all threads) until written.
+        """
+        for array in [*self.fields, self.ids]:
+            descriptor = os.open(array.filename, os.O_RDWR)
+            try:
+                os.fdatasync(descriptor)
+            finally:
+                os.close(descriptor)
+
+    def request_flush(self) -> None:
+        """Lets the background thread write back all frames written so far, without waiting for it."""
+        try:
+            self.requests.put_nowait(True)
+        except Full:
+            pass
+
+    def _write_back(self) -> None:
+        while self.requests.get() is not None:
+            self.flush()
+
+    def close(self) -> None:
+        """Stops the background thread once all requested frames were written back."""
+        self.requests.put(None)
+        self.writer.join()
+
+    def write_manifest(self, state: dict[str, Any]) -> None:
+        """Replaces the manifest, i.e. readers either see the old or the new manifest."""
+        path = self.directory / MANIFEST
+        temporary = path.with_suffix(".tmp")
+
+        with open(temporary, "w") as file:
+            json.dump(state, file)
+        os.replace(temporary, path)
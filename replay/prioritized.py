@@ -0,0 +1,180 @@
+from pathlib import Path
+from typing import Any, NamedTuple
+
+import numpy as np
+import tensorflow as tf  # type: ignore
+from numpy.typing import NDArray
+from tf_agents.trajectories.trajectory import Trajectory  # type: ignore
+
+from replay.episode import EpisodeReplayBuffer
+
+# attempts to replace sampled windows that are not valid (yet), e.g. the last frames of running episodes
+MAX_RESAMPLES = 16
+
+
+class PrioritizedBufferInfo(NamedTuple):
+    # frame id and block of the first frame of every window (`id * batch_size + block`), see `PrioritizedReplayBuffer.update_priorities`
+    ids: Any
+    probabilities: Any
+    # importance sampling weights, normalized to a maximum of one within every batch
+    weights: Any
+
+
+class SumTree:
+    """Array backed binary tree whose inner nodes hold the sum of their children, the root holds the total.
+
+    Both updating and finding leaves are vectorized over a batch of leaves, i.e. a batch takes
+    O(batch · log N) operations but only O(log N) numpy calls.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self.leaves = 1 << (capacity - 1).bit_length()
+        self.nodes = np.zeros(2 * self.leaves, dtype=np.float64)
+
+    @property
+    def total(self) -> float:
+        return float(self.nodes[1])
+
+    def get(self, indices: NDArray[np.int64]) -> NDArray[np.float64]:
+        return self.nodes[indices + self.leaves]
+
+    def update(self, indices: NDArray[np.int64], values: NDArray[np.float64]) -> None:
+        """Sets the given leaves to the given values, the last value wins for duplicate leaves."""
+        nodes = indices + self.leaves
+        self.nodes[nodes] = values
+
+        # all leaves share the same depth, i.e. every iteration moves up a single level
+        while nodes[0] > 1:
+            nodes = np.unique(nodes >> 1)
+            self.nodes[nodes] = self.nodes[2 * nodes] + self.nodes[2 * nodes + 1]
+
+    def find(self, targets: NDArray[np.float64]) -> NDArray[np.int64]:
+        """Finds the leaves whose prefix sums contain the given targets, i.e. samples leaves proportional to their values.
+
+        :param targets: The targets within [0, total).
+        :return: The indices of the found leaves.
+        """
+        nodes = np.ones(len(targets), dtype=np.int64)
+
+        while nodes[0] < self.leaves:
+            left = self.nodes[2 * nodes]
+            right = targets >= left
+            targets = np.where(right, targets - left, targets)
+            nodes = 2 * nodes + right
+
+        return nodes - self.leaves
+
+
+class PrioritizedReplayBuffer(EpisodeReplayBuffer):
+    """Episode replay buffer sampling windows proportional to the priority of their first frame.
+
+    Priorities are `(|td error| + epsilon)^alpha`, new (and restored) frames get the highest priority seen so far,
+    i.e. every frame is likely sampled at least once. Batches are sampled stratified, the info of every
+    batch contains the importance sampling weights `(N · P(i))^-beta` (to be passed to `agent.train`)
+    and the frames to pass to `update_priorities` together with the td errors of the trained batch.
+    """
+
+    INFO = PrioritizedBufferInfo
+
+    def __init__(
+        self,
+        data_spec: Trajectory,
+        batch_size: int,
+        max_length: int = 1000,
+        alpha: float = 0.6,
+        beta: float = 0.4,
+        epsilon: float = 1e-6,
+        seed: int | None = None,
+        directory: Path | None = None,
+        flush_interval: int = 4096,
+    ):
+        self.alpha = alpha
+        self.beta = beta
+        self.epsilon = epsilon
+
+        # created before the frames of the directory are restored
+        self.tree = SumTree(batch_size * max_length)
+        self.max_priority = np.ones((), dtype=np.float64)
+
+        super().__init__(data_spec, batch_size, max_length, seed, directory, flush_interval)
+
+    def _add_batch(self, items: Trajectory) -> None:
+        with self.lock:
+            super()._add_batch(items)
+            self.tree.update(self.offsets + self.last_id % self.max_length, np.full(self.batch_size, self.max_priority**self.alpha))
+
+    def update_priorities(self, ids: Any, td_errors: Any) -> None:
+        """Updates the priorities of the first frames of the trained windows.
+
+        Frames that were overwritten since they were sampled (e.g. while a chunk was trained) are skipped,
+        i.e. the frames replacing them keep the highest priority of new frames.
+
+        :param ids: The first frames of the trained windows, see `PrioritizedBufferInfo.ids`.
+        :param td_errors: The td error of every trained window, e.g. `loss.extra.td_error` of a `DqnAgent`.
+        """
+        priorities = np.abs(np.asarray(td_errors, dtype=np.float64)) + self.epsilon
+        ids, blocks = np.divmod(np.asarray(ids, dtype=np.int64), self.batch_size)
+
+        with self.lock:
+            held = ids >= self._oldest_id()
+            if not np.any(held):
+                return
+
+            self.tree.update(self._rows(ids[held], blocks[held]), priorities[held] ** self.alpha)
+            self.max_priority[...] = max(float(self.max_priority), float(np.max(priorities[held])))
+
+    def _sample_starts(self, size: int, steps: int) -> tuple[NDArray[np.int64], NDArray[np.int64], NDArray[np.float32]]:
+        oldest = self._oldest_id()
+        newest = np.maximum(self.episode_starts - 1, self.last_id - steps + 1)
+
+        total = self.tree.total
+        if self.last_id < 0 or total <= 0 or np.all(newest < oldest):
+            raise Exception(f"{type(self).__name__} is empty. Make sure to add items before sampling the buffer.")
+
+        targets = (np.arange(size) + self.generator.random(size)) * (total / size)
+        rows = self.tree.find(np.minimum(targets, np.nextafter(total, 0)))
+
+        for _ in range(MAX_RESAMPLES):
+            # rounding may find a (zero) padding leaf beyond the capacity, these are resampled like invalid windows
+            padding = rows >= self.capacity
+            blocks, positions = np.divmod(np.where(padding, 0, rows), self.max_length)
+            ids = self.last_id - (self.last_id - positions) % self.max_length
+
+            invalid = np.flatnonzero(padding | (ids < oldest) | (ids > newest[blocks]) | (self.tree.get(rows) <= 0))
+            if not len(invalid):
+                break
+
+            rows[invalid] = self.tree.find(self.generator.random(len(invalid)) * total)
+        else:
+            raise Exception(f"{type(self).__name__} could not sample valid windows, is the buffer too small for windows of {steps} frames?")
+
+        return blocks, ids, (self.tree.get(rows) / total).astype(np.float32)
+
+    def _info(self, blocks: NDArray[np.int64], windows: NDArray[np.int64], probabilities: NDArray[np.float32]) -> tuple[NDArray[Any], ...]:
+        starts = windows[:, 0] if windows.ndim > 1 else windows
+        weights = (probabilities * self.num_frames()) ** -self.beta
+
+        return starts * self.batch_size + blocks, probabilities, (weights / np.max(weights)).astype(np.float32)
+
+    def _info_specs(self, sample_batch_size: int | None, num_steps: int | None) -> list[tf.TensorSpec]:
+        return [tf.TensorSpec([sample_batch_size], dtype) for dtype in [tf.int64, tf.float32, tf.float32]]
+
+    def clear(self) -> None:
+        with self.lock:
+            super().clear()
+            self.tree.nodes[:] = 0
+            self.max_priority[...] = 1
+
+    def _persisted_state(self) -> dict[str, Any]:
+        return {**super()._persisted_state(), "max_priority": float(self.max_priority)}
+
+    def _restore_state(self, manifest: dict[str, Any], rows: NDArray[np.int64]) -> None:
+        """Restored frames are not ranked yet, i.e. they get the highest priority like new frames."""
+        super()._restore_state(manifest, rows)
+
+        self.max_priority[...] = manifest.get("max_priority", 1)
+        self.tree.nodes[:] = 0
+        self.tree.update(rows.ravel(), np.full(rows.size, self.max_priority**self.alpha))
+
+    def _state(self) -> dict[str, NDArray[Any]]:
+        return {**super()._state(), "priorities": self.tree.nodes, "max_priority": self.max_priority}
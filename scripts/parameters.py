@@ -12,6 +12,11 @@ class SlaveParameters:
     swap_interval: int = 0
     window_width: int = 0
     window_offset: int = 0
+    socket_path: str = ""
+    record_path: str = ""
+    batch_size: int = 1
+    policy_cache_size: int = 8
+    policy_cache_memory: int = 0  # [MB]
 
     def __post_init__(self) -> None:
         if self.adaptive:
@@ -22,6 +27,13 @@ class SlaveParameters:
 
     def as_args(self, offset: int) -> str:
         base = f"--port {self.port + offset} --episodes {self.episodes}"
+        if self.socket_path:
+            base += f" --socket_path {self.socket_path}.{offset}"
+        if self.record_path:
+            base += f" --record_path {self.record_path}"
+        if self.batch_size > 1:
+            base += f" --batch_size {self.batch_size}"
         if self.adaptive:
             base += f" --adaptive --name {self.name} --swap_start {self.swap_start} --swap_interval {self.swap_interval} --window_width {self.window_width} --window_offset {self.window_offset}"
+            base += f" --policy_cache_size {self.policy_cache_size} --policy_cache_memory {self.policy_cache_memory}"
         return base
@@ -19,6 +19,8 @@ parser.add_argument("--single", action=argparse.BooleanOptionalAction)
 parser.add_argument("--port", type=int)
 parser.add_argument("--name", type=str)
 parser.add_argument("--buffer_size", type=int, default=100_000)
+parser.add_argument("--replay_buffer", type=str, default="episode", choices=["uniform", "compact", "episode", "prioritized"])
+parser.add_argument("--batch_size", type=int, default=1, help="Number of concurrent games, must match the training as it shapes the buffer.")
 
 # additional catan engine parameters
 parser.add_argument("--verbose", action=argparse.BooleanOptionalAction)
@@ -35,14 +37,14 @@ args = parser.parse_args()
 BUFFER_CACHE_DIRECTORY = Path(f"./cache/buffers/{'single' if args.single else 'dynamic'}/{args.name}")
 
 engine_parameters = catan_engine.EngineParameters(args.single, args.verbose, args.assisted, True, args.episodes, args.port, args.seed)
-environment_parameters = environment.EnvironmentParams(args.reward_mode, args.use_end_signal, args.port)
+environment_parameters = environment.EnvironmentParams(args.reward_mode, args.use_end_signal, args.port, batch_size=args.batch_size)
 
 pprint.pprint(engine_parameters, indent=4)
 pprint.pprint(environment_parameters, indent=4)
 
-start_catan_engine = catan_engine.get_launch_callback(engine_parameters)
+start_catan_engine = catan_engine.get_launch_callback(engine_parameters, engines=args.batch_size)
 policy, tf_environment = loader.get_initial_random_policy(environment_parameters)
-buffer, checkpointer = loader.get_initial_replay_buffer(args.buffer_size, BUFFER_CACHE_DIRECTORY, policy, tf_environment)
+buffer, checkpointer = loader.get_initial_replay_buffer(args.buffer_size, BUFFER_CACHE_DIRECTORY, policy, tf_environment, args.replay_buffer)
 
 start_catan_engine()
 
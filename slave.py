@@ -3,8 +3,6 @@ import gc
 import random
 from pathlib import Path
 
-import tensorflow as tf  # type: ignore
-
 import environment
 from utils import loader, player
 
@@ -12,6 +10,9 @@ parser = argparse.ArgumentParser()
 
 # additional environment parameters
 parser.add_argument("--port", type=int)
+parser.add_argument("--socket_path", type=str, default="", help="Unix domain socket to serve the engine on instead of the port.")
+parser.add_argument("--record_path", type=str, default="", help="Directory to record all played trajectories to.")
+parser.add_argument("--batch_size", type=int, default=1, help="Number of concurrent games served on the endpoint, i.e. engines of the master.")
 
 # slave parameters
 parser.add_argument("--episodes", type=int)
@@ -24,6 +25,8 @@ parser.add_argument("--swap_start", type=int, default=0, help="An amount of epis
 parser.add_argument("--swap_interval", type=int, default=0, help="The interval [episodes] in which the policy is re-chosen.")
 parser.add_argument("--window_width", type=int, default=0, help="Sample window size i.e. the amount of possible old polices to choose from.")
 parser.add_argument("--window_offset", type=int, default=0, help="Sample window size i.e. the amount of possible old polices to choose from.")
+parser.add_argument("--policy_cache_size", type=int, default=8, help="The maximum amount of loaded policies kept in memory.")
+parser.add_argument("--policy_cache_memory", type=int, default=0, help="The maximum size [MB] of the loaded policies kept in memory, 0 is unlimited.")
 
 args = parser.parse_args()
 
@@ -32,7 +35,9 @@ if args.seed >= 0:
 
 
 POLICY_CACHE_DIRECTORY = Path(args.name)
-environment_parameters = environment.EnvironmentParams("naive", False, args.port)
+environment_parameters = environment.EnvironmentParams(
+    "naive", False, args.port, socket_path=args.socket_path, batch_size=args.batch_size, record_path=args.record_path
+)
 
 if args.adaptive:
     # run a random policy for the first few episodes
@@ -43,16 +48,20 @@ if args.adaptive:
 
     left_episodes = args.episodes - args.swap_start
 
+    # swapping back to a recently used policy neither loads nor traces it again
+    policy_cache = loader.PolicyCache(args.policy_cache_size, args.policy_cache_memory * 2**20)
+
+    evictions = 0
     for _ in range(left_episodes // args.swap_interval):
-        if policy:= loader.load_recent_policy(POLICY_CACHE_DIRECTORY, args.window_width, args.window_offset):
+        if policy:= loader.load_recent_policy(POLICY_CACHE_DIRECTORY, args.window_width, args.window_offset, policy_cache):
             _, _, _ = player.play_episodes(policy, tf_environment, args.swap_interval, True)
         else:
             _, _, _ = player.play_episodes(random_policy, tf_environment, args.swap_interval, True)
 
-
-        # some clean up, may help with constantly increasing ram usage
-        tf.keras.backend.clear_session()
-        gc.collect()
+        # some clean up, only once the cache released evicted policies, i.e. swaps between cached policies stay cheap
+        if policy_cache.evictions > evictions:
+            evictions = policy_cache.evictions
+            gc.collect()
 
     tf_environment.close()
 
@@ -43,5 +43,5 @@ policy = loader.load_policy(PATH)
 
 start_catan_engine()
 
-_, _, _ = player.play_episodes(policy, tf_environment, args.episodes, True)
+_, _, _ = player.play_episodes(policy, tf_environment, args.episodes, True, clean_up=True)
 tf_environment.close()
@@ -15,7 +15,7 @@ import catan_engine
 import environment
 import metrics
 from scripts import SlaveParameters
-from utils import loader, player
+from utils import evaluator, loader, player, trainer
 
 absl.logging.set_verbosity(absl.logging.ERROR)  # type: ignore
 
@@ -28,7 +28,11 @@ parser = argparse.ArgumentParser()
 # general parameters
 parser.add_argument("--single", action=argparse.BooleanOptionalAction)
 parser.add_argument("--train_async", action=argparse.BooleanOptionalAction)
+parser.add_argument("--train_decoupled", action=argparse.BooleanOptionalAction)
 parser.add_argument("--port", type=int)
+parser.add_argument("--socket_path", type=str, default="")
+parser.add_argument("--record_path", type=str, default="")
+parser.add_argument("--batch_size", type=int, default=1, help="Number of concurrent games (engines) stepped as a single batch.")
 parser.add_argument("--initial_name", type=str)
 parser.add_argument("--name", type=str)
 
@@ -46,6 +50,8 @@ parser.add_argument("--use_end_signal", action=argparse.BooleanOptionalAction)
 parser.add_argument("--training_intervals", type=int)
 parser.add_argument("--training_episodes", type=int)
 parser.add_argument("--evaluation_episodes", type=int)
+parser.add_argument("--evaluation_workers", type=int, default=0, help="Evaluate on this many dedicated engines while training, 0 evaluates in between.")
+parser.add_argument("--evaluation_port", type=int, default=0, help="First port of the evaluation engines, defaults to the port after the slaves.")
 parser.add_argument("--batchsize", type=int)
 
 # additional agent parameters
@@ -55,6 +61,8 @@ parser.add_argument("--soft_updates", action=argparse.BooleanOptionalAction)
 parser.add_argument("--epsilon_steps", type=int)
 parser.add_argument("--epsilon_end", type=float, default=0.1)
 parser.add_argument("--buffer_size", type=int, default=100_000)
+parser.add_argument("--replay_buffer", type=str, default="episode", choices=["uniform", "compact", "episode", "prioritized"])
+parser.add_argument("--weight_push_interval", type=int, default=16)
 
 # additional slave parameters
 parser.add_argument("--adaptive", action=argparse.BooleanOptionalAction)
@@ -65,7 +73,13 @@ parser.add_argument("--window_offset", type=int, default=0)
 
 args = parser.parse_args()
 
-NUMBER_OF_EPISODES = args.evaluation_episodes + (args.training_episodes + args.evaluation_episodes) * args.training_intervals
+NUMBER_OF_EVALUATIONS = args.training_intervals + 1
+
+# evaluation episodes are played on the engines of the evaluation workers if there are any
+if args.evaluation_workers:
+    NUMBER_OF_EPISODES = args.training_episodes * args.training_intervals
+else:
+    NUMBER_OF_EPISODES = args.evaluation_episodes + (args.training_episodes + args.evaluation_episodes) * args.training_intervals
 
 folder = "single" if args.single else "dynamic"
 
@@ -73,9 +87,18 @@ BUFFER_CACHE_DIRECTORY = Path(f"./cache/buffers/{folder}/{args.initial_name}/")
 POLICY_CACHE_DIRECTORY = Path(f"./cache/policies/{folder}/{str(args.name).replace('s13', 's7')}/")
 AGENT_CACHE_DIRECTORY = Path(f"./cache/agents/{folder}/{str(args.name).replace('s13', 's7')}/")
 METRICS_FILE_PATH = Path(f"./cache/metrics/{folder}/")
+EVALUATION_CACHE_DIRECTORY = Path(f"./cache/evaluations/{folder}/{args.name}/")
 
 agent_parameters = agent.AgentParams(
-    args.gamma, args.n_steps, args.batchsize, args.soft_updates, args.epsilon_steps, epsilon_end=args.epsilon_end, buffer_size=args.buffer_size
+    args.gamma,
+    args.n_steps,
+    args.batchsize,
+    args.soft_updates,
+    args.epsilon_steps,
+    epsilon_end=args.epsilon_end,
+    buffer_size=args.buffer_size,
+    replay_buffer=args.replay_buffer,
+    weight_push_interval=args.weight_push_interval,
 )
 
 engine_parameters = catan_engine.EngineParameters(
@@ -86,12 +109,16 @@ engine_parameters = catan_engine.EngineParameters(
     NUMBER_OF_EPISODES,
     args.port,
     args.seed,
+    socket_path=args.socket_path,
 )
 
 environment_parameters = environment.EnvironmentParams(
     args.reward_mode,
     args.use_end_signal,
     args.port,
+    socket_path=args.socket_path,
+    batch_size=args.batch_size,
+    record_path=args.record_path,
 )
 
 slave_parameters = SlaveParameters(
@@ -103,17 +130,33 @@ slave_parameters = SlaveParameters(
     args.swap_interval,
     args.window_width,
     args.window_offset,
+    args.socket_path,
+    args.record_path,
+    batch_size=args.batch_size,
+)
+
+evaluator_parameters = evaluator.EvaluatorParams(
+    args.evaluation_workers,
+    args.evaluation_episodes,
+    NUMBER_OF_EVALUATIONS,
+    args.evaluation_port or args.port + evaluator.PORTS_PER_WORKER,
+    (args.seed or 0) + 1,
+    socket_path=args.socket_path,
 )
 
 pprint.pprint(agent_parameters, indent=4)
 pprint.pprint(engine_parameters, indent=4)
 pprint.pprint(environment_parameters, indent=4)
 pprint.pprint(slave_parameters, indent=4)
+pprint.pprint(evaluator_parameters, indent=4)
 
 eval_writer = metrics.EvaluationWriter(METRICS_FILE_PATH / f"{args.name}.csv")
 loss_writer = metrics.LossWriter(METRICS_FILE_PATH / f"{args.name}.loss.csv")
+latency_writer = metrics.LatencyWriter(METRICS_FILE_PATH / f"{args.name}.latency.csv")
+learner_writer = metrics.LearnerWriter(METRICS_FILE_PATH / f"{args.name}.learner.csv")
 
-start_catan_engine = catan_engine.get_launch_callback(engine_parameters)
+# every game of a batch is played by its own engine, each plays all episodes, i.e. no game runs dry before the batch completed them
+start_catan_engine = catan_engine.get_launch_callback(engine_parameters, engines=args.batch_size)
 tf_agent, tf_environment, buffer, checkpointer, saver = loader.get_master(
     agent_parameters,
     environment_parameters,
@@ -136,11 +179,26 @@ if not args.init:
     ]
 
 
+# set up evaluation workers, these launch their own engines
+evaluation_workers = (
+    evaluator.Evaluator(evaluator_parameters, engine_parameters, environment_parameters, eval_writer) if args.evaluation_workers else None
+)
+
+
 # define evaluation callback
 def evaluation() -> None:
-    rewards, steps, lengths = player.play_episodes(tf_agent.policy, tf_environment, args.evaluation_episodes)
-    evaluation = metrics.EvaluationMetrics(rewards, steps, lengths, float(tf_agent._epsilon_greedy()))  # type: ignore
-    eval_writer.add(evaluation)
+    if evaluation_workers:
+        # evaluate a snapshot of the current policy on the evaluation engines while training continues
+        snapshot = EVALUATION_CACHE_DIRECTORY / f"{tf_agent.train_step_counter.value()}"
+        saver.save(snapshot)
+        evaluation_workers.submit(snapshot, float(tf_agent._epsilon_greedy()))  # type: ignore
+    else:
+        rewards, steps, lengths = player.play_episodes(tf_agent.policy, tf_environment, args.evaluation_episodes, clean_up=True)
+        evaluation = metrics.EvaluationMetrics(rewards, steps, lengths, float(tf_agent._epsilon_greedy()))  # type: ignore
+        eval_writer.add(evaluation)
+
+    # latencies of all stages since the last evaluation
+    latency_writer.add(environment.latency.snapshot())
 
 
 start_catan_engine()
@@ -150,9 +208,16 @@ i = 0
 for _ in range(args.training_intervals):
     if args.train_async:
         loss = player.train_episodes_async(tf_agent, tf_environment, buffer, agent_parameters, args.training_episodes)
+    elif args.train_decoupled:
+        loss = player.train_episodes_decoupled(tf_agent, tf_environment, buffer, agent_parameters, args.training_episodes)
     else:
         loss = player.train_episodes(tf_agent, tf_environment, buffer, agent_parameters, args.training_episodes)
     loss_writer.add(loss)
+
+    # throughput of the learner input pipeline, only used by the async and decoupled modes
+    if (learner_metrics := trainer.snapshot()).batches:
+        learner_writer.add(learner_metrics)
+
     evaluation()
 
     i += 1
@@ -169,3 +234,6 @@ for _ in range(args.training_intervals):
 
 loader.save_agent(checkpointer, saver, tf_agent, POLICY_CACHE_DIRECTORY)
 tf_environment.close()
+
+if evaluation_workers:
+    evaluation_workers.close()
@@ -0,0 +1,104 @@
+from collections import OrderedDict
+from typing import Any
+
+import numpy as np
+import tensorflow as tf  # type: ignore
+from numpy.typing import NDArray
+from tf_agents.environments.tf_py_environment import TFPyEnvironment  # type: ignore
+from tf_agents.policies.tf_policy import TFPolicy  # type: ignore
+from tf_agents.trajectories import trajectory  # type: ignore
+from tf_agents.trajectories.time_step import TimeStep  # type: ignore
+
+# compiled drivers are kept for the most recently used combinations of policy, environment and buffer
+MAX_DRIVERS = 8
+
+# runs until the episode ends
+UNLIMITED = np.iinfo(np.int32).max
+
+
+class StepDriver:
+    """Runs the step loop of a policy within an unbatched environment as a single `tf.function`.
+
+    Deciding, stepping the (python) environment through the `numpy_function` bridge of `TFPyEnvironment`
+    and adding transitions to the replay buffer all happen within a single `tf.while_loop`, i.e. there is
+    no eager dispatch or host sync per decision. The rewards are gathered within a `TensorArray` and read
+    back once per run. The function is traced once, the start and the number of steps are tensors.
+
+    Batched environments are played by the eager loops of `utils.player` instead, e.g. `play_episodes_batched`.
+    """
+
+    def __init__(self, policy: TFPolicy, tf_environment: TFPyEnvironment, replay_buffer: Any | None = None) -> None:
+        if tf_environment.batch_size not in [None, 1]:
+            raise Exception(f"{type(self).__name__} only supports unbatched environments, got a batch size of {tf_environment.batch_size}.")
+
+        self.policy = policy
+        self.tf_environment = tf_environment
+        self.replay_buffer = replay_buffer
+
+        self._run = tf.function(self._loop)
+
+    def drives(self, policy: TFPolicy, tf_environment: TFPyEnvironment, replay_buffer: Any | None) -> bool:
+        return self.policy is policy and self.tf_environment is tf_environment and self.replay_buffer is replay_buffer
+
+    def _loop(self, time_step: TimeStep, max_steps: tf.Tensor) -> tuple[TimeStep, tf.Tensor]:
+        rewards = tf.TensorArray(self.tf_environment.reward_spec().dtype, size=0, dynamic_size=True, element_shape=[])
+
+        def running(time_step: TimeStep, rewards: tf.TensorArray, steps: tf.Tensor) -> tf.Tensor:
+            return tf.logical_and(steps < max_steps, tf.logical_not(tf.reduce_any(time_step.is_last())))
+
+        def step(time_step: TimeStep, rewards: tf.TensorArray, steps: tf.Tensor) -> tuple[TimeStep, tf.TensorArray, tf.Tensor]:
+            action_step = self.policy.action(time_step)
+            next_time_step = self.tf_environment.step(action_step.action)
+
+            added = []
+            if self.replay_buffer is not None:
+                added = self.replay_buffer.add_batch(trajectory.from_transition(time_step, action_step, next_time_step))
+
+            # the step only counts once the transition was added, i.e. adding can not be pruned from the loop
+            with tf.control_dependencies([op for op in tf.nest.flatten(added) if op is not None]):
+                steps = steps + 1
+
+            return next_time_step, rewards.write(steps - 1, next_time_step.reward[0]), steps
+
+        time_step, rewards, _ = tf.while_loop(running, step, (time_step, rewards, tf.constant(0)))
+        return time_step, rewards.stack()
+
+    def run(self, time_step: TimeStep, max_steps: int = UNLIMITED) -> tuple[TimeStep, NDArray[np.float32]]:
+        """Steps the environment until the episode ends or the given number of steps passed.
+
+        :param time_step: The time step to start from, e.g. the result of `tf_environment.reset()`.
+        :param max_steps: The maximum number of steps, defaults to the remainder of the episode.
+        :return: The last time step and the reward of every step.
+        """
+        time_step, rewards = self._run(time_step, tf.constant(max_steps, dtype=tf.int32))
+        return time_step, rewards.numpy()
+
+
+DRIVERS: OrderedDict[tuple[int, int, int], StepDriver] = OrderedDict()
+
+
+def get_driver(policy: TFPolicy, tf_environment: TFPyEnvironment, replay_buffer: Any | None = None) -> StepDriver:
+    """Returns the compiled driver of the given policy, environment and buffer, i.e. every combination is traced only once.
+
+    :param policy: The policy used for decision making.
+    :param tf_environment: The unbatched environment to deploy the policy in.
+    :param replay_buffer: A buffer to add all transitions to, defaults to None.
+    """
+    key = (id(policy), id(tf_environment), id(replay_buffer))
+
+    # ids of collected objects may be reused, i.e. cached drivers are only used for the very same objects
+    driver = DRIVERS.get(key)
+    if driver is None or not driver.drives(policy, tf_environment, replay_buffer):
+        driver = DRIVERS[key] = StepDriver(policy, tf_environment, replay_buffer)
+
+    DRIVERS.move_to_end(key)
+    while len(DRIVERS) > MAX_DRIVERS:
+        DRIVERS.popitem(last=False)
+
+    return driver
+
+
+def release_drivers(policy: TFPolicy) -> None:
+    """Drops the compiled drivers of the given policy, e.g. once it was evicted from a `loader.PolicyCache`."""
+    for key in [key for key, driver in DRIVERS.items() if driver.policy is policy]:
+        del DRIVERS[key]
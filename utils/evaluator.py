@@ -0,0 +1,140 @@
+import dataclasses
+import os
+import secrets
+import shutil
+import subprocess
+from dataclasses import dataclass
+from multiprocessing.connection import Connection, Listener
+from pathlib import Path
+from queue import Queue
+from threading import Thread
+
+from catan_engine import EngineParameters
+from environment import EnvironmentParams
+from metrics import EvaluationMetrics, EvaluationWriter
+from scripts import SlaveParameters
+
+# workers authenticate using the key given within this environment variable, see `evaluate.py`
+AUTHKEY_VARIABLE = "CATAN_EVALUATION_AUTHKEY"
+
+# every worker serves its engine on its own block of ports, one for the evaluated agent and one per slave
+SLAVES = 3
+PORTS_PER_WORKER = SLAVES + 1
+
+WorkerParameters = tuple[EngineParameters, EnvironmentParams, SlaveParameters | None]
+EpisodeResults = tuple[list[list[float]], list[int], list[float]]
+
+
+@dataclass
+class EvaluatorParams:
+    workers: int
+    episodes: int  # [episodes per evaluation]
+    evaluations: int
+    port: int
+    seed: int
+    socket_path: str = ""
+
+    def shares(self) -> list[int]:
+        """Splits the episodes of an evaluation evenly across the workers, lower workers play the remainder."""
+        return [self.episodes // self.workers + (1 if worker < self.episodes % self.workers else 0) for worker in range(self.workers)]
+
+    def worker_parameters(self, worker: int, engine: EngineParameters, environment: EnvironmentParams) -> WorkerParameters:
+        """Derives the parameters of the engine, environment and slaves of a single worker from the training ones.
+
+        Every worker plays its share of every evaluation on an engine seeded with `seed + worker`, i.e. the same
+        evaluation schedule always plays the same games. Evaluation episodes are never recorded.
+        """
+        port = self.port + worker * PORTS_PER_WORKER
+        socket_path = f"{self.socket_path}.eval{worker}" if self.socket_path else ""
+        episodes = self.shares()[worker] * self.evaluations
+
+        engine = dataclasses.replace(engine, episodes=episodes, port=port, seed=self.seed + worker, socket_path=socket_path)
+        environment = dataclasses.replace(environment, port=port, socket_path=socket_path, batch_size=1, record_path="")
+        slaves = SlaveParameters(port, episodes, socket_path=socket_path) if not engine.init else None
+
+        return engine, environment, slaves
+
+
+class Evaluator:
+    """Evaluates frozen policy snapshots on dedicated engines in worker processes while training continues.
+
+    Every worker (see `evaluate.py`) launches its own engine (and random slaves) and keeps its environment for
+    all evaluations. `submit` hands a saved policy to all workers and returns immediately, a background thread
+    merges the results of all workers (in worker order) into `EvaluationMetrics`, writes them and removes the
+    snapshot. Evaluations are written in the order they were submitted.
+    """
+
+    def __init__(
+        self, parameters: EvaluatorParams, engine_parameters: EngineParameters, environment_parameters: EnvironmentParams, writer: EvaluationWriter
+    ) -> None:
+        self.parameters = parameters
+        self.writer = writer
+
+        authkey = secrets.token_bytes(32)
+        self.listener = Listener(("127.0.0.1", 0), authkey=authkey)
+
+        for worker in range(parameters.workers):
+            _launch_worker(worker, self.listener.address[1], authkey)
+
+        # workers connect in any order and introduce themselves by their index
+        connections: dict[int, Connection] = {}
+        for _ in range(parameters.workers):
+            connection = self.listener.accept()
+            worker = connection.recv()
+            connection.send(parameters.worker_parameters(worker, engine_parameters, environment_parameters))
+            connections[worker] = connection
+
+        self.connections = [connections[worker] for worker in range(parameters.workers)]
+
+        self.pending: Queue[tuple[Path, float] | None] = Queue()
+        self.errors: list[BaseException] = []
+        self.collector = Thread(target=self._collect, name="evaluation collector", daemon=True)
+        self.collector.start()
+
+    def submit(self, snapshot: Path, epsilon: float) -> None:
+        """Starts evaluating the given snapshot, the results are written once all workers finished.
+
+        :param snapshot: The directory of the saved policy, removed once evaluated.
+        :param epsilon: The epsilon of the collect policy at the time of the snapshot, written alongside the results.
+        """
+        if self.errors:
+            raise self.errors[0]
+
+        for connection, episodes in zip(self.connections, self.parameters.shares()):
+            connection.send((str(snapshot), episodes))
+
+        self.pending.put((snapshot, epsilon))
+
+    def _collect(self) -> None:
+        try:
+            while (evaluation := self.pending.get()) is not None:
+                snapshot, epsilon = evaluation
+                results: list[EpisodeResults] = [connection.recv() for connection in self.connections]
+
+                rewards, steps, lengths = [[value for result in results for value in result[field]] for field in range(3)]
+                self.writer.add(EvaluationMetrics(rewards, steps, lengths, epsilon))  # type: ignore
+
+                shutil.rmtree(snapshot, ignore_errors=True)
+        except BaseException as error:
+            self.errors.append(error)
+
+    def close(self) -> None:
+        """Waits for all submitted evaluations and stops the workers."""
+        self.pending.put(None)
+        self.collector.join()
+
+        for connection in self.connections:
+            connection.send(None)
+            connection.close()
+        self.listener.close()
+
+        if self.errors:
+            raise self.errors[0]
+
+
+def _launch_worker(worker: int, port: int, authkey: bytes) -> subprocess.Popen[bytes]:
+    return subprocess.Popen(
+        ["start", "cmd", "/c", rf"title Evaluation Worker ({worker}) && python evaluate.py --port {port} --worker {worker}"],
+        shell=True,
+        env={**os.environ, AUTHKEY_VARIABLE: authkey.hex()},
+    )
@@ -1,5 +1,7 @@
 import random
+from collections import OrderedDict
 from pathlib import Path
+from typing import Literal
 
 import tensorflow as tf  # type: ignore
 from tf_agents import agents  # type: ignore
@@ -18,7 +20,18 @@ from tf_agents.utils.common import Checkpointer  # type: ignore
 
 from agent import AgentParams
 from agent.agent import get_initialized_agent
-from environment import CatanSocketEnvironment, EnvironmentParams
+from environment import CatanBatchedEnvironment, CatanSocketEnvironment, EnvironmentParams
+from environment.environment import CatanRemoteEnvironment
+from replay import CompactReplayBuffer, EpisodeReplayBuffer, PrioritizedReplayBuffer
+from utils.driver import release_drivers
+
+ReplayBufferType = Literal["uniform", "compact", "episode", "prioritized"]
+REPLAY_BUFFERS = {
+    "uniform": TFUniformReplayBuffer,
+    "compact": CompactReplayBuffer,
+    "episode": EpisodeReplayBuffer,
+    "prioritized": PrioritizedReplayBuffer,
+}
 
 MasterComponents = tuple[
     agents.TFAgent,
@@ -60,7 +73,53 @@ def load_policy(policy: Path) -> tf_policy.TFPolicy:
     return tf.saved_model.load(policy)  # type: ignore
 
 
-def load_recent_policy(policies: Path, window_width: int, offset: int) -> tf_policy.TFPolicy | None:
+class PolicyCache:
+    """Bounded LRU cache of loaded policies, keyed by the train step their directory is named after.
+
+    Once more than `max_policies` policies are held, or their saved variables take more than `max_bytes`
+    bytes, the least recently used policies are evicted (together with their compiled drivers, see
+    `utils.driver`). The most recently used policy is always kept, even if it exceeds the limit alone.
+    """
+
+    def __init__(self, max_policies: int = 8, max_bytes: int = 0) -> None:
+        self.max_policies = max_policies
+        self.max_bytes = max_bytes
+
+        self.policies: OrderedDict[int, tuple[tf_policy.TFPolicy, int]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def size(self) -> int:
+        """The size [bytes] of the saved variables of all held policies."""
+        return sum(size for _, size in self.policies.values())
+
+    def load(self, policy: Path) -> tf_policy.TFPolicy:
+        """Returns the policy of the given directory, loaded only if it is not held yet.
+
+        :param policy: The directory to load the policy from, named after its train step.
+        """
+        step = int(policy.name)
+
+        if step in self.policies:
+            self.hits += 1
+            self.policies.move_to_end(step)
+            return self.policies[step][0]
+
+        self.misses += 1
+        loaded = load_policy(policy)
+        self.policies[step] = (loaded, sum(file.stat().st_size for file in (policy / "variables").glob("*")))
+
+        while len(self.policies) > 1 and (len(self.policies) > self.max_policies or (self.max_bytes and self.size > self.max_bytes)):
+            _, (evicted, _) = self.policies.popitem(last=False)
+            release_drivers(evicted)
+            self.evictions += 1
+
+        return loaded
+
+
+def load_recent_policy(policies: Path, window_width: int, offset: int, cache: PolicyCache | None = None) -> tf_policy.TFPolicy | None:
     """Loads a random recent policy from the given directory.
 
     Window width is always increase by one, if the last one is selected None
@@ -70,14 +129,15 @@ def load_recent_policy(policies: Path, window_width: int, offset: int) -> tf_pol
     :param policies: The directory to sample the policies from.
     :param window_width: The number of recent policies to sample from.
     :param offset: An offset to prevent loading of the offset-newest policies.
+    :param cache: A cache to take the policy from instead of loading it every time, defaults to None.
     :return: The loaded policy or none.
     """
 
     window = [*range(window_width + 1)]
 
-    # sort policies by time of creation
-    sub_directories = [directory for directory in policies.iterdir() if directory.is_dir()]
-    sub_directories.sort(reverse=True, key=lambda path: path.stat().st_mtime)
+    # sort policies by time of creation, i.e. by their train step
+    sub_directories = [directory for directory in policies.iterdir() if directory.name.isdigit()]
+    sub_directories.sort(reverse=True, key=lambda path: int(path.name))
 
     # set sample window to min amount of policies, add one as random sample
     window_width = min(len(sub_directories), window_width)
@@ -92,7 +152,7 @@ def load_recent_policy(policies: Path, window_width: int, offset: int) -> tf_pol
         chosen_index += offset
 
         print(f"Loaded policy from {sub_directories[chosen_index]}.")
-        return load_policy(sub_directories[chosen_index])
+        return cache.load(sub_directories[chosen_index]) if cache is not None else load_policy(sub_directories[chosen_index])
     except:
         print(f"No policy was chosen.")
         return None
@@ -128,32 +188,63 @@ def get_master(agent_params: AgentParams, environment_params: EnvironmentParams,
     buffer_dir.mkdir(parents=True, exist_ok=True)
 
     agent, environment = _get_agent_and_environment(agent_params, environment_params)
-    replay_buffer = restore_replay_buffer(agent_params.buffer_size, buffer_dir, agent, environment)
+    replay_buffer = restore_replay_buffer(agent_params.buffer_size, buffer_dir, agent, environment, agent_params.replay_buffer)
     checkpointer, saver = _setup_checkpointer(agent, replay_buffer, agent_dir, policy_dir)
 
     return agent, environment, replay_buffer, checkpointer, saver
 
+
+def _get_py_environment(parameters: EnvironmentParams) -> CatanRemoteEnvironment | CatanBatchedEnvironment:
+    """Creates the socket environment described by the given parameters, batched if `batch_size` exceeds one."""
+    if parameters.batch_size > 1:
+        return CatanBatchedEnvironment.from_socket_pool(parameters, parameters.batch_size)
+
+    return CatanSocketEnvironment(parameters)
+
+
 def _get_agent_and_environment(agent_parameters: AgentParams, environment_parameters: EnvironmentParams) -> tuple[TFAgent, TFPyEnvironment]:
-    py_environment = CatanSocketEnvironment(environment_parameters)
+    py_environment = _get_py_environment(environment_parameters)
     agent, tf_environment = get_initialized_agent(py_environment, agent_parameters)
     return agent, tf_environment
 
 
-def restore_replay_buffer(buffer_size: int, buffer_cache: Path, policy: TFPolicy | TFAgent, environment: TFPyEnvironment) -> TFUniformReplayBuffer:
-    if not [*buffer_cache.iterdir()]:
-        raise Exception("Buffer directory is empty, therefore not buffer to restore exists.")
+def _create_replay_buffer(
+    buffer_size: int, buffer_cache: Path, policy: TFPolicy | TFAgent, environment: TFPyEnvironment, kind: ReplayBufferType
+) -> TFUniformReplayBuffer | EpisodeReplayBuffer:
+    """Creates an empty replay buffer of the given kind, see `AgentParams.replay_buffer`.
 
-    replay_buffer = tf_uniform_replay_buffer.TFUniformReplayBuffer(
+    Episode based buffers keep their frames in memory-mapped files within the frames directory of the
+    buffer cache, their checkpoints only hold a small manifest (see `MappedStore`).
+    """
+    options = {"directory": buffer_cache / "frames"} if kind in ["episode", "prioritized"] else {}
+
+    return REPLAY_BUFFERS[kind](
         data_spec=policy.collect_data_spec,  # type: ignore
         batch_size=environment.batch_size,
         max_length=buffer_size,
+        **options,
     )
+
+
+def restore_replay_buffer(
+    buffer_size: int, buffer_cache: Path, policy: TFPolicy | TFAgent, environment: TFPyEnvironment, kind: ReplayBufferType = "episode"
+) -> TFUniformReplayBuffer | EpisodeReplayBuffer:
+    if not [*buffer_cache.iterdir()]:
+        raise Exception("Buffer directory is empty, therefore not buffer to restore exists.")
+
+    replay_buffer = _create_replay_buffer(buffer_size, buffer_cache, policy, environment, kind)
     checkpointer = common.Checkpointer(buffer_cache, max_to_keep=1, replay_buffer=replay_buffer)
     checkpointer.initialize_or_restore()  # type: ignore
     return replay_buffer
 
 
-def _setup_checkpointer(agent: TFAgent, replay_buffer: TFUniformReplayBuffer, agent_cache: Path, policy_cache: Path) -> tuple[Checkpointer, PolicySaver]:
+def _setup_checkpointer(
+    agent: TFAgent, replay_buffer: TFUniformReplayBuffer | EpisodeReplayBuffer, agent_cache: Path, policy_cache: Path
+) -> tuple[Checkpointer, PolicySaver]:
+    # the initial buffer stays untouched, the frames collected by this agent are persisted (and restored) alongside it
+    if isinstance(replay_buffer, EpisodeReplayBuffer):
+        replay_buffer.attach(agent_cache / "replay")
+
     checkpointer = common.Checkpointer(
         agent_cache,
         max_to_keep=1,
@@ -174,7 +265,7 @@ def _setup_checkpointer(agent: TFAgent, replay_buffer: TFUniformReplayBuffer, ag
 
 
 def get_initial_random_policy(parameters: EnvironmentParams) -> tuple[RandomTFPolicy, TFPyEnvironment]:
-    py_environment = CatanSocketEnvironment(parameters)
+    py_environment = _get_py_environment(parameters)
     tf_environment = TFPyEnvironment(py_environment)
 
     policy = RandomTFPolicy(
@@ -187,13 +278,9 @@ def get_initial_random_policy(parameters: EnvironmentParams) -> tuple[RandomTFPo
 
 
 def get_initial_replay_buffer(
-    buffer_size: int, buffer_cache: Path, policy: TFPolicy, environment: TFPyEnvironment
-) -> tuple[TFUniformReplayBuffer, Checkpointer]:
-    replay_buffer = TFUniformReplayBuffer(
-        data_spec=policy.collect_data_spec,  # type: ignore
-        batch_size=environment.batch_size,
-        max_length=buffer_size,
-    )
+    buffer_size: int, buffer_cache: Path, policy: TFPolicy, environment: TFPyEnvironment, kind: ReplayBufferType = "episode"
+) -> tuple[TFUniformReplayBuffer | EpisodeReplayBuffer, Checkpointer]:
+    replay_buffer = _create_replay_buffer(buffer_size, buffer_cache, policy, environment, kind)
     checkpointer = common.Checkpointer(buffer_cache, max_to_keep=1, replay_buffer=replay_buffer)
 
     return replay_buffer, checkpointer
@@ -1,16 +1,37 @@
+import asyncio
 import gc
+import threading
 import time
+import weakref
 from itertools import chain
+from typing import Callable
 
+import numpy as np
 import tensorflow as tf  # type: ignore
 import tqdm
 from tf_agents.agents import TFAgent  # type: ignore
 from tf_agents.environments.tf_py_environment import TFPyEnvironment  # type: ignore
+from tf_agents.policies.py_policy import PyPolicy  # type: ignore
+from tf_agents.policies.py_tf_eager_policy import PyTFEagerPolicy  # type: ignore
 from tf_agents.policies.tf_policy import TFPolicy  # type: ignore
 from tf_agents.replay_buffers.tf_uniform_replay_buffer import TFUniformReplayBuffer  # type: ignore
 from tf_agents.trajectories import trajectory  # type: ignore
 
+from agent.agent import get_acting_policy  # type: ignore
 from agent.parameters import AgentParams  # type: ignore
+from environment import CatanAsyncEnvironment, latency
+from utils.driver import get_driver
+from utils.trainer import learner_dataset, train_batch, train_batches
+
+LATENCIES = latency.recorder("player")
+
+# acting policies of the agents trained by `train_episodes_decoupled`, created once per agent
+ACTING_POLICIES: "weakref.WeakKeyDictionary[TFAgent, tuple[TFPolicy, Callable[[], None]]]" = weakref.WeakKeyDictionary()
+
+
+def _batched(tf_environment: TFPyEnvironment) -> bool:
+    """Batched environments are not supported by the compiled drivers, these are played by the eager `*_batched` loops."""
+    return tf_environment.batch_size not in [None, 1]
 
 
 def play_episode(policy: TFPolicy, tf_environment: TFPyEnvironment) -> tuple[list[float], int, float]:
@@ -19,30 +40,30 @@ def play_episode(policy: TFPolicy, tf_environment: TFPyEnvironment) -> tuple[lis
     :param environment: The environment to deploy the policy in.
     :param policy: The policy used for decision making.
     """
-    reward: list[float] = []
-    steps = 0
     start = time.time()
+    driver = get_driver(policy, tf_environment)
 
-    time_step = tf_environment.reset()
-    while not time_step.is_last():  # type: ignore
-        action_step = policy.action(time_step)  # type: ignore
-        time_step = tf_environment.step(action_step.action)  # type: ignore
-
-        reward.append(float(time_step.reward))  # type: ignore
-        steps += 1
+    driving = time.perf_counter_ns()
+    _, rewards = driver.run(tf_environment.reset())
+    LATENCIES.record("episode", latency.NO_PHASE, driving)
 
-    return reward, steps, (time.time() - start)
+    return rewards.tolist(), len(rewards), (time.time() - start)
 
 
 def play_episodes(
-    policy: TFPolicy, tf_environment: TFPyEnvironment, no_episodes: int, omit_results: bool = False
+    policy: TFPolicy, tf_environment: TFPyEnvironment, no_episodes: int, omit_results: bool = False, clean_up: bool = False
 ) -> tuple[list[list[float]], list[int], list[float]]:
     """Deploys a given policy within the given environment until a set number of episodes passed.
 
     :param environment: The environment to deploy the policy in.
     :param policy: The policy used for decision making.
     :param no_episodes: The number of episodes to run.
+    :param clean_up: Whether to clear the keras session and collect garbage afterwards, defaults to False.
+    Callers keeping loaded policies alive (e.g. using a `loader.PolicyCache`) skip it.
     """
+    if _batched(tf_environment):
+        return play_episodes_batched(policy, tf_environment, no_episodes, omit_results=omit_results)
+
     episode_rewards: list[list[float]] = []
     episode_steps: list[int] = []
     episode_lengths: list[float] = []
@@ -58,29 +79,76 @@ def play_episodes(
         episode_lengths.append(length)
 
     # some clean up, may help with constantly increasing ram usage
-    tf.keras.backend.clear_session()
-    gc.collect()
+    if clean_up:
+        tf.keras.backend.clear_session()
+        gc.collect()
 
     return episode_rewards, episode_steps, episode_lengths
 
 
-def collect_episode(policy: TFPolicy, tf_environment: TFPyEnvironment, replay_buffer: TFUniformReplayBuffer) -> int:
+async def play_episode_async(policy: PyPolicy, environment: CatanAsyncEnvironment) -> tuple[list[float], int, float]:
+    """Awaitable version of `play_episode` for a single `CatanAsyncEnvironment`.
+
+    :param policy: The (python) policy used for decision making.
+    :param environment: The environment to deploy the policy in.
+    """
+    reward: list[float] = []
     steps = 0
-    time_step = tf_environment.reset()
+    start = time.time()
+
+    time_step = await environment.reset_async()
     while not time_step.is_last():  # type: ignore
         action_step = policy.action(time_step)  # type: ignore
-        next_time_step = tf_environment.step(action_step.action)  # type: ignore
-
-        transition = trajectory.from_transition(time_step, action_step, next_time_step)  # type: ignore
-        replay_buffer.add_batch(transition)  # type: ignore
+        time_step = await environment.step_async(action_step.action)  # type: ignore
 
-        time_step = next_time_step
+        reward.append(float(time_step.reward))  # type: ignore
         steps += 1
 
-    return steps
+    return reward, steps, (time.time() - start)
+
+
+async def play_episodes_async(
+    policy: TFPolicy, environments: list[CatanAsyncEnvironment], no_episodes: int, omit_results: bool = False
+) -> tuple[list[list[float]], list[int], list[float]]:
+    """Deploys a given policy within all given environments concurrently until a set number of episodes passed.
+
+    The episodes are split evenly across the environments, while one game waits on its engine the
+    event loop drives the other games. Must be awaited on the event loop of the environments.
+
+    :param policy: The policy used for decision making.
+    :param environments: The environments to deploy the policy in.
+    :param no_episodes: The total number of episodes to run.
+    """
+    py_policy = PyTFEagerPolicy(policy, use_tf_function=True)
+
+    async def play(environment: CatanAsyncEnvironment, episodes: int) -> list[tuple[list[float], int, float]]:
+        return [await play_episode_async(py_policy, environment) for _ in range(episodes)]
+
+    shares = [no_episodes // len(environments) + (1 if i < no_episodes % len(environments) else 0) for i in range(len(environments))]
+    results = await asyncio.gather(*[play(environment, share) for environment, share in zip(environments, shares)])
+
+    if omit_results:
+        return [], [], []
+
+    episodes = [*chain(*results)]
+    return [reward for reward, _, _ in episodes], [steps for _, steps, _ in episodes], [length for _, _, length in episodes]
+
+
+def collect_episode(policy: TFPolicy, tf_environment: TFPyEnvironment, replay_buffer: TFUniformReplayBuffer) -> int:
+    driver = get_driver(policy, tf_environment, replay_buffer)
+
+    driving = time.perf_counter_ns()
+    _, rewards = driver.run(tf_environment.reset())
+    LATENCIES.record("episode", latency.NO_PHASE, driving)
+
+    return len(rewards)
 
 
 def collect_episodes(policy: TFPolicy, tf_environment: TFPyEnvironment, replay_buffer: TFUniformReplayBuffer, no_episodes: int) -> None:
+    if _batched(tf_environment):
+        play_episodes_batched(policy, tf_environment, no_episodes, replay_buffer, omit_results=True)
+        return
+
     steps = 0
     for _ in tqdm.tqdm(range(no_episodes), desc="Collecting"):
         steps += collect_episode(policy, tf_environment, replay_buffer)
@@ -91,29 +159,31 @@ def collect_episodes(policy: TFPolicy, tf_environment: TFPyEnvironment, replay_b
 def train_episode(agent: TFAgent, environment: TFPyEnvironment, buffer: TFUniformReplayBuffer, parameters: AgentParams) -> list[float]:
     steps = 0
     loss_info: list[float] = []
+    driver = get_driver(agent.collect_policy, environment, buffer)
 
     time_step = environment.reset()
     while not time_step.is_last():  # type: ignore
-        # select action
-        action_step = agent.collect_policy.action(time_step)  # type: ignore
-        next_time_step = environment.step(action_step.action)  # type: ignore
-
-        # add transition to buffer and reset
-        transition = trajectory.from_transition(time_step, action_step, next_time_step)  # type: ignore
-        buffer.add_batch(transition)  # type: ignore
-        time_step = next_time_step
+        # collect until the next network update (or the end of the episode)
+        driving = time.perf_counter_ns()
+        time_step, rewards = driver.run(time_step, parameters.network_update_frequency - steps % parameters.network_update_frequency)
+        LATENCIES.record("collect", latency.NO_PHASE, driving)
 
         # train each n-th step
-        steps += 1
+        steps += len(rewards)
         if steps % parameters.network_update_frequency == 0:
-            batch, _ = buffer.get_next(parameters.batchsize, parameters.n_steps + 1)  # type: ignore
-            loss = agent.train(batch)  # type: ignore
+            training = time.perf_counter_ns()
+            batch, info = buffer.get_next(parameters.batchsize, parameters.n_steps + 1)  # type: ignore
+            loss = train_batch(agent, buffer, batch, info)
             loss_info.append(float(loss.loss))  # type: ignore
+            LATENCIES.record("train", latency.NO_PHASE, training)
 
     return loss_info
 
 
 def train_episodes(agent: TFAgent, environment: TFPyEnvironment, buffer: TFUniformReplayBuffer, parameters: AgentParams, no_episodes: int) -> list[float]:
+    if _batched(environment):
+        return train_episodes_batched(agent, environment, buffer, parameters, no_episodes)
+
     loss_info: list[list[float]] = []
     for _ in tqdm.tqdm(range(no_episodes), desc="Training"):
         loss = train_episode(agent, environment, buffer, parameters)
@@ -126,20 +196,209 @@ def train_episodes_async(
     agent: TFAgent, environment: TFPyEnvironment, buffer: TFUniformReplayBuffer, parameters: AgentParams, no_episodes: int
 ) -> list[float]:
     steps = 0
-    for _ in tqdm.tqdm(range(no_episodes), desc="Collecting"):
-        steps += collect_episode(agent.collect_policy, environment, buffer)
+    if _batched(environment):
+        # the steps of the episodes still running are not counted, these are completed by the next call
+        _, episode_steps, _ = play_episodes_batched(agent.collect_policy, environment, no_episodes, buffer)
+        steps = sum(episode_steps)
+    else:
+        for _ in tqdm.tqdm(range(no_episodes), desc="Collecting"):
+            steps += collect_episode(agent.collect_policy, environment, buffer)
+
+    batch_iterator = iter(learner_dataset(buffer, parameters))
+    loss_info, _ = train_batches(agent, buffer, batch_iterator, parameters, steps // parameters.network_update_frequency, progress=True)
+
+    return loss_info
+
 
+def train_episodes_decoupled(
+    agent: TFAgent, environment: TFPyEnvironment, buffer: TFUniformReplayBuffer, parameters: AgentParams, no_episodes: int
+) -> list[float]:
+    """Actor/learner version of `train_episodes`, collecting and training run concurrently.
+
+    The actor keeps stepping the environment using its own copy of the collect policy (see `agent.get_acting_policy`),
+    while a learner thread trains continuously on batches sampled from the replay buffer. The learner is not
+    paced by the collected decisions, i.e. it usually performs more updates (and decays epsilon faster) than
+    `train_episodes`. The learner starts once the buffer holds a full window (`n_steps + 1` frames) per environment,
+    i.e. within the first episode. The weights are pushed to the acting policy every `weight_push_interval` trainings
+    steps (checked every `network_update_frequency` decisions) and once training stopped. Batched environments are
+    stepped by `play_episodes_batched`, i.e. eagerly and with the weights checked once per completed episode.
+
+    :param agent: The agent to train.
+    :param environment: The environment to collect experience from.
+    :param buffer: The replay buffer, shared by actor and learner.
+    :param parameters: The agent parameters.
+    :param no_episodes: The number of episodes to collect.
+    """
+    if no_episodes <= 0:
+        return []
+
+    if agent not in ACTING_POLICIES:
+        ACTING_POLICIES[agent] = get_acting_policy(agent, parameters)
+    policy, push_weights = ACTING_POLICIES[agent]
+    push_weights()
+
+    loss_info: list[float] = []
+    errors: list[BaseException] = []
+    stopping = threading.Event()
+
+    def learn() -> None:
+        batch_iterator = iter(learner_dataset(buffer, parameters))
+
+        try:
+            # losses are read back once per chunk, i.e. once per push
+            while not stopping.is_set():
+                losses, _ = train_batches(agent, buffer, batch_iterator, parameters, parameters.weight_push_interval)
+                loss_info.extend(losses)
+        except BaseException as error:
+            errors.append(error)
+
+    # the learner is started once every block of the buffer holds a full window to sample
+    learner = threading.Thread(target=learn, name="learner", daemon=True)
+    min_frames = (parameters.n_steps + 1) * (environment.batch_size or 1)
+    pushed = 0
+
+    def collected() -> None:
+        nonlocal pushed
+
+        if learner.ident is None and int(buffer.num_frames()) >= min_frames:  # type: ignore
+            learner.start()
+
+        if len(loss_info) - pushed >= parameters.weight_push_interval:
+            pushed = len(loss_info)
+            push_weights()
+
+    batched = _batched(environment)
+    driver = None if batched else get_driver(policy, environment, buffer)
+
+    for _ in tqdm.tqdm(range(no_episodes), desc="Training"):
+        if errors:
+            break
+
+        if driver is None:
+            driving = time.perf_counter_ns()
+            play_episodes_batched(policy, environment, 1, buffer, omit_results=True, progress=False)
+            LATENCIES.record("collect", latency.NO_PHASE, driving)
+            collected()
+            continue
+
+        time_step = environment.reset()
+        while not time_step.is_last():  # type: ignore
+            driving = time.perf_counter_ns()
+            time_step, _ = driver.run(time_step, parameters.network_update_frequency)
+            LATENCIES.record("collect", latency.NO_PHASE, driving)
+            collected()
+
+    stopping.set()
+    if learner.ident is not None:
+        learner.join()
+    if errors:
+        raise errors[0]
+
+    push_weights()
+    return loss_info
+
+
+def play_episodes_batched(
+    policy: TFPolicy,
+    tf_environment: TFPyEnvironment,
+    no_episodes: int,
+    replay_buffer: TFUniformReplayBuffer | None = None,
+    omit_results: bool = False,
+    progress: bool = True,
+) -> tuple[list[list[float]], list[int], list[float]]:
+    """Deploys a given policy within a batched environment until a set number of episodes passed.
+
+    Every slot plays its own episodes and is reset individually, the policy decides for all slots
+    at once. Episodes still running once enough episodes completed are continued by the next call,
+    these are played (and collected) but not reported.
+
+    :param policy: The policy used for decision making.
+    :param tf_environment: The batched environment to deploy the policy in.
+    :param no_episodes: The number of episodes to complete.
+    :param replay_buffer: A buffer to add all transitions to, `batch_size` at a time, defaults to None.
+    :param progress: Whether to show the progress, defaults to True.
+    """
+    episode_rewards: list[list[float]] = []
+    episode_steps: list[int] = []
+    episode_lengths: list[float] = []
+
+    batch_size = tf_environment.batch_size
+    rewards: list[list[float] | None] = [None] * batch_size
+    starts = [time.time()] * batch_size
+
+    completed = tqdm.tqdm(total=no_episodes, desc="Playing", disable=not progress)
+    time_step = tf_environment.current_time_step()
+    while len(episode_steps) < no_episodes:
+        for slot in np.flatnonzero(time_step.is_first().numpy()):  # type: ignore
+            rewards[slot] = []
+            starts[slot] = time.time()
+
+        action_step = policy.action(time_step)  # type: ignore
+        next_time_step = tf_environment.step(action_step.action)  # type: ignore
+
+        if replay_buffer is not None:
+            replay_buffer.add_batch(trajectory.from_transition(time_step, action_step, next_time_step))  # type: ignore
+
+        time_step = next_time_step
+        step_rewards, is_first, is_last = time_step.reward.numpy(), time_step.is_first().numpy(), time_step.is_last().numpy()  # type: ignore
+
+        for slot in range(batch_size):
+            slot_rewards = rewards[slot]
+
+            # slots that just started a new episode are tracked in the next iteration
+            if is_first[slot] or slot_rewards is None:
+                continue
+
+            slot_rewards.append(float(step_rewards[slot]))
+
+            if is_last[slot]:
+                episode_rewards.append(slot_rewards)
+                episode_steps.append(len(slot_rewards))
+                episode_lengths.append(time.time() - starts[slot])
+                rewards[slot] = None
+                completed.update()
+
+    completed.close()
+
+    if omit_results:
+        return [], [], []
+
+    return episode_rewards, episode_steps, episode_lengths
+
+
+def train_episodes_batched(
+    agent: TFAgent, environment: TFPyEnvironment, buffer: TFUniformReplayBuffer, parameters: AgentParams, no_episodes: int
+) -> list[float]:
+    """Batched version of `train_episodes`, trains on the same ratio of network updates per decision.
+
+    :param agent: The agent to train.
+    :param environment: The batched environment to collect experience from.
+    :param buffer: The replay buffer, its batch size must match the environment.
+    :param parameters: The agent parameters.
+    :param no_episodes: The number of episodes to complete.
+    """
     loss_info: list[float] = []
-    dataset = buffer.as_dataset(
-        num_parallel_calls=4,
-        sample_batch_size=parameters.batchsize,
-        num_steps=parameters.n_steps + 1,
-    )
-
-    batch_iterator = iter(dataset)
-    for _ in tqdm.tqdm(range(steps // parameters.network_update_frequency), desc="Training"):
-        batch, _ = next(batch_iterator)
-        loss = agent.train(batch)
-        loss_info.append(float(loss.loss))
+    decisions = 0
+    completed = 0
+
+    time_step = environment.current_time_step()
+    with tqdm.tqdm(total=no_episodes, desc="Training") as progress:
+        while completed < no_episodes:
+            action_step = agent.collect_policy.action(time_step)  # type: ignore
+            next_time_step = environment.step(action_step.action)  # type: ignore
+            buffer.add_batch(trajectory.from_transition(time_step, action_step, next_time_step))  # type: ignore
+            time_step = next_time_step
+
+            finished = int(tf.reduce_sum(tf.cast(time_step.is_last(), tf.int32)))  # type: ignore
+            completed += finished
+            progress.update(finished)
+
+            # keep the number of updates per decision of the unbatched training loop
+            decisions += environment.batch_size
+            while decisions >= parameters.network_update_frequency:
+                decisions -= parameters.network_update_frequency
+                batch, info = buffer.get_next(parameters.batchsize, parameters.n_steps + 1)  # type: ignore
+                loss = train_batch(agent, buffer, batch, info)
+                loss_info.append(float(loss.loss))  # type: ignore
 
     return loss_info
@@ -1,23 +1,130 @@
 # type: ignore
 
+import time
+from threading import Lock
+
+import tensorflow as tf
+import tqdm
 from tf_agents.agents import TFAgent
 from tf_agents.replay_buffers.tf_uniform_replay_buffer import TFUniformReplayBuffer
 
 from agent.parameters import AgentParams
+from metrics import LearnerMetrics
+from replay import PrioritizedReplayBuffer
 
+# learner metrics of all chunks trained since the last snapshot, see `snapshot`
+STATISTICS = LearnerMetrics(0, 0, 0.0, 0.0)
+STATISTICS_LOCK = Lock()
 
-def train_offline(agent: TFAgent, buffer: TFUniformReplayBuffer, parameters: AgentParams, batches: int) -> list[float]:
-    loss_info: list[float] = []
+
+def train_batch(agent: TFAgent, buffer: TFUniformReplayBuffer, experience, info, pending: list | None = None):
+    """Trains the agent on a single sampled batch.
+
+    Batches of a `PrioritizedReplayBuffer` are weighted by their importance sampling weights,
+    the priorities of the sampled windows are updated using the resulting td errors.
+
+    :param agent: The agent to train.
+    :param buffer: The replay buffer the batch was sampled from.
+    :param experience: The sampled batch.
+    :param info: The info sampled alongside the batch.
+    :param pending: Collects the ids and td errors instead of updating the priorities, which reads them back
+    right away, defaults to None. See `update_priorities`.
+    :return: The loss info of the training step.
+    """
+    if not isinstance(buffer, PrioritizedReplayBuffer):
+        return agent.train(experience)
+
+    loss = agent.train(experience, weights=info.weights)
+    if pending is None:
+        buffer.update_priorities(info.ids, loss.extra.td_error)
+    else:
+        pending.append((info.ids, loss.extra.td_error))
+
+    return loss
+
+
+def update_priorities(buffer: PrioritizedReplayBuffer, pending: list) -> None:
+    """Updates the priorities of all windows collected by `train_batch` with a single read back.
+
+    :param buffer: The replay buffer the batches were sampled from.
+    :param pending: The ids and td errors of every trained batch, in training order, i.e. the latest td error wins.
+    """
+    if pending:
+        ids, td_errors = zip(*pending)
+        buffer.update_priorities(tf.concat(ids, 0).numpy(), tf.concat(td_errors, 0).numpy())
+
+
+def learner_dataset(buffer: TFUniformReplayBuffer, parameters: AgentParams) -> tf.data.Dataset:
+    """Creates the input pipeline of the learner, batches are sampled in parallel and prefetched in the background.
+
+    Both the number of parallel samplers and the number of prefetched batches are tuned by `tf.data`. Batches
+    of a `PrioritizedReplayBuffer` are sampled ahead of training, i.e. their priorities may lag a few trainings steps.
+
+    :param buffer: The replay buffer to sample from.
+    :param parameters: The agent parameters.
+    """
     dataset = buffer.as_dataset(
-        num_parallel_calls=4,
+        num_parallel_calls=tf.data.AUTOTUNE,
         sample_batch_size=parameters.batchsize,
-        num_steps=parameters.batchsize,
+        num_steps=parameters.n_steps + 1,
     )
 
-    batch_iterator = iter(dataset)
-    for _ in range(batches):
-        batch, _ = next(batch_iterator)
-        loss = agent.train(batch)
-        loss_info.append(float(loss.loss))
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
 
+def train_batches(agent: TFAgent, buffer: TFUniformReplayBuffer, batches, parameters: AgentParams, no_batches: int, progress: bool = False):
+    """Trains the agent on a chunk of batches taken from the given iterator, see `learner_dataset`.
+
+    The losses are kept as tensors and read back at once after the chunk, the time spent waiting on the
+    iterator is recorded as learner metrics, see `snapshot`. The priorities of a `PrioritizedReplayBuffer`
+    are updated alongside, i.e. windows trained within a chunk are sampled by their previous priorities
+    until the chunk ends.
+
+    :param agent: The agent to train.
+    :param buffer: The replay buffer the batches are sampled from.
+    :param batches: The iterator of sampled batches.
+    :param parameters: The agent parameters.
+    :param no_batches: The number of batches to train on.
+    :param progress: Whether to show a progress bar, defaults to False.
+    :return: The loss of every batch and the learner metrics of the chunk.
+    """
+    losses = []
+    pending = []
+    waiting = 0.0
+    start = time.perf_counter()
+
+    for _ in tqdm.tqdm(range(no_batches), desc="Training", disable=not progress):
+        sampling = time.perf_counter()
+        batch, info = next(batches)
+        waiting += time.perf_counter() - sampling
+
+        losses.append(train_batch(agent, buffer, batch, info, pending).loss)
+
+    loss_info = tf.stack(losses).numpy().tolist() if losses else []
+    update_priorities(buffer, pending)
+    metrics = LearnerMetrics(no_batches, no_batches * parameters.batchsize, time.perf_counter() - start, waiting)
+
+    global STATISTICS
+    with STATISTICS_LOCK:
+        STATISTICS = STATISTICS.merge(metrics)
+
+    return loss_info, metrics
+
+
+def snapshot(reset: bool = True) -> LearnerMetrics:
+    """Combines the learner metrics of all chunks trained since the last snapshot.
+
+    :param reset: Whether to start new metrics afterwards, i.e. each snapshot covers one interval.
+    """
+    global STATISTICS
+    with STATISTICS_LOCK:
+        statistics = STATISTICS
+        if reset:
+            STATISTICS = LearnerMetrics(0, 0, 0.0, 0.0)
+
+    return statistics
+
+
+def train_offline(agent: TFAgent, buffer: TFUniformReplayBuffer, parameters: AgentParams, batches: int) -> list[float]:
+    loss_info, _ = train_batches(agent, buffer, iter(learner_dataset(buffer, parameters)), parameters, batches)
     return loss_info